@@ -0,0 +1,12 @@
+"""
+Benchmarks for PySuperfish, in the layout used by asv.
+
+Each class may define ``setup_cache``, ``setup`` and ``params``. Methods
+named ``time_*`` are timed, ``timeraw_*`` methods return code that is
+timed in a fresh interpreter, and ``track_peakmem_*`` methods return the
+tracemalloc peak of one call, in bytes.
+
+Run with asv (``asv run``) or without it::
+
+    python -m benchmarks.run
+"""
@@ -0,0 +1,52 @@
+"""
+Import-time benchmarks.
+
+Run as a script, this checks that ``import superfish`` loads none of the
+optional heavy dependencies, and exits non-zero otherwise. The pre-commit
+configuration runs it on every commit that touches the package.
+"""
+
+import subprocess
+import sys
+
+# Optional heavy dependencies that must not load on `import superfish`
+HEAVY_MODULES = ("matplotlib", "mpl_toolkits", "scipy", "beamphysics", "h5py")
+
+
+def heavy_modules_loaded(module: str = "superfish") -> list[str]:
+    """Heavy top-level packages loaded by importing ``module`` in a fresh process."""
+    code = (
+        f"import sys, {module}; "
+        f"print(' '.join(sorted({{m.split('.')[0] for m in sys.modules}} "
+        f"& {set(HEAVY_MODULES)})))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return out.stdout.split()
+
+
+class ImportSuperfish:
+    def timeraw_import_superfish(self):
+        return "import superfish"
+
+    def timeraw_import_parsers(self):
+        return "import superfish.parsers"
+
+    def track_heavy_modules(self):
+        # Anything but 0 is a start-up regression; see main()
+        return len(heavy_modules_loaded())
+
+    track_heavy_modules.unit = "modules"
+
+
+def main() -> int:
+    loaded = heavy_modules_loaded()
+    if loaded:
+        print(f"import superfish loads heavy modules: {', '.join(loaded)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
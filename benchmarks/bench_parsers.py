@@ -0,0 +1,72 @@
+import os
+
+from superfish.parsers import parse_fish_t7, parse_poisson_t7, parse_sfo
+from superfish.writers import write_fish_t7, write_poisson_t7
+
+from .common import (
+    SCALES,
+    SOLENOID_T7,
+    SWIFEL_T7,
+    peak_memory,
+    scaled_t7data,
+    write_synthetic_sfo,
+)
+
+
+class ParseT7:
+    params = SCALES
+    param_names = ("scale",)
+    timeout = 300
+
+    def setup_cache(self):
+        # Written once, relative to the benchmark working directory
+        fish = parse_fish_t7(SWIFEL_T7)
+        poisson = parse_poisson_t7(SOLENOID_T7, type="magnetic")
+        files = {}
+        for scale in SCALES:
+            files[("fish", scale)] = write_fish_t7(
+                os.path.abspath(f"SWIFEL_x{scale}.T7"), scaled_t7data(fish, scale)
+            )
+            files[("poisson", scale)] = write_poisson_t7(
+                os.path.abspath(f"SOLENOID_x{scale}.T7"),
+                scaled_t7data(poisson, scale),
+            )
+        return files
+
+    def time_parse_fish_t7(self, files, scale):
+        parse_fish_t7(files[("fish", scale)])
+
+    def time_parse_poisson_t7(self, files, scale):
+        parse_poisson_t7(files[("poisson", scale)], type="magnetic")
+
+    def track_peakmem_parse_fish_t7(self, files, scale):
+        return peak_memory(parse_fish_t7, files[("fish", scale)])
+
+    track_peakmem_parse_fish_t7.unit = "bytes"
+
+    def track_peakmem_parse_poisson_t7(self, files, scale):
+        return peak_memory(parse_poisson_t7, files[("poisson", scale)], type="magnetic")
+
+    track_peakmem_parse_poisson_t7.unit = "bytes"
+
+
+class ParseSFO:
+    params = SCALES
+    param_names = ("scale",)
+
+    def setup_cache(self):
+        # 10 segments of 50 wall points, scaled up
+        return {
+            scale: write_synthetic_sfo(
+                os.path.abspath(f"BENCH_x{scale}.SFO"), points_per_segment=50 * scale
+            )
+            for scale in SCALES
+        }
+
+    def time_parse_sfo(self, files, scale):
+        parse_sfo(files[scale])
+
+    def track_peakmem_parse_sfo(self, files, scale):
+        return peak_memory(parse_sfo, files[scale])
+
+    track_peakmem_parse_sfo.unit = "bytes"
@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+
+from superfish.parsers import parse_sfo
+from superfish.plot import plot_wall
+
+from .common import SCALES, peak_memory, write_synthetic_sfo
+
+
+class PlotWall:
+    params = (SCALES, [0, 1])
+    param_names = ("scale", "perp_scale")
+
+    def setup(self, scale, perp_scale):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sfo = write_synthetic_sfo(
+                os.path.join(tmpdir, "BENCH.SFO"), points_per_segment=50 * scale
+            )
+            self.wall_segments = parse_sfo(sfo)["wall_segments"]
+
+    def teardown(self, scale, perp_scale):
+        plt.close("all")
+
+    def _plot(self, perp_scale):
+        fig = plot_wall(self.wall_segments, perp_scale=perp_scale, return_figure=True)
+        # Include rendering, which is where most of the time goes
+        fig.canvas.draw()
+        plt.close(fig)
+
+    def time_plot_wall(self, scale, perp_scale):
+        self._plot(perp_scale)
+
+    def track_peakmem_plot_wall(self, scale, perp_scale):
+        return peak_memory(self._plot, perp_scale)
+
+    track_peakmem_plot_wall.unit = "bytes"
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import warnings
+
+from superfish.parsers import parse_fish_t7, parse_poisson_t7
+from superfish.writers import (
+    fish_externalfield_data,
+    poisson_externalfield_data,
+    write_fish_t7,
+    write_poisson_t7,
+)
+
+from .common import SCALES, SOLENOID_T7, SWIFEL_T7, peak_memory, scaled_t7data
+
+
+class _T7Data:
+    params = SCALES
+    param_names = ("scale",)
+    timeout = 300
+
+    def setup(self, scale):
+        self.fish = scaled_t7data(parse_fish_t7(SWIFEL_T7), scale)
+        self.poisson = scaled_t7data(
+            parse_poisson_t7(SOLENOID_T7, type="magnetic"), scale
+        )
+
+
+class WriteT7(_T7Data):
+    def setup(self, scale):
+        super().setup(scale)
+        self.tmpdir = tempfile.mkdtemp()
+        self.fish_file = os.path.join(self.tmpdir, "fish.T7")
+        self.poisson_file = os.path.join(self.tmpdir, "poisson.T7")
+
+    def teardown(self, scale):
+        shutil.rmtree(self.tmpdir)
+
+    def time_write_fish_t7(self, scale):
+        write_fish_t7(self.fish_file, self.fish)
+
+    def time_write_poisson_t7(self, scale):
+        write_poisson_t7(self.poisson_file, self.poisson)
+
+    def track_peakmem_write_fish_t7(self, scale):
+        return peak_memory(write_fish_t7, self.fish_file, self.fish)
+
+    track_peakmem_write_fish_t7.unit = "bytes"
+
+    def track_peakmem_write_poisson_t7(self, scale):
+        return peak_memory(write_poisson_t7, self.poisson_file, self.poisson)
+
+    track_peakmem_write_poisson_t7.unit = "bytes"
+
+
+class ExternalFieldData(_T7Data):
+    def setup(self, scale):
+        super().setup(scale)
+        # fish_externalfield_data is deprecated, but still benchmarked
+        warnings.simplefilter("ignore", DeprecationWarning)
+
+    def time_fish_externalfield_data(self, scale):
+        fish_externalfield_data(self.fish)
+
+    def time_poisson_externalfield_data(self, scale):
+        poisson_externalfield_data(self.poisson, type="magnetic")
+
+    def track_peakmem_fish_externalfield_data(self, scale):
+        return peak_memory(fish_externalfield_data, self.fish)
+
+    track_peakmem_fish_externalfield_data.unit = "bytes"
+
+    def track_peakmem_poisson_externalfield_data(self, scale):
+        return peak_memory(poisson_externalfield_data, self.poisson, type="magnetic")
+
+    track_peakmem_poisson_externalfield_data.unit = "bytes"
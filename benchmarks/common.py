@@ -0,0 +1,100 @@
+"""Shared fixtures for the benchmarks."""
+
+import os
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "examples", "data")
+
+SWIFEL_T7 = os.path.join(DATA_DIR, "SWIFEL.T7")
+SOLENOID_T7 = os.path.join(DATA_DIR, "SOLENOID.T7")
+
+# Grid scale-up factors: number of grid points relative to the bundled files
+SCALES = [1, 10, 100]
+
+
+def peak_memory(func: Callable, *args: Any, **kwargs: Any) -> int:
+    """
+    Peak memory allocated by a call, in bytes, measured with tracemalloc.
+    """
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def scaled_t7data(t7data: dict[str, Any], scale: int) -> dict[str, Any]:
+    """
+    Resample t7data along z onto a grid with ``scale`` times the points.
+
+    The extent is unchanged, so the result is a realistic, finer map.
+    """
+    if scale == 1:
+        return t7data
+    nz = t7data["nz"]
+    new_nz = (nz - 1) * scale + 1
+    z = np.linspace(0, 1, nz)
+    new_z = np.linspace(0, 1, new_nz)
+
+    out = dict(t7data)
+    out["nz"] = new_nz
+    for key, val in t7data.items():
+        if isinstance(val, np.ndarray):
+            out[key] = np.array([np.interp(new_z, z, row) for row in val])
+    return out
+
+
+def write_synthetic_sfo(
+    filename: str,
+    n_segments: int = 10,
+    points_per_segment: int = 50,
+) -> str:
+    """
+    Write a synthetic Fish SFO file with a header table and wall segments.
+
+    The wall is a half circle split into ``n_segments`` segments, with a
+    smooth field along it.
+    """
+    sep = "-" * 80
+    lines = [
+        "Superfish output summary for problem description:",
+        "Synthetic benchmark cavity",
+        "Variable Code         Value     Description",
+        "FREQ     A   1300.0    Frequency (MHz)",
+        "KMETHOD      1         Method for beam velocity",
+        "XDRI     A   0.05      Drive point X",
+    ]
+
+    n = n_segments * points_per_segment
+    theta = np.linspace(0, np.pi, n + 1)
+    Z = 5 - 5 * np.cos(theta)
+    R = 5 * np.sin(theta) + 1
+    E = 10 * np.sin(theta) ** 2 + 0.1
+    H = 1e4 * np.cos(theta / 2) ** 2
+
+    for s in range(n_segments):
+        i0 = s * points_per_segment
+        i1 = i0 + points_per_segment
+        lines += [
+            sep,
+            f"Power and fields on wall segment {s + 1}   K,L = {i0 + 1},1 to {i1 + 1},1",
+            "Dielectric constant = 1.0",
+            "K    L      Z           R         Alpha          H            E",
+            "(cm)        (cm)       (deg)       (A/m)       (MV/m)",
+        ]
+        for i in range(i0, i1 + 1):
+            lines.append(
+                f"{i + 1:5d} {1:4d} {Z[i]:11.6f} {R[i]:11.6f} "
+                f"{np.degrees(theta[i]):11.4f} {H[i]:11.4f} {E[i]:11.6f}"
+            )
+
+    with open(filename, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    return filename
@@ -0,0 +1,204 @@
+"""
+Run the benchmarks without asv.
+
+Examples
+--------
+Run everything and save the results::
+
+    python -m benchmarks.run --output bench.json
+
+Run the T7 parsers only, and compare against saved results::
+
+    python -m benchmarks.run -b ParseT7 --compare bench.json
+"""
+
+import argparse
+import functools
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pkgutil
+import re
+import subprocess
+import sys
+import tempfile
+import timeit
+from typing import Any
+
+BENCHMARK_DIR = os.path.dirname(__file__)
+
+
+def benchmark_classes() -> list[type]:
+    """All benchmark classes, from the ``bench_*`` modules."""
+    classes = []
+    for info in sorted(pkgutil.iter_modules([BENCHMARK_DIR]), key=lambda m: m.name):
+        if not info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(f"benchmarks.{info.name}")
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__ and not name.startswith("_"):
+                classes.append(cls)
+    return classes
+
+
+def param_combinations(cls: type) -> list[tuple]:
+    """Parameter tuples of a benchmark class, as asv expands them."""
+    params = getattr(cls, "params", None)
+    if params is None:
+        return [()]
+    if isinstance(params, tuple):
+        return list(itertools.product(*params))
+    return [(p,) for p in params]
+
+
+def run_class(
+    cls: type,
+    pattern: re.Pattern,
+    repeat: int = 3,
+) -> dict[str, Any]:
+    """
+    Run the matching benchmarks of one class.
+
+    Returns a dict of ``"Class.method(params)"`` to the minimum time in
+    seconds, or to the tracked value.
+    """
+    methods = [
+        name
+        for name, _ in inspect.getmembers(cls, inspect.isfunction)
+        if name.startswith(("time_", "timeraw_", "track_"))
+        and pattern.search(f"{cls.__name__}.{name}")
+    ]
+    if not methods:
+        return {}
+
+    results = {}
+    bench = cls()
+    cache = ()
+    if hasattr(bench, "setup_cache"):
+        cache = (bench.setup_cache(),)
+
+    for params in param_combinations(cls):
+        args = cache + params
+        for name in methods:
+            if hasattr(bench, "setup"):
+                bench.setup(*params)
+            try:
+                method = getattr(bench, name)
+                if name.startswith("time_"):
+                    timer = timeit.Timer(functools.partial(method, *args))
+                    number, _ = timer.autorange()
+                    value = min(timer.repeat(repeat=repeat, number=number)) / number
+                elif name.startswith("timeraw_"):
+                    value = min(timeraw(method(*args)) for _ in range(repeat))
+                else:
+                    value = method(*args)
+            finally:
+                if hasattr(bench, "teardown"):
+                    bench.teardown(*params)
+            key = f"{cls.__name__}.{name}({', '.join(map(str, params))})"
+            results[key] = value
+            print(f"{key:70s} {format_value(name, value)}", file=sys.stderr)
+
+    return results
+
+
+def timeraw(code: str) -> float:
+    """Time of running ``code`` once in a fresh interpreter, in seconds."""
+    script = (
+        "import time; t0 = time.perf_counter()\n"
+        f"{code}\n"
+        "print(time.perf_counter() - t0)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.split()[-1])
+
+
+def format_value(name: str, value: float) -> str:
+    """Human readable benchmark value."""
+    if name.startswith(("time_", "timeraw_")):
+        for unit, factor in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+            if value >= factor:
+                return f"{value / factor:9.3f} {unit}"
+        return f"{value * 1e9:9.3f} ns"
+    if name.startswith("track_peakmem_"):
+        return f"{value / 2**20:9.3f} MiB"
+    return f"{value:9.3g}"
+
+
+def compare(
+    results: dict[str, float],
+    baseline: dict[str, float],
+    threshold: float,
+) -> list[str]:
+    """
+    Benchmarks that got slower or bigger than ``threshold`` times the
+    baseline.
+    """
+    regressions = []
+    for key, value in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if old == 0 and value > 0:
+            regressions.append(f"{key}: {old} -> {value}")
+        elif old and value > threshold * old:
+            regressions.append(f"{key}: {old:.4g} -> {value:.4g} ({value / old:.2f}x)")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "-b", "--bench", default="", help="Regex of Class.method to run"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repeats")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="Regression ratio to the baseline (default 1.5)",
+    )
+    args = parser.parse_args(argv)
+
+    # Subprocesses (timeraw_ benchmarks) import the checkout under test
+    root = os.path.dirname(os.path.abspath(BENCHMARK_DIR))
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [root, os.environ.get("PYTHONPATH")])
+    )
+
+    pattern = re.compile(args.bench)
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # setup_cache writes its files relative to the working directory
+        os.chdir(tmpdir)
+        try:
+            for cls in benchmark_classes():
+                results.update(run_class(cls, pattern, repeat=args.repeat))
+        finally:
+            os.chdir(cwd)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print("Regression:", line, file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
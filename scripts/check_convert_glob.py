@@ -0,0 +1,57 @@
+"""
+Check that ``pysuperfish convert`` with a single quoted glob converts only
+the matching files, keeping their subdirectories below the glob root.
+
+Run by pre-commit on changes to the command-line driver and the converter;
+exits non-zero on failure.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+from superfish.cli import main as pysuperfish
+
+T7FILE = os.path.join(os.path.dirname(__file__), "..", "examples", "data", "SWIFEL.T7")
+
+
+def check_single_glob() -> list[str]:
+    """Problems found converting ``<tmpdir>/**/*.T7``, if any."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.makedirs(os.path.join(tmpdir, "sub"))
+        shutil.copy(T7FILE, os.path.join(tmpdir, "a.T7"))
+        shutil.copy(T7FILE, os.path.join(tmpdir, "sub", "b.T7"))
+        with open(os.path.join(tmpdir, "notes.txt"), "w") as f:
+            f.write("not a T7 file\n")
+
+        output_dir = os.path.join(tmpdir, "out")
+        argv = ["convert", os.path.join(tmpdir, "**", "*.T7")]
+        with redirect_stdout(StringIO()):
+            status = pysuperfish(argv + ["--output-dir", output_dir, "--jobs", "1"])
+
+        written = sorted(
+            os.path.relpath(os.path.join(root, f), output_dir)
+            for root, _, files in os.walk(output_dir)
+            for f in files
+        )
+        expected = ["a.h5", os.path.join("sub", "b.h5")]
+        problems = []
+        if status != 0:
+            problems.append(f"exit status {status}")
+        if written != expected:
+            problems.append(f"wrote {written}, expected {expected}")
+        return problems
+
+
+def main() -> int:
+    problems = check_single_glob()
+    for problem in problems:
+        print(f"pysuperfish convert with a single glob: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
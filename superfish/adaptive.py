@@ -0,0 +1,322 @@
+from typing import TYPE_CHECKING, Any, cast
+
+import numpy as np
+
+from .interpolate import interpolate2d
+from .types import AdaptiveT7Data, FishT7Data, PoissonT7Data
+
+if TYPE_CHECKING:
+    from superfish.superfish import Superfish
+
+
+def t7_magnitude(t7data: FishT7Data | PoissonT7Data) -> np.ndarray:
+    """
+    Field magnitude used to estimate the interpolation error.
+
+    Parameters
+    ----------
+    t7data : FishT7Data or PoissonT7Data
+        Parsed T7 data.
+
+    Returns
+    -------
+    ndarray
+        ``E`` for Fish data, or the magnitude of the r and z components
+        for Poisson data, of shape (nr, nz).
+    """
+    td = cast("dict[str, Any]", t7data)
+    if "E" in td:
+        return td["E"]
+    if "Ez" in td:
+        return np.hypot(td["Er"], td["Ez"])
+    return np.hypot(td["Br"], td["Bz"])
+
+
+def cell_error(data: np.ndarray) -> np.ndarray:
+    """
+    Estimate the bilinear interpolation error in each grid cell.
+
+    Linear interpolation between grid points has an error of about
+    ``h**2 / 8 * |f''|``, which is estimated from the second differences
+    along z and r.
+
+    Parameters
+    ----------
+    data : ndarray
+        Field on the grid, of shape (nr, nz), with nr, nz >= 3.
+
+    Returns
+    -------
+    ndarray
+        Error estimate for each cell, of shape (nr - 1, nz - 1).
+    """
+    err = np.zeros_like(data, dtype=float)
+    d2z = np.abs(data[:, 2:] - 2 * data[:, 1:-1] + data[:, :-2]) / 8
+    d2r = np.abs(data[2:, :] - 2 * data[1:-1, :] + data[:-2, :]) / 8
+    err[:, 1:-1] = d2z
+    err[1:-1, :] = np.maximum(err[1:-1, :], d2r)
+
+    # Edges have no second difference; use the neighboring estimate
+    err[:, 0] = np.maximum(err[:, 0], err[:, 1])
+    err[:, -1] = np.maximum(err[:, -1], err[:, -2])
+    err[0, :] = np.maximum(err[0, :], err[1, :])
+    err[-1, :] = np.maximum(err[-1, :], err[-2, :])
+
+    # A cell's error is the largest of its corners
+    return np.maximum.reduce([err[:-1, :-1], err[:-1, 1:], err[1:, :-1], err[1:, 1:]])
+
+
+def refinement_patches(
+    flagged: np.ndarray,
+    block: int = 4,
+) -> list[tuple[int, int, int, int]]:
+    """
+    Group flagged cells into rectangular patches.
+
+    Cells are binned into ``block`` x ``block`` blocks, and runs of flagged
+    blocks along z are merged, so that each patch needs one SF7 call.
+
+    Parameters
+    ----------
+    flagged : ndarray of bool
+        Cells to refine, of shape (nr - 1, nz - 1).
+    block : int
+        Block size, in cells.
+
+    Returns
+    -------
+    list of tuple
+        ``(ir0, ir1, iz0, iz1)`` grid point index ranges (inclusive) of
+        each patch.
+    """
+    ncr, ncz = flagged.shape
+    nbr = -(-ncr // block)
+    nbz = -(-ncz // block)
+
+    patches = []
+    for ib in range(nbr):
+        ir0 = ib * block
+        ir1 = min(ir0 + block, ncr)
+        row = [
+            flagged[ir0:ir1, jb * block : (jb + 1) * block].any() for jb in range(nbz)
+        ]
+        jb = 0
+        while jb < nbz:
+            if not row[jb]:
+                jb += 1
+                continue
+            jb0 = jb
+            while jb < nbz and row[jb]:
+                jb += 1
+            iz0 = jb0 * block
+            iz1 = min(jb * block, ncz)
+            patches.append((ir0, ir1, iz0, iz1))
+
+    return patches
+
+
+def interpolate2d_adaptive(
+    sf: "Superfish",
+    zmin: float = -1000,
+    zmax: float = 1000,
+    nz: int = 21,
+    rmin: float = 0,
+    rmax: float = 0,
+    nr: int = 21,
+    rtol: float = 1e-3,
+    refine: int = 4,
+    max_level: int = 2,
+    block: int = 4,
+) -> AdaptiveT7Data:
+    """
+    Interpolate the solved field with adaptive grid refinement.
+
+    Starts from a coarse SF7 grid, estimates the interpolation error of
+    each cell with :func:`cell_error`, and requests refined patches from
+    SF7 only where the error exceeds ``rtol`` times the peak field. Patches
+    are refined recursively up to ``max_level``, and reported with
+    ``sf.vprint``.
+
+    Parameters
+    ----------
+    sf : Superfish
+        Superfish object that has been run.
+    zmin, zmax : float
+        z extent of the grid, in the input units of the program.
+    nz : int
+        Number of z points of the coarse grid.
+    rmin, rmax : float
+        Radial extent of the grid, in the input units of the program.
+        Unlike :func:`superfish.interpolate.interpolate2d`, the grid must
+        be two-dimensional: give ``rmax`` greater than ``rmin``.
+    nr : int
+        Number of radius points of the coarse grid, at least 2.
+    rtol : float
+        Error tolerance, relative to the peak field magnitude.
+    refine : int
+        Refinement factor of the grid spacing per level.
+    max_level : int
+        Maximum refinement level. 0 returns only the coarse grid.
+    block : int
+        Cells are grouped into blocks of this size to form patches.
+
+    Returns
+    -------
+    AdaptiveT7Data
+        The coarse grid and the refined patches. Use
+        :func:`sample_adaptive` or :func:`resample_adaptive` to evaluate
+        it.
+
+    Raises
+    ------
+    ValueError
+        If the grid is not two-dimensional.
+    """
+    if not (zmax > zmin and rmax > rmin and nz >= 2 and nr >= 2):
+        raise ValueError(
+            "Adaptive refinement needs a 2D grid, got "
+            f"z = {zmin} to {zmax} ({nz} points), r = {rmin} to {rmax} ({nr} points)"
+        )
+
+    base = interpolate2d(sf, zmin=zmin, zmax=zmax, nz=nz, rmin=rmin, rmax=rmax, nr=nr)
+    scale = np.abs(t7_magnitude(base)).max()
+    tol = rtol * scale
+
+    patches: list[FishT7Data | PoissonT7Data] = []
+    levels: list[int] = []
+
+    parents = [base]
+    for level in range(1, max_level + 1):
+        children = []
+        for parent in parents:
+            if parent["nz"] < 3 or parent["nr"] < 3:
+                continue
+            flagged = cell_error(t7_magnitude(parent)) > tol
+            dz = (parent["zmax"] - parent["zmin"]) / (parent["nz"] - 1)
+            dr = (parent["rmax"] - parent["rmin"]) / (parent["nr"] - 1)
+            for ir0, ir1, iz0, iz1 in refinement_patches(flagged, block=block):
+                kwargs = {
+                    "zmin": parent["zmin"] + iz0 * dz,
+                    "zmax": parent["zmin"] + iz1 * dz,
+                    "nz": (iz1 - iz0) * refine + 1,
+                    "rmin": parent["rmin"] + ir0 * dr,
+                    "rmax": parent["rmin"] + ir1 * dr,
+                    "nr": (ir1 - ir0) * refine + 1,
+                }
+                sf.vprint(f"Level {level} patch:", kwargs)
+                children.append(interpolate2d(sf, **kwargs))
+        patches.extend(children)
+        levels.extend([level] * len(children))
+        parents = children
+        if not children:
+            break
+
+    n_points = base["nz"] * base["nr"] + sum(p["nz"] * p["nr"] for p in patches)
+
+    return AdaptiveT7Data(
+        base=base, patches=patches, levels=levels, rtol=rtol, n_points=n_points
+    )
+
+
+def _bilinear(
+    t7data: FishT7Data | PoissonT7Data,
+    key: str,
+    z: np.ndarray,
+    r: np.ndarray,
+) -> np.ndarray:
+    """Bilinear interpolation of one t7data field at points inside its grid."""
+    data = cast("dict[str, Any]", t7data)[key]
+    nr, nz = data.shape
+    fz = (z - t7data["zmin"]) / (t7data["zmax"] - t7data["zmin"]) * (nz - 1)
+    fr = (r - t7data["rmin"]) / (t7data["rmax"] - t7data["rmin"]) * (nr - 1)
+    iz = np.clip(np.floor(fz).astype(int), 0, nz - 2)
+    ir = np.clip(np.floor(fr).astype(int), 0, nr - 2)
+    wz = fz - iz
+    wr = fr - ir
+    return (
+        data[ir, iz] * (1 - wr) * (1 - wz)
+        + data[ir, iz + 1] * (1 - wr) * wz
+        + data[ir + 1, iz] * wr * (1 - wz)
+        + data[ir + 1, iz + 1] * wr * wz
+    )
+
+
+def sample_adaptive(
+    adata: AdaptiveT7Data,
+    key: str,
+    z: np.ndarray,
+    r: np.ndarray,
+) -> np.ndarray:
+    """
+    Evaluate a field of adaptive data at arbitrary points.
+
+    Each point is bilinearly interpolated from the finest patch that
+    contains it.
+
+    Parameters
+    ----------
+    adata : AdaptiveT7Data
+        Output of :func:`interpolate2d_adaptive`.
+    key : str
+        Field key, e.g. ``"Ez"``.
+    z, r : ndarray
+        Point coordinates, in the input units of the program. Broadcast
+        against each other.
+
+    Returns
+    -------
+    ndarray
+        Field values at the points.
+    """
+    z, r = np.broadcast_arrays(np.asarray(z, dtype=float), np.asarray(r, dtype=float))
+    out = _bilinear(adata["base"], key, z, r)
+
+    # Coarse to fine, so the finest patch wins
+    order = np.argsort(adata["levels"], kind="stable")
+    for i in order:
+        p = adata["patches"][i]
+        inside = (
+            (z >= p["zmin"]) & (z <= p["zmax"]) & (r >= p["rmin"]) & (r <= p["rmax"])
+        )
+        if inside.any():
+            out[inside] = _bilinear(p, key, z[inside], r[inside])
+
+    return out
+
+
+def resample_adaptive(
+    adata: AdaptiveT7Data,
+    nz: int,
+    nr: int,
+) -> FishT7Data | PoissonT7Data:
+    """
+    Resample adaptive data onto a uniform grid over the coarse extent.
+
+    Useful to write a T7 file or build a FieldMesh, which need a uniform
+    grid.
+
+    Parameters
+    ----------
+    adata : AdaptiveT7Data
+        Output of :func:`interpolate2d_adaptive`.
+    nz, nr : int
+        Number of z and radius points.
+
+    Returns
+    -------
+    FishT7Data or PoissonT7Data
+        t7data on the uniform grid.
+    """
+    base = cast("dict[str, Any]", adata["base"])
+    z = np.linspace(base["zmin"], base["zmax"], nz)
+    r = np.linspace(base["rmin"], base["rmax"], nr)
+    Z, R = np.meshgrid(z, r)
+
+    out = dict(base)
+    out["nz"] = nz
+    out["nr"] = nr
+    for key, val in base.items():
+        if isinstance(val, np.ndarray):
+            out[key] = sample_adaptive(adata, key, Z, R)
+
+    return cast("FishT7Data | PoissonT7Data", out)
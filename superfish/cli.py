@@ -0,0 +1,708 @@
+"""
+Command-line driver for headless batch runs.
+
+Every subcommand prints JSON on stdout: a list of results, one dict per
+task, or a summary dict for ``converge``, ``tune``, ``sensitivity``,
+``estimate``, ``queue`` and ``store``. It exits with a nonzero status if
+any task failed. Progress and errors go to stderr.
+
+Examples
+--------
+.. code-block:: bash
+
+    pysuperfish run CAVITY.AM --cache-dir ~/.cache/pysuperfish
+    pysuperfish sweep CAVITY.AM -p GAP=1.0,1.5,2.0 -p RPIPE=2,3 --jobs 8
+    pysuperfish interpolate CAVITY.AM --zmin 0 --zmax 10 --nz 201 --rmax 2 --nr 41
+    pysuperfish convert "archive/**/*.T7" --output-dir h5 --jobs 8
+    pysuperfish converge CAVITY.AM --levels 4 --rtol 1e-5
+    pysuperfish tune CELL.AM --tune REQ --target 1300 -p GAP=4.5 --x0 10.2
+    pysuperfish sensitivity CELL.AM -p GAP=4.5 -p REQ=10.2 --jobs 9
+    pysuperfish estimate case_*.AM --history runs.sqlite --jobs 8
+    pysuperfish queue submit /shared/q.sqlite CAVITY.AM -p GAP=1,2,3
+    pysuperfish queue work /shared/q.sqlite --jobs 32 --cache-dir /shared/cache
+    pysuperfish store import results/ gap_sweep/
+    pysuperfish store query results/ -w GAP=4.5:5.0 -w Frequency=1299:1301
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from glob import glob, has_magic
+from typing import Any
+
+from .runner import ResultEncoder, expand_template, run_tasks
+
+
+def parse_timeout(spec: str) -> float | dict[str, float]:
+    """
+    Parse a ``--timeout`` value.
+
+    Parameters
+    ----------
+    spec : str
+        Seconds for every program, e.g. ``"600"``, or per program, e.g.
+        ``"autofish=600,sf7=60"``.
+
+    Returns
+    -------
+    float or dict
+        See the ``timeout`` argument of :class:`superfish.Superfish`.
+    """
+    if "=" not in spec:
+        return float(spec)
+    out = {}
+    for item in spec.split(","):
+        name, value = item.split("=", 1)
+        out[name.strip().lower()] = float(value)
+    return out
+
+
+def parse_sweep_params(specs: list[str]) -> dict[str, list[str]]:
+    """
+    Parse ``NAME=v1,v2,...`` sweep specifications.
+
+    Parameters
+    ----------
+    specs : list of str
+        Specifications, e.g. ``["GAP=1.0,1.5", "RPIPE=2"]``.
+
+    Returns
+    -------
+    dict
+        Parameter name to list of values, as strings.
+    """
+    params = {}
+    for spec in specs:
+        if "=" not in spec:
+            raise ValueError(f"Sweep parameter must be NAME=v1,v2,...: {spec}")
+        name, values = spec.split("=", 1)
+        params[name.strip()] = [v.strip() for v in values.split(",") if v.strip()]
+    return params
+
+
+def _run_options(args: argparse.Namespace) -> dict[str, Any]:
+    return {
+        "problem": args.problem,
+        "cache_dir": args.cache_dir,
+        "container_method": args.container_method,
+        "history": args.history,
+        "timeout": args.timeout,
+        "retries": args.retries,
+        "cpus": args.cpus,
+        "memory": args.memory,
+    }
+
+
+def _print_progress(result: dict[str, Any]) -> None:
+    msg = f"{result['status']:>7}: {result['input']}"
+    if result["status"] == "failed":
+        msg += f" ({result['error']})"
+    print(msg, file=sys.stderr)
+
+
+def _run_tasks(args: argparse.Namespace, tasks: list) -> list[dict[str, Any]]:
+    return run_tasks(
+        tasks,
+        jobs=args.jobs,
+        history=args.history,
+        problem=args.problem,
+        progress=_print_progress,
+    )
+
+
+def cmd_run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    tasks = [(f, _run_options(args), {}) for f in args.automesh]
+    return _run_tasks(args, tasks)
+
+
+def cmd_sweep(args: argparse.Namespace) -> list[dict[str, Any]]:
+    params = parse_sweep_params(args.param)
+    if args.journal:
+        from .journal import run_sweep
+
+        options = _run_options(args)
+        results = run_sweep(
+            args.template,
+            params,
+            args.journal,
+            problem=options.pop("problem"),
+            jobs=args.jobs,
+            **options,
+        )
+        for r in results:
+            msg = f"{r['status']:>9}: {r['params']}"
+            if r["status"] == "failed":
+                msg += f" ({r['error']})"
+            print(msg, file=sys.stderr)
+        return results
+
+    # Expanded inputs are small; keep them next to the cache if there is one
+    base = args.cache_dir or tempfile.gettempdir()
+    os.makedirs(base, exist_ok=True)
+    sweep_dir = tempfile.mkdtemp(prefix="sweep_", dir=base)
+    try:
+        cases = expand_template(args.template, params, sweep_dir)
+        tasks = [(f, _run_options(args), {"params": p}) for f, p in cases]
+        results = _run_tasks(args, tasks)
+    finally:
+        shutil.rmtree(sweep_dir, ignore_errors=True)
+    for r in results:
+        # The expanded file is gone; report the template instead
+        r["input"] = os.path.abspath(args.template)
+    return results
+
+
+def cmd_interpolate(args: argparse.Namespace) -> list[dict[str, Any]]:
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = []
+    for f in args.automesh:
+        stem = os.path.splitext(os.path.basename(f))[0]
+        options = _run_options(args)
+        options["interpolate"] = {
+            "zmin": args.zmin,
+            "zmax": args.zmax,
+            "nz": args.nz,
+            "rmin": args.rmin,
+            "rmax": args.rmax,
+            "nr": args.nr,
+            "symmetry": args.symmetry,
+            "output": os.path.join(output_dir, stem + ".h5"),
+        }
+        tasks.append((f, options, {}))
+    return _run_tasks(args, tasks)
+
+
+def cmd_converge(args: argparse.Namespace) -> dict[str, Any]:
+    from .convergence import DEFAULT_QUANTITIES, mesh_convergence
+
+    options = _run_options(args)
+    return dict(
+        mesh_convergence(
+            args.automesh,
+            levels=args.levels,
+            ratio=args.ratio,
+            quantities=args.quantity or DEFAULT_QUANTITIES,
+            rtol=args.rtol,
+            jobs=args.jobs if args.jobs > 1 else None,
+            **options,
+        )
+    )
+
+
+def cmd_tune(args: argparse.Namespace) -> dict[str, Any]:
+    from .tuning import tune
+
+    store = None
+    if args.store:
+        from .store import ResultsStore
+
+        store = ResultsStore(args.store)
+    fixed = {k: v[0] for k, v in parse_sweep_params(args.param).items()}
+    options = _run_options(args)
+    result = tune(
+        args.template,
+        args.tune,
+        args.target,
+        x0=args.x0,
+        x1=args.x1,
+        bracket=tuple(args.bracket) if args.bracket else None,
+        fixed=fixed,
+        quantity=args.quantity,
+        ftol=args.ftol,
+        max_solves=args.max_solves,
+        store=store,
+        problem=options.pop("problem"),
+        **options,
+    )
+    for s in result["steps"]:
+        print(
+            f"{s['status']:>7}: {args.tune} = {s['value']}: {s['result']}",
+            file=sys.stderr,
+        )
+    return dict(result)
+
+
+def cmd_sensitivity(args: argparse.Namespace) -> dict[str, Any]:
+    from .sensitivity import DEFAULT_QUANTITIES, sensitivity
+
+    params = {k: float(v[0]) for k, v in parse_sweep_params(args.param).items()}
+    options = _run_options(args)
+    return dict(
+        sensitivity(
+            args.template,
+            params,
+            quantities=args.quantity or DEFAULT_QUANTITIES,
+            vary=args.vary,
+            scheme=args.scheme,
+            step=args.step,
+            relative=not args.absolute,
+            estimate_error=not args.no_error,
+            jobs=args.jobs,
+            **options,
+        )
+    )
+
+
+def cmd_estimate(args: argparse.Namespace) -> dict[str, Any]:
+    from .history import RunHistory
+
+    return RunHistory(args.history).estimate(
+        args.automesh, problem=args.problem, jobs=args.jobs
+    )
+
+
+def cmd_queue_submit(args: argparse.Namespace) -> list[dict[str, Any]]:
+    from .workqueue import WorkQueue
+
+    queue = WorkQueue(args.queue)
+    history = None
+    if args.history:
+        from .history import RunHistory
+
+        history = RunHistory(args.history)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.param:
+            if len(args.automesh) != 1:
+                raise ValueError("A sweep (-p) takes a single template")
+            template = args.automesh[0]
+            cases = expand_template(template, parse_sweep_params(args.param), tmpdir)
+        else:
+            cases = [(f, {}) for f in args.automesh]
+
+        results = []
+        for file, params in cases:
+            # Longest predicted runtime is claimed first
+            priority = 0.0
+            if history:
+                priority = history.predict_file(file, problem=args.problem) or 0.0
+            task_id = queue.submit(
+                file, problem=args.problem, params=params, priority=priority
+            )
+            results.append(
+                {
+                    "input": os.path.abspath(file) if not params else template,
+                    "status": "queued",
+                    "id": task_id,
+                    "params": params,
+                    "priority": priority,
+                }
+            )
+    return results
+
+
+def cmd_queue_work(args: argparse.Namespace) -> dict[str, Any]:
+    from .workqueue import WorkQueue, run_workers
+
+    options = _run_options(args)
+    del options["problem"]  # from each task
+    n = run_workers(
+        args.queue,
+        jobs=args.jobs,
+        heartbeat_interval=args.heartbeat,
+        stale_after=args.stale_after,
+        poll_interval=args.poll,
+        exit_when_done=not args.forever,
+        **options,
+    )
+    return {"tasks_run": n, "counts": WorkQueue(args.queue).counts()}
+
+
+def cmd_queue_status(args: argparse.Namespace) -> dict[str, Any]:
+    from .workqueue import WorkQueue
+
+    queue = WorkQueue(args.queue)
+    if args.retry_failed:
+        queue.retry_failed()
+    out: dict[str, Any] = {"counts": queue.counts()}
+    if args.tasks:
+        out["tasks"] = queue.tasks()
+    return out
+
+
+def parse_query_conditions(specs: list[str]) -> dict[str, Any]:
+    """
+    Parse ``NAME=MIN:MAX`` or ``NAME=VALUE`` query conditions.
+
+    Parameters
+    ----------
+    specs : list of str
+        Conditions, e.g. ``["GAP=4.5:5.0", "Frequency=1299:1301", "Q=:1e4"]``.
+        Either end of a range may be empty.
+
+    Returns
+    -------
+    dict
+        Conditions for :meth:`superfish.store.ResultsStore.query`.
+    """
+    out: dict[str, Any] = {}
+    for spec in specs:
+        if "=" not in spec:
+            raise ValueError(f"Condition must be NAME=MIN:MAX or NAME=VALUE: {spec}")
+        name, value = spec.split("=", 1)
+        if ":" in value:
+            lo, hi = value.split(":", 1)
+            out[name.strip()] = (
+                float(lo) if lo.strip() else None,
+                float(hi) if hi.strip() else None,
+            )
+        else:
+            try:
+                out[name.strip()] = float(value)
+            except ValueError:
+                out[name.strip()] = value.strip()
+    return out
+
+
+def cmd_store_import(args: argparse.Namespace) -> dict[str, Any]:
+    from .store import ResultsStore
+
+    store = ResultsStore(args.store)
+    n = sum(store.import_journal(j, overwrite=args.overwrite) for j in args.journal)
+    return {"imported": n, "runs": len(store)}
+
+
+def cmd_store_query(args: argparse.Namespace) -> dict[str, Any]:
+    from .store import ResultsStore
+
+    runs = ResultsStore(args.store).query(parse_query_conditions(args.where))
+    return {"count": len(runs), "runs": runs}
+
+
+def cmd_convert(args: argparse.Namespace) -> list[dict[str, Any]]:
+    from .convert import convert_t7_files
+
+    if len(args.pattern) == 1:
+        # A single pattern keeps the subdirectories below its glob root
+        pattern: str | list[str] = args.pattern[0]
+    else:
+        pattern = []
+        for p in args.pattern:
+            # Literal paths without matches are kept, and reported as failed
+            pattern += glob(p, recursive=True) if has_magic(p) else [p]
+    results = convert_t7_files(
+        pattern,
+        output_dir=args.output_dir,
+        output_format=args.format,
+        type=args.type,
+        max_workers=args.jobs,
+        overwrite=args.overwrite,
+    )
+    for r in results:
+        if r["status"] == "failed":
+            print(f"failed: {r['input']} ({r['error']})", file=sys.stderr)
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """The ``pysuperfish`` argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="pysuperfish",
+        description="Run Poisson Superfish headless, with JSON results on stdout.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Number of parallel worker processes"
+    )
+
+    solver = argparse.ArgumentParser(add_help=False, parents=[common])
+    solver.add_argument(
+        "--problem", choices=["fish", "poisson"], default="fish", help="Problem type"
+    )
+    solver.add_argument(
+        "--cache-dir",
+        default=os.environ.get("PYSUPERFISH_CACHE_DIR"),
+        help="Shared cache of runs, keyed by input hash "
+        "(default: $PYSUPERFISH_CACHE_DIR, or no cache)",
+    )
+    solver.add_argument(
+        "--history",
+        default=os.environ.get("PYSUPERFISH_HISTORY"),
+        help="Run-history database: records runs, and starts the longest "
+        "predicted runs first (default: $PYSUPERFISH_HISTORY, or none)",
+    )
+    solver.add_argument(
+        "--container-method",
+        choices=["docker", "shifter", "singularity"],
+        help="Container method (default: auto-detect)",
+    )
+    solver.add_argument(
+        "--timeout",
+        type=parse_timeout,
+        help="Time limit in seconds for each program, or per program as "
+        "autofish=600,sf7=60",
+    )
+    solver.add_argument(
+        "--retries",
+        type=int,
+        default=0,
+        help="Retries of a container that fails to launch, with backoff",
+    )
+    solver.add_argument("--cpus", type=float, help="Container CPU limit")
+    solver.add_argument("--memory", help="Container memory limit, e.g. 4g")
+
+    p = subparsers.add_parser("run", parents=[solver], help="Run automesh files")
+    p.add_argument("automesh", nargs="+", help="Automesh (.AM) files")
+    p.set_defaults(func=cmd_run)
+
+    p = subparsers.add_parser(
+        "sweep", parents=[solver], help="Run a parameter sweep over a template"
+    )
+    p.add_argument("template", help="Automesh template with {NAME} placeholders")
+    p.add_argument(
+        "-p",
+        "--param",
+        action="append",
+        default=[],
+        required=True,
+        help="Sweep parameter NAME=v1,v2,... (repeat for a grid)",
+    )
+    p.add_argument(
+        "--journal",
+        help="Journal directory: completed points and their artifacts are "
+        "saved as they finish, and a rerun skips them",
+    )
+    p.set_defaults(func=cmd_sweep)
+
+    p = subparsers.add_parser(
+        "interpolate",
+        parents=[solver],
+        help="Run and write the interpolated field map as openPMD HDF5",
+    )
+    p.add_argument("automesh", nargs="+", help="Automesh (.AM) files")
+    p.add_argument("--zmin", type=float, default=-100)
+    p.add_argument("--zmax", type=float, default=100)
+    p.add_argument("--nz", type=int, default=0, help="Number of z points")
+    p.add_argument("--rmin", type=float, default=0)
+    p.add_argument("--rmax", type=float, default=100)
+    p.add_argument("--nr", type=int, default=0, help="Number of radius points")
+    p.add_argument(
+        "--symmetry",
+        choices=["even", "odd"],
+        help="Mirror symmetry of the axial field about z = 0",
+    )
+    p.add_argument(
+        "--output-dir", default=".", help="Directory for the <name>.h5 files"
+    )
+    p.set_defaults(func=cmd_interpolate)
+
+    p = subparsers.add_parser(
+        "converge",
+        parents=[solver],
+        help="Mesh-convergence study with Richardson extrapolation",
+    )
+    p.add_argument("automesh", help="Automesh (.AM) file setting DX in &reg")
+    p.add_argument("--levels", type=int, default=3, help="Number of meshes")
+    p.add_argument(
+        "--ratio", type=float, default=2**0.5, help="Refinement ratio between meshes"
+    )
+    p.add_argument(
+        "-q",
+        "--quantity",
+        action="append",
+        help="SFO summary quantity (repeat; default: Frequency, Q, MaxE, MaxH)",
+    )
+    p.add_argument(
+        "--rtol",
+        type=float,
+        default=1e-4,
+        help="Relative error target for the recommended mesh spacing",
+    )
+    p.set_defaults(func=cmd_converge)
+
+    p = subparsers.add_parser(
+        "tune",
+        parents=[solver],
+        help="Tune one template parameter to a target frequency",
+    )
+    p.add_argument("template", help="Automesh template with {NAME} placeholders")
+    p.add_argument("--tune", required=True, help="Name of the tuned parameter")
+    p.add_argument("--target", type=float, required=True, help="Target value, e.g. MHz")
+    p.add_argument(
+        "-p",
+        "--param",
+        action="append",
+        default=[],
+        help="Fixed template parameter NAME=VALUE (repeat)",
+    )
+    p.add_argument("--x0", type=float, help="Starting value of the tuned parameter")
+    p.add_argument("--x1", type=float, help="Second value of the tuned parameter")
+    p.add_argument(
+        "--bracket",
+        type=float,
+        nargs=2,
+        metavar=("LO", "HI"),
+        help="Values of the tuned parameter that bracket the target",
+    )
+    p.add_argument(
+        "--quantity", default="Frequency", help="SFO summary quantity to tune"
+    )
+    p.add_argument("--ftol", type=float, default=1e-3, help="Tolerance on the target")
+    p.add_argument("--max-solves", type=int, default=12)
+    p.add_argument(
+        "--store",
+        help="Results store: warm start from tuned neighbors, and record solves",
+    )
+    p.set_defaults(func=cmd_tune)
+
+    p = subparsers.add_parser(
+        "sensitivity",
+        parents=[solver],
+        help="Finite-difference Jacobian of summary quantities",
+    )
+    p.add_argument("template", help="Automesh template with {NAME} placeholders")
+    p.add_argument(
+        "-p",
+        "--param",
+        action="append",
+        default=[],
+        required=True,
+        help="Nominal template parameter NAME=VALUE (repeat)",
+    )
+    p.add_argument(
+        "--vary",
+        action="append",
+        help="Parameter to differentiate with respect to (repeat; default: all)",
+    )
+    p.add_argument(
+        "-q",
+        "--quantity",
+        action="append",
+        help="SFO summary quantity (repeat; default: Frequency, Q, r/Q, MaxE, MaxH)",
+    )
+    p.add_argument(
+        "--scheme", choices=["forward", "central", "richardson"], default="central"
+    )
+    p.add_argument("--step", type=float, default=1e-3, help="Relative step size")
+    p.add_argument(
+        "--absolute", action="store_true", help="The step is absolute, not relative"
+    )
+    p.add_argument(
+        "--no-error",
+        action="store_true",
+        help="Skip the extra runs of the error estimate",
+    )
+    p.set_defaults(func=cmd_sensitivity)
+
+    p = subparsers.add_parser(
+        "estimate",
+        parents=[solver],
+        help="Predict runtimes from the run history, without running",
+    )
+    p.add_argument("automesh", nargs="+", help="Automesh (.AM) files")
+    p.set_defaults(func=cmd_estimate)
+
+    p = subparsers.add_parser("queue", help="Multi-host work queue on shared storage")
+    queue = p.add_subparsers(dest="queue_command", required=True)
+
+    q = queue.add_parser("submit", parents=[solver], help="Add runs to a queue")
+    q.add_argument("queue", help="Queue database file, on shared storage")
+    q.add_argument("automesh", nargs="+", help="Automesh files, or one template")
+    q.add_argument(
+        "-p",
+        "--param",
+        action="append",
+        default=[],
+        help="Sweep parameter NAME=v1,v2,... over a template",
+    )
+    q.set_defaults(func=cmd_queue_submit)
+
+    q = queue.add_parser(
+        "work", parents=[solver], help="Run --jobs workers on this host"
+    )
+    q.add_argument("queue", help="Queue database file, on shared storage")
+    q.add_argument(
+        "--heartbeat", type=float, default=30, help="Seconds between heartbeats"
+    )
+    q.add_argument(
+        "--stale-after",
+        type=float,
+        default=120,
+        help="Requeue tasks without a heartbeat for this many seconds",
+    )
+    q.add_argument(
+        "--poll", type=float, default=10, help="Seconds between polls when idle"
+    )
+    q.add_argument(
+        "--forever", action="store_true", help="Keep polling when the queue is empty"
+    )
+    q.set_defaults(func=cmd_queue_work)
+
+    q = queue.add_parser("status", help="Task counts and results")
+    q.add_argument("queue", help="Queue database file")
+    q.add_argument("--tasks", action="store_true", help="Include every task")
+    q.add_argument(
+        "--retry-failed", action="store_true", help="Requeue failed tasks first"
+    )
+    q.set_defaults(func=cmd_queue_status)
+
+    p = subparsers.add_parser("store", help="Indexed store of solved runs")
+    store = p.add_subparsers(dest="store_command", required=True)
+
+    q = store.add_parser("import", help="Index the completed points of sweep journals")
+    q.add_argument("store", help="Store directory")
+    q.add_argument("journal", nargs="+", help="Sweep journal directories")
+    q.add_argument("--overwrite", action="store_true", help="Re-import known points")
+    q.set_defaults(func=cmd_store_import)
+
+    q = store.add_parser("query", help="Runs matching parameter and summary ranges")
+    q.add_argument("store", help="Store directory")
+    q.add_argument(
+        "-w",
+        "--where",
+        action="append",
+        default=[],
+        help="Condition NAME=MIN:MAX or NAME=VALUE (repeat for AND)",
+    )
+    q.set_defaults(func=cmd_store_query)
+
+    p = subparsers.add_parser(
+        "convert", parents=[common], help="Convert T7 files to HDF5 or npz"
+    )
+    p.add_argument("pattern", nargs="+", help="T7 files or glob patterns")
+    p.add_argument("--output-dir", help="Output directory (default: next to input)")
+    p.add_argument("--format", choices=["h5", "npz"], default="h5")
+    p.add_argument(
+        "--type",
+        choices=["electric", "magnetic"],
+        help="Field type, required for Poisson T7 files",
+    )
+    p.add_argument("--overwrite", action="store_true", help="Convert up-to-date files")
+    p.set_defaults(func=cmd_convert)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Entry point of the ``pysuperfish`` command.
+
+    Returns
+    -------
+    int
+        Exit status: 0 if all tasks succeeded, 1 otherwise.
+    """
+    args = build_parser().parse_args(argv)
+
+    try:
+        results = args.func(args)
+    except ValueError as ex:
+        print(f"error: {ex}", file=sys.stderr)
+        return 2
+
+    json.dump(results, sys.stdout, indent=2, cls=ResultEncoder)
+    sys.stdout.write("\n")
+
+    if isinstance(results, dict):
+        return 0
+    return int(any(r["status"] == "failed" for r in results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
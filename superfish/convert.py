@@ -0,0 +1,288 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob, has_magic
+from typing import Any
+
+from .parsers import parse_fish_t7, parse_poisson_t7, parse_t7_header
+from .writers import write_binary_t7, write_t7_openpmd
+
+OUTPUT_EXTENSIONS = {"h5": ".h5", "npz": ".npz"}
+
+
+def glob_root(pattern: str) -> str:
+    """
+    Directory part of a glob pattern before the first wildcard.
+
+    Parameters
+    ----------
+    pattern : str
+        Glob pattern, e.g. ``"archive/**/*.T7"``.
+
+    Returns
+    -------
+    str
+        E.g. ``"archive"``, or ``"."`` if the pattern starts with a wildcard.
+    """
+    parts = []
+    for part in os.path.dirname(pattern).split(os.sep):
+        if has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or (os.sep if pattern.startswith(os.sep) else ".")
+
+
+def output_filename(
+    t7file: str,
+    output_dir: str | None = None,
+    output_format: str = "h5",
+    root: str | None = None,
+) -> str:
+    """
+    Output path for a converted T7 file.
+
+    Parameters
+    ----------
+    t7file : str
+        Path to the T7 file.
+    output_dir : str, optional
+        Output directory. Defaults to the directory of ``t7file``.
+    output_format : {"h5", "npz"}
+        Output format.
+    root : str, optional
+        With ``output_dir``, the subdirectory of ``t7file`` relative to
+        ``root`` is kept under ``output_dir``, so that files with the same
+        name in different directories do not collide.
+
+    Returns
+    -------
+    str
+        ``<output_dir>/[<subdir>/]<basename>.h5`` or ``.npz``.
+    """
+    if output_format not in OUTPUT_EXTENSIONS:
+        options = ", ".join(sorted(OUTPUT_EXTENSIONS))
+        raise ValueError(
+            f"Unknown output_format {output_format!r}; choose from: {options}"
+        )
+    path, fname = os.path.split(os.path.abspath(t7file))
+    if output_dir is None:
+        output_dir = path
+    elif root is not None:
+        subdir = os.path.relpath(path, os.path.abspath(root))
+        if subdir != "." and not subdir.startswith(os.pardir):
+            output_dir = os.path.join(output_dir, subdir)
+    basename = os.path.splitext(fname)[0]
+    return os.path.join(output_dir, basename + OUTPUT_EXTENSIONS[output_format])
+
+
+def is_up_to_date(t7file: str, outfile: str) -> bool:
+    """
+    Check whether an output file exists and is newer than its T7 file.
+
+    Parameters
+    ----------
+    t7file : str
+        Path to the T7 file.
+    outfile : str
+        Path to the converted file.
+
+    Returns
+    -------
+    bool
+        True if ``outfile`` exists and was modified after ``t7file``.
+    """
+    return os.path.exists(outfile) and os.path.getmtime(outfile) >= os.path.getmtime(
+        t7file
+    )
+
+
+def convert_t7_file(
+    t7file: str,
+    outfile: str,
+    output_format: str = "h5",
+    type: str | None = None,
+    **kwargs: Any,
+) -> str:
+    """
+    Convert a single T7 file.
+
+    The output is written to a temporary file and renamed into place, so
+    an interrupted conversion never leaves a partial file that looks up to
+    date.
+
+    Parameters
+    ----------
+    t7file : str
+        Path to the T7 file.
+    outfile : str
+        Path of the file to write.
+    output_format : {"h5", "npz"}
+        ``"h5"`` writes an openPMD-beamphysics field mesh with
+        :func:`superfish.writers.write_t7_openpmd`, ``"npz"`` a binary T7
+        file with :func:`superfish.writers.write_binary_t7`.
+    type : {"electric", "magnetic"}, optional
+        Type of field data. Required for Poisson T7 files.
+    **kwargs
+        Passed to the writer.
+
+    Returns
+    -------
+    str
+        The filename written to.
+    """
+    if output_format not in OUTPUT_EXTENSIONS:
+        raise ValueError(f"Unknown output_format: {output_format}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(outfile)), exist_ok=True)
+    tmpfile = f"{outfile}.{os.getpid()}.tmp" + OUTPUT_EXTENSIONS[output_format]
+
+    try:
+        if output_format == "h5":
+            write_t7_openpmd(tmpfile, t7file, type=type, **kwargs)
+        else:
+            header, _ = parse_t7_header(t7file)
+            if header["problem"] == "fish":
+                t7data = parse_fish_t7(t7file)
+            else:
+                if type is None:
+                    raise ValueError("type is required for Poisson T7 files")
+                t7data = parse_poisson_t7(t7file, type=type)
+            write_binary_t7(tmpfile, t7data, **kwargs)
+        os.replace(tmpfile, outfile)
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+    return outfile
+
+
+def _convert_task(args: tuple[str, str, str, str | None, dict[str, Any]]) -> dict:
+    """
+    Worker entry point for :func:`convert_t7_files`. Never raises.
+    """
+    t7file, outfile, output_format, type, kwargs = args
+    try:
+        convert_t7_file(
+            t7file, outfile, output_format=output_format, type=type, **kwargs
+        )
+    except (OSError, ValueError, KeyError, IndexError, AssertionError) as ex:
+        # Unreadable, malformed, or unwritable files; the parsers assert
+        # on some malformed input
+        return {
+            "input": t7file,
+            "output": outfile,
+            "status": "failed",
+            "error": str(ex),
+        }
+    return {"input": t7file, "output": outfile, "status": "converted", "error": None}
+
+
+def convert_t7_files(
+    pattern: str | list[str],
+    output_dir: str | None = None,
+    output_format: str = "h5",
+    type: str | None = None,
+    max_workers: int | None = None,
+    overwrite: bool = False,
+    verbose: bool = False,
+    **kwargs: Any,
+) -> list[dict[str, Any]]:
+    """
+    Convert many T7 files in parallel worker processes.
+
+    Files whose output already exists and is newer than the T7 file are
+    skipped unless ``overwrite`` is set. A failure in one file does not
+    stop the others; it is reported in the results.
+
+    Parameters
+    ----------
+    pattern : str or list of str
+        Glob pattern (``**`` is recursive), or an explicit list of T7
+        files.
+    output_dir : str, optional
+        Output directory. Defaults to the directory of each T7 file. The
+        subdirectories below the glob root (the directory part of
+        ``pattern`` before the first wildcard), or below the common
+        directory of an explicit list, are kept under it.
+    output_format : {"h5", "npz"}
+        Output format. See :func:`convert_t7_file`.
+    type : {"electric", "magnetic"}, optional
+        Type of field data. Required for Poisson T7 files.
+    max_workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    overwrite : bool
+        Convert even if the output is up to date.
+    verbose : bool
+        Print a line per file.
+    **kwargs
+        Passed to the writer, e.g. ``compression="lzf"``.
+
+    Returns
+    -------
+    list of dict
+        One dict per T7 file, in sorted input order, with keys ``input``,
+        ``output``, ``status`` (``"converted"``, ``"skipped"`` or
+        ``"failed"``), and ``error``.
+
+    Raises
+    ------
+    ValueError
+        If two T7 files would be written to the same output file.
+
+    Examples
+    --------
+    >>> convert_t7_files("archive/**/*.T7", output_dir="h5", max_workers=8)
+    """
+    if isinstance(pattern, str):
+        t7files = sorted(glob(pattern, recursive=True))
+        root = glob_root(pattern)
+    else:
+        t7files = sorted(set(pattern))
+        root = (
+            os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in t7files])
+            if t7files
+            else None
+        )
+
+    outfiles = {
+        t7file: output_filename(t7file, output_dir, output_format, root)
+        for t7file in t7files
+    }
+    seen: dict[str, str] = {}
+    for t7file, outfile in outfiles.items():
+        key = os.path.normcase(outfile)
+        if key in seen:
+            raise ValueError(f"{seen[key]} and {t7file} both convert to {outfile}")
+        seen[key] = t7file
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results: dict[str, dict[str, Any]] = {}
+    tasks = []
+    for t7file in t7files:
+        outfile = outfiles[t7file]
+        if not overwrite and is_up_to_date(t7file, outfile):
+            results[t7file] = {
+                "input": t7file,
+                "output": outfile,
+                "status": "skipped",
+                "error": None,
+            }
+            continue
+        tasks.append((t7file, outfile, output_format, type, kwargs))
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for result in pool.map(_convert_task, tasks):
+                results[result["input"]] = result
+
+    output = [results[t7file] for t7file in t7files]
+
+    if verbose:
+        for r in output:
+            msg = f"{r['status']:>9}: {r['input']} -> {r['output']}"
+            if r["error"]:
+                msg += f" ({r['error']})"
+            print(msg)
+
+    return output
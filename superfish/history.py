@@ -0,0 +1,388 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
+from time import time
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from .types import RunRecord
+
+if TYPE_CHECKING:
+    from superfish.superfish import Superfish
+
+# Default database, overridable with PYSUPERFISH_HISTORY
+DEFAULT_HISTORY_FILE = os.path.join("~", ".cache", "pysuperfish", "history.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    input_hash TEXT NOT NULL,
+    basename TEXT,
+    problem TEXT NOT NULL,
+    dx REAL,
+    nodes INTEGER,
+    elapsed REAL NOT NULL,
+    stages TEXT NOT NULL,
+    peak_memory INTEGER,
+    host TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_input_hash ON runs (input_hash);
+CREATE INDEX IF NOT EXISTS runs_problem ON runs (problem);
+"""
+
+_COLUMNS = (
+    "timestamp",
+    "input_hash",
+    "basename",
+    "problem",
+    "dx",
+    "nodes",
+    "elapsed",
+    "stages",
+    "peak_memory",
+    "host",
+)
+
+
+def input_hash(lines: list[str]) -> str:
+    """
+    Hash of automesh input lines.
+
+    Parameters
+    ----------
+    lines : list of str
+        Automesh file lines, as in ``Superfish.input["automesh"]``.
+
+    Returns
+    -------
+    str
+        sha256 hex digest.
+    """
+    return hashlib.sha256("".join(lines).encode()).hexdigest()
+
+
+def automesh_dx(lines: list[str]) -> float | None:
+    """
+    Basic mesh spacing ``DX`` from the ``&reg`` namelist of an automesh file.
+
+    Parameters
+    ----------
+    lines : list of str
+        Automesh file lines.
+
+    Returns
+    -------
+    float or None
+        The mesh spacing, in the input units, or None if ``&reg`` does not
+        set ``DX`` (e.g. the mesh is given by ``XREG``/``KREG``).
+    """
+    # Strip comments, then take the text from &reg to the closing &
+    text = "\n".join(re.split(r"[;!]", line, maxsplit=1)[0] for line in lines)
+    m = re.search(r"&reg\b(.*?)&", text, flags=re.IGNORECASE | re.DOTALL)
+    if not m:
+        return None
+    dx = re.search(
+        r"\bdx\s*=\s*([-+]?[0-9.]+(?:[edED][-+]?\d+)?)", m.group(1), re.IGNORECASE
+    )
+    if not dx:
+        return None
+    return float(dx.group(1).upper().replace("D", "E"))
+
+
+def superfish_nodes(sf: "Superfish") -> int | None:
+    """
+    Number of mesh nodes of a run, ``(KMAX+2)*(LMAX+2)``.
+
+    Parameters
+    ----------
+    sf : Superfish
+        Superfish object with its output loaded.
+
+    Returns
+    -------
+    int or None
+        ``ITOT`` from the SFO header variables, or None if unavailable.
+    """
+    variables = sf.output.get("sfo", {}).get("header", {}).get("variable", {})
+    if "ITOT" in variables:
+        return int(variables["ITOT"])
+    if "KMAX" in variables and "LMAX" in variables:
+        return int((variables["KMAX"] + 2) * (variables["LMAX"] + 2))
+    return None
+
+
+class RunHistory:
+    """
+    SQLite database of Superfish runs, for runtime prediction.
+
+    Every run records its input hash, the ``&reg`` mesh spacing ``dx``,
+    the node count, the duration of each program stage, and the peak
+    memory of the solver processes. :meth:`predict` estimates the runtime
+    of a new input from that history, and :meth:`longest_first` orders a
+    sweep so the slowest jobs start first.
+
+    Parameters
+    ----------
+    filename : str, optional
+        Database file. Defaults to the ``PYSUPERFISH_HISTORY`` environment
+        variable, or ``~/.cache/pysuperfish/history.sqlite``.
+
+    Examples
+    --------
+    >>> history = RunHistory()
+    >>> history.predict(SF.input["automesh"], problem="fish")
+    41.7
+    >>> files = history.longest_first(["A.AM", "B.AM", "C.AM"])
+    """
+
+    def __init__(self, filename: str | None = None) -> None:
+        if filename is None:
+            filename = os.environ.get("PYSUPERFISH_HISTORY", DEFAULT_HISTORY_FILE)
+        self.filename = os.path.abspath(os.path.expanduser(filename))
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One transaction per connection. Several sweep workers may record at
+        # once, so wait for locks.
+        con = sqlite3.connect(self.filename, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def record(self, record: RunRecord) -> int:
+        """
+        Add a run.
+
+        Parameters
+        ----------
+        record : RunRecord
+            Run to add.
+
+        Returns
+        -------
+        int
+            Row id of the run.
+        """
+        with self._connect() as con:
+            cur = con.execute(
+                f"INSERT INTO runs ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                (
+                    record.get("timestamp", time()),
+                    record["input_hash"],
+                    record.get("basename"),
+                    record["problem"],
+                    record.get("dx"),
+                    record.get("nodes"),
+                    record["elapsed"],
+                    json.dumps(record.get("stages", {})),
+                    record.get("peak_memory"),
+                    record.get("host"),
+                ),
+            )
+        return int(cur.lastrowid or 0)
+
+    def record_superfish(self, sf: "Superfish") -> int:
+        """
+        Add the last run of a Superfish object.
+
+        Parameters
+        ----------
+        sf : Superfish
+            Superfish object that has been run, with ``run_info`` set by
+            :meth:`superfish.Superfish.run`.
+
+        Returns
+        -------
+        int
+            Row id of the run.
+        """
+        lines = sf.input["automesh"]
+        info = sf.run_info
+        return self.record(
+            RunRecord(
+                input_hash=input_hash(lines),
+                basename=sf.basename,
+                problem=sf.problem,
+                dx=automesh_dx(lines),
+                nodes=superfish_nodes(sf),
+                elapsed=info["elapsed"],
+                stages=info["stages"],
+                peak_memory=info["peak_memory"],
+                host=os.uname().nodename if hasattr(os, "uname") else None,
+            )
+        )
+
+    def runs(self, problem: str | None = None) -> list[RunRecord]:
+        """
+        All recorded runs, oldest first.
+
+        Parameters
+        ----------
+        problem : {"fish", "poisson"}, optional
+            Only runs of this problem type.
+
+        Returns
+        -------
+        list of RunRecord
+        """
+        query = f"SELECT {', '.join(_COLUMNS)} FROM runs"
+        args: tuple = ()
+        if problem is not None:
+            query += " WHERE problem = ?"
+            args = (problem,)
+        with self._connect() as con:
+            rows = con.execute(query + " ORDER BY id", args).fetchall()
+        out = []
+        for row in rows:
+            d = dict(zip(_COLUMNS, row))
+            d["stages"] = json.loads(d["stages"])
+            out.append(RunRecord(**d))
+        return out
+
+    def predict(
+        self,
+        lines: list[str],
+        problem: str = "fish",
+    ) -> float | None:
+        """
+        Predict the runtime of an input, in seconds.
+
+        Uses, in order of preference:
+
+        1. the median runtime of previous runs of the identical input;
+        2. a power law ``elapsed = a * dx**b`` fitted to previous runs of
+           the same problem type, if the input sets ``dx``;
+        3. the median runtime of all runs of the problem type.
+
+        Parameters
+        ----------
+        lines : list of str
+            Automesh file lines.
+        problem : {"fish", "poisson"}
+            Problem type.
+
+        Returns
+        -------
+        float or None
+            Predicted runtime, or None if there is no history.
+        """
+        with self._connect() as con:
+            same = [
+                r[0]
+                for r in con.execute(
+                    "SELECT elapsed FROM runs WHERE input_hash = ? AND problem = ?",
+                    (input_hash(lines), problem),
+                )
+            ]
+            if same:
+                return float(np.median(same))
+
+            rows = con.execute(
+                "SELECT dx, elapsed FROM runs WHERE problem = ?", (problem,)
+            ).fetchall()
+
+        if not rows:
+            return None
+
+        dx = automesh_dx(lines)
+        fit = np.array([(d, t) for d, t in rows if d and d > 0 and t > 0])
+        # Need two distinct mesh spacings for a fit
+        if dx and dx > 0 and len(fit) >= 2 and np.ptp(np.log(fit[:, 0])) > 0:
+            b, log_a = np.polyfit(np.log(fit[:, 0]), np.log(fit[:, 1]), 1)
+            return float(np.exp(log_a) * dx**b)
+
+        return float(np.median([t for _, t in rows]))
+
+    def predict_file(self, automesh: str, problem: str = "fish") -> float | None:
+        """
+        Predict the runtime of an automesh file. See :meth:`predict`.
+        """
+        with open(automesh) as f:
+            return self.predict(f.readlines(), problem=problem)
+
+    def longest_first(
+        self,
+        automesh_files: list[str],
+        problem: str = "fish",
+    ) -> list[str]:
+        """
+        Order automesh files by predicted runtime, longest first.
+
+        Starting the longest jobs first minimizes the makespan of a sweep
+        over a fixed number of workers. Files without a prediction go
+        first, since they may be long.
+
+        Parameters
+        ----------
+        automesh_files : list of str
+            Automesh files.
+        problem : {"fish", "poisson"}
+            Problem type.
+
+        Returns
+        -------
+        list of str
+            The files, reordered. The sort is stable.
+        """
+        predictions = [self.predict_file(f, problem) for f in automesh_files]
+        order = sorted(
+            range(len(automesh_files)),
+            key=lambda i: -np.inf if predictions[i] is None else -predictions[i],
+        )
+        return [automesh_files[i] for i in order]
+
+    def estimate(
+        self,
+        automesh_files: list[str],
+        problem: str = "fish",
+        jobs: int = 1,
+    ) -> dict[str, Any]:
+        """
+        Pre-launch cost estimate of a set of runs.
+
+        Parameters
+        ----------
+        automesh_files : list of str
+            Automesh files.
+        problem : {"fish", "poisson"}
+            Problem type.
+        jobs : int
+            Number of parallel workers.
+
+        Returns
+        -------
+        dict
+            ``predictions`` (file to seconds or None), ``total`` (sum of
+            the known predictions, in CPU seconds), ``makespan`` (wall time
+            of longest-first list scheduling over ``jobs`` workers), and
+            ``unknown`` (number of files without a prediction).
+        """
+        predictions = {f: self.predict_file(f, problem) for f in automesh_files}
+        known = sorted((t for t in predictions.values() if t is not None), reverse=True)
+
+        # Longest-processing-time-first list scheduling
+        workers = np.zeros(max(jobs, 1))
+        for t in known:
+            workers[np.argmin(workers)] += t
+
+        return {
+            "predictions": predictions,
+            "total": float(sum(known)),
+            "makespan": float(workers.max()),
+            "unknown": len(predictions) - len(known),
+        }
+
+    def __repr__(self) -> str:
+        return f"<RunHistory {self.filename}>"
@@ -1,15 +1,36 @@
 import os
 from glob import glob
-from typing import TYPE_CHECKING, Literal, overload
+from typing import TYPE_CHECKING, Any, Literal, cast, overload
 
-from beamphysics import FieldMesh
+import numpy as np
 
 from superfish.parsers import parse_fish_t7, parse_poisson_t7
 from superfish.types import FishT7Data, PoissonT7Data
 
 if TYPE_CHECKING:
+    from beamphysics import FieldMesh
+
     from superfish.superfish import Superfish
 
+# Parity of each field component under a mirror about a z plane, relative to
+# the parity of the axial component. The radial component has the opposite
+# parity (div E = 0, div B = 0), Hphi the same parity as Ez (curl E), and
+# magnitudes are always even.
+MIRROR_PARITY = {
+    "Ez": 1,
+    "Er": -1,
+    "E": 0,
+    "Hphi": 1,
+    "Bz": 1,
+    "Br": -1,
+    "B": 0,
+    "electricField/z": 1,
+    "electricField/r": -1,
+    "magneticField/theta": 1,
+    "magneticField/z": 1,
+    "magneticField/r": -1,
+}
+
 
 def get_t7(path: str) -> list[str]:
     """
@@ -38,6 +59,8 @@ def interpolate2d(
     rmax: float = ...,
     nr: int = ...,
     return_fieldmesh: Literal[False] = ...,
+    symmetry: str | None = ...,
+    symmetry_z: float = ...,
 ) -> FishT7Data | PoissonT7Data: ...
 
 
@@ -52,7 +75,24 @@ def interpolate2d(
     nr: int = ...,
     *,
     return_fieldmesh: Literal[True],
-) -> FieldMesh: ...
+    symmetry: str | None = ...,
+    symmetry_z: float = ...,
+) -> "FieldMesh": ...
+
+
+@overload
+def interpolate2d(
+    sf: "Superfish",
+    zmin: float = ...,
+    zmax: float = ...,
+    nz: int = ...,
+    rmin: float = ...,
+    rmax: float = ...,
+    nr: int = ...,
+    return_fieldmesh: bool = ...,
+    symmetry: str | None = ...,
+    symmetry_z: float = ...,
+) -> "FishT7Data | PoissonT7Data | FieldMesh": ...
 
 
 def interpolate2d(
@@ -64,7 +104,9 @@ def interpolate2d(
     rmax: float = 0,
     nr: int = 1,
     return_fieldmesh: bool = False,
-) -> FishT7Data | PoissonT7Data | FieldMesh:
+    symmetry: str | None = None,
+    symmetry_z: float = 0,
+) -> "FishT7Data | PoissonT7Data | FieldMesh":
     """
     Interpolate the solved field onto a grid using SF7.
 
@@ -90,6 +132,15 @@ def interpolate2d(
         Number of radius points.
     return_fieldmesh : bool
         Return an openPMD-beamphysics FieldMesh instead of a t7data dict.
+    symmetry : {"even", "odd"}, optional
+        Declare the field mirror-symmetric about the plane
+        ``z = symmetry_z``, with the given parity of the axial component
+        (Ez or Bz). Only the half of the grid with ``z >= symmetry_z`` is
+        interpolated by SF7, and the other half is reconstructed with
+        :func:`mirror_t7data` or :func:`mirror_fieldmesh`. The grid must be
+        symmetric about the plane.
+    symmetry_z : float
+        z position of the mirror plane, in the input units of the program.
 
     Returns
     -------
@@ -106,6 +157,28 @@ def interpolate2d(
         Otherwise, an openPMD-beamphysics FieldMesh.
     """
 
+    if symmetry is not None:
+        zh0, nzh, include_plane = mirror_half_grid(zmin, zmax, nz, symmetry_z)
+        half = interpolate2d(
+            sf,
+            zmin=zh0,
+            zmax=zmax,
+            nz=nzh,
+            rmin=rmin,
+            rmax=rmax,
+            nr=nr,
+            return_fieldmesh=return_fieldmesh,
+        )
+        if return_fieldmesh:
+            return mirror_fieldmesh(
+                cast("FieldMesh", half), symmetry, include_plane=include_plane
+            )
+        return mirror_t7data(
+            cast("FishT7Data | PoissonT7Data", half),
+            symmetry,
+            include_plane=include_plane,
+        )
+
     problem = sf.problem
 
     # fish and poisson have the opposite conventions:
@@ -152,6 +225,8 @@ Force1MVperMeter=No""")
 
     # Optional fieldmesh parsing
     if return_fieldmesh:
+        from beamphysics import FieldMesh
+
         # Parsing is different for each:
         if problem == "fish":
             type = "electric"
@@ -175,3 +250,151 @@ Force1MVperMeter=No""")
         d = parse_poisson_t7(t7file, type=type)
 
     return d
+
+
+def mirror_half_grid(
+    zmin: float,
+    zmax: float,
+    nz: int,
+    z0: float,
+) -> tuple[float, int, bool]:
+    """
+    Upper half of a z grid that is symmetric about a mirror plane.
+
+    Parameters
+    ----------
+    zmin, zmax : float
+        Full grid extent.
+    nz : int
+        Number of points in the full grid.
+    z0 : float
+        z position of the mirror plane.
+
+    Returns
+    -------
+    zmin_half : float
+        First point of the half grid: ``z0`` itself for odd ``nz``, or
+        half a step above it for even ``nz``.
+    nz_half : int
+        Number of points in the half grid, ending at ``zmax``.
+    include_plane : bool
+        Whether the half grid has a point on the mirror plane.
+
+    Raises
+    ------
+    ValueError
+        If the grid is not symmetric about ``z0``.
+    """
+    dz = (zmax - zmin) / (nz - 1)
+    if not np.isclose(zmin + zmax, 2 * z0, rtol=0, atol=1e-9 * max(1, abs(dz))):
+        raise ValueError(
+            f"Grid {zmin}..{zmax} is not symmetric about the mirror plane z={z0}"
+        )
+    if nz % 2:
+        return z0, (nz + 1) // 2, True
+    return z0 + dz / 2, nz // 2, False
+
+
+def _mirror(a: np.ndarray, sign: int, include_plane: bool) -> np.ndarray:
+    """Extend an array along its last (z) axis by mirroring it with a sign."""
+    lower = a[..., :0:-1] if include_plane else a[..., ::-1]
+    return np.concatenate([sign * lower, a], axis=-1)
+
+
+def mirror_t7data(
+    t7data: FishT7Data | PoissonT7Data,
+    symmetry: str,
+    include_plane: bool = True,
+) -> FishT7Data | PoissonT7Data:
+    """
+    Reconstruct a full t7data grid from its upper half in z.
+
+    Parameters
+    ----------
+    t7data : FishT7Data or PoissonT7Data
+        Half-grid data, starting at (or half a step above) the mirror
+        plane.
+    symmetry : {"even", "odd"}
+        Parity of the axial field component (Ez or Bz). Radial components
+        get the opposite parity, see ``MIRROR_PARITY``.
+    include_plane : bool
+        Whether the first z point lies on the mirror plane, in which case
+        it is not duplicated.
+
+    Returns
+    -------
+    FishT7Data or PoissonT7Data
+        New t7data over the full grid. ``zmin`` is the mirror of ``zmax``.
+    """
+    parity = _parity_sign(symmetry)
+
+    td = cast("dict[str, Any]", t7data)
+    out = dict(td)
+    for key, val in td.items():
+        if isinstance(val, np.ndarray):
+            out[key] = _mirror(val, _component_sign(key, parity), include_plane)
+
+    nzh = td["nz"]
+    nz = 2 * nzh - 1 if include_plane else 2 * nzh
+    dz = (td["zmax"] - td["zmin"]) / (nzh - 1)
+    out["nz"] = nz
+    out["zmin"] = td["zmax"] - (nz - 1) * dz
+
+    return cast("FishT7Data | PoissonT7Data", out)
+
+
+def mirror_fieldmesh(
+    fm: "FieldMesh",
+    symmetry: str,
+    include_plane: bool = True,
+) -> "FieldMesh":
+    """
+    Reconstruct a full cylindrical FieldMesh from its upper half in z.
+
+    Parameters
+    ----------
+    fm : FieldMesh
+        Half-grid FieldMesh, starting at (or half a step above) the mirror
+        plane.
+    symmetry : {"even", "odd"}
+        Parity of the axial field component. See :func:`mirror_t7data`.
+    include_plane : bool
+        Whether the first z point lies on the mirror plane.
+
+    Returns
+    -------
+    FieldMesh
+        New FieldMesh over the full grid.
+    """
+    parity = _parity_sign(symmetry)
+
+    components = {
+        key: _mirror(val, _component_sign(key, parity), include_plane)
+        for key, val in fm.components.items()
+    }
+
+    attrs = dict(fm.attrs)
+    nr, ntheta, nzh = attrs["gridSize"]
+    n_added = nzh - 1 if include_plane else nzh
+    dz = attrs["gridSpacing"][2]
+    origin = list(attrs["gridOriginOffset"])
+    origin[2] = origin[2] - n_added * dz
+    attrs["gridOriginOffset"] = tuple(origin)
+    attrs["gridSize"] = (nr, ntheta, nzh + n_added)
+
+    from beamphysics import FieldMesh
+
+    return FieldMesh(data={"attrs": attrs, "components": components})
+
+
+def _parity_sign(symmetry: str) -> int:
+    if symmetry == "even":
+        return 1
+    if symmetry == "odd":
+        return -1
+    raise ValueError(f"Unknown symmetry: {symmetry}. Allowed: 'even' or 'odd'")
+
+
+def _component_sign(key: str, parity: int) -> int:
+    relative = MIRROR_PARITY[key]
+    return relative * parity if relative else 1
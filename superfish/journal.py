@@ -0,0 +1,217 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+from time import time
+from typing import Any
+
+from .runner import (
+    RUN_ERRORS,
+    ResultEncoder,
+    cache_key,
+    expand_template,
+    run_automesh,
+)
+
+JOURNAL_FILE = "journal.jsonl"
+
+# Files kept from each run's working directory
+DEFAULT_ARTIFACTS = ("*.SFO", "*.AM", "*.T35", "output.log")
+
+
+class SweepJournal:
+    """
+    Append-only record of the points of a sweep.
+
+    Each finished point is appended to ``<directory>/journal.jsonl`` and
+    flushed to disk immediately, and its artifacts are copied to
+    ``<directory>/points/<key>/``. A sweep that is interrupted (pre-emption,
+    wall-time limit) loses at most the points that were running.
+
+    Points are keyed by :func:`superfish.runner.cache_key`, the hash of their
+    automesh input, so a restarted sweep recognizes completed points even
+    if the parameter grid was extended.
+
+    Parameters
+    ----------
+    directory : str
+        Journal directory. Created if needed.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.filename = os.path.join(self.directory, JOURNAL_FILE)
+
+    def append(self, record: dict[str, Any]) -> None:
+        """
+        Append a record and flush it to disk.
+
+        Parameters
+        ----------
+        record : dict
+            JSON-serializable record with at least ``key`` and ``status``.
+        """
+        line = json.dumps(record, cls=ResultEncoder)
+        with open(self.filename, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def records(self) -> dict[str, dict[str, Any]]:
+        """
+        Latest record of each point.
+
+        A truncated last line, from a process killed while writing, is
+        ignored.
+
+        Returns
+        -------
+        dict
+            Point key to its latest record.
+        """
+        out: dict[str, dict[str, Any]] = {}
+        if not os.path.exists(self.filename):
+            return out
+        with open(self.filename) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                out[record["key"]] = record
+        return out
+
+    def completed(self) -> set[str]:
+        """Keys of the points that finished successfully."""
+        return {k for k, r in self.records().items() if r["status"] != "failed"}
+
+    def counts(self) -> dict[str, int]:
+        """Number of journaled points by status."""
+        out: dict[str, int] = {}
+        for r in self.records().values():
+            out[r["status"]] = out.get(r["status"], 0) + 1
+        return out
+
+    def artifact_dir(self, key: str) -> str:
+        """Directory of the artifacts of a point."""
+        return os.path.join(self.directory, "points", key)
+
+    def __repr__(self) -> str:
+        return f"<SweepJournal {self.directory} {self.counts()}>"
+
+
+def _sweep_task(
+    args: tuple[str, str, dict[str, str], dict[str, Any], str, tuple],
+) -> dict[str, Any]:
+    """
+    Worker entry point of :func:`run_sweep`: run one point and copy its
+    artifacts. Never raises.
+    """
+    automesh, key, point, options, dest, artifacts = args
+    try:
+        sf, result = run_automesh(automesh, **options)
+        os.makedirs(dest, exist_ok=True)
+        for pattern in artifacts:
+            for f in glob(os.path.join(sf.path, pattern)):
+                shutil.copy2(f, dest)
+        result["artifacts"] = dest
+    except RUN_ERRORS as ex:
+        result = {
+            "input": os.path.abspath(automesh),
+            "status": "failed",
+            "error": f"{type(ex).__name__}: {ex}",
+        }
+    result["key"] = key
+    result["problem"] = options.get("problem", "fish")
+    result["params"] = point
+    result["finished"] = time()
+    return result
+
+
+def run_sweep(
+    template: str,
+    params: dict[str, list[str]],
+    journal_dir: str,
+    problem: str = "fish",
+    jobs: int = 1,
+    artifacts: tuple[str, ...] = DEFAULT_ARTIFACTS,
+    rerun_failed: bool = True,
+    **options: Any,
+) -> list[dict[str, Any]]:
+    """
+    Run a checkpointed, resumable parameter sweep.
+
+    Points already completed in the journal are skipped; every other point
+    runs, and is journaled as soon as it finishes. Calling this again with
+    the same arguments after an interruption resumes the sweep.
+
+    Parameters
+    ----------
+    template : str
+        Automesh template with ``{NAME}`` placeholders. See
+        :func:`superfish.runner.expand_template`.
+    params : dict
+        Parameter name to list of values.
+    journal_dir : str
+        Journal directory, on persistent storage.
+    problem : {"fish", "poisson"}
+        Problem type.
+    jobs : int
+        Number of parallel worker processes.
+    artifacts : tuple of str
+        Glob patterns of the files to keep from each run's working
+        directory.
+    rerun_failed : bool
+        Run points that failed before again. Otherwise their failure is
+        reported as is.
+    **options
+        Passed to :func:`superfish.runner.run_automesh`, e.g. ``cache_dir``
+        or ``timeout``.
+
+    Returns
+    -------
+    list of dict
+        Result of each point, in grid order, with ``params``, ``key``,
+        ``status`` (``"ok"``, ``"cached"``, ``"failed"``, or ``"journaled"``
+        for points completed by an earlier call), and ``artifacts``.
+
+    Examples
+    --------
+    >>> results = run_sweep("CAVITY.AM", {"GAP": ["4.5", "5.0"]}, "gap_sweep", jobs=8)
+    """
+    journal = SweepJournal(journal_dir)
+    cases = expand_template(template, params, os.path.join(journal.directory, "inputs"))
+    keys = [cache_key(f, problem) for f, _ in cases]
+    records = journal.records()
+
+    results: dict[str, dict[str, Any]] = {}
+    tasks = []
+    for (file, point), key in zip(cases, keys):
+        record = records.get(key)
+        if record and (record["status"] != "failed" or not rerun_failed):
+            results[key] = dict(record)
+            if record["status"] != "failed":
+                results[key]["status"] = "journaled"
+            continue
+        task_options = dict(options, problem=problem)
+        tasks.append(
+            (file, key, point, task_options, journal.artifact_dir(key), artifacts)
+        )
+
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            result = _sweep_task(task)
+            journal.append(result)
+            results[result["key"]] = result
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_sweep_task, task) for task in tasks]
+            # Journal each point as soon as it finishes
+            for future in as_completed(futures):
+                result = future.result()
+                journal.append(result)
+                results[result["key"]] = result
+
+    return [results[key] for key in keys]
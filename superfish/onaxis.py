@@ -0,0 +1,436 @@
+from typing import Any, cast
+
+import numpy as np
+import scipy.constants
+from beamphysics import FieldMesh
+from scipy.interpolate import BSpline, make_lsq_spline
+
+from .types import FishT7Data, OnAxisErrorReport, PoissonT7Data
+from .writers import t7_openpmd_components
+
+c_light = scipy.constants.c
+
+
+class OnAxisExpansion:
+    """
+    Compact on-axis representation of a cylindrically symmetric field map.
+
+    The on-axis axial field g(z) (Ez for electric and RF fields, Bz for
+    magnetic fields) is fitted to a truncated series, and the off-axis
+    fields are reconstructed from its derivatives with the paraxial
+    expansion to third order in r. With k = omega / c (0 for static
+    fields)::
+
+        Fz(r, z) = g - r**2 / 4 * (g'' + k**2 g)
+        Fr(r, z) = -r / 2 * g' + r**3 / 16 * (g''' + k**2 g')
+
+    and for RF fields, from Ampere's law with fields ~ exp(-i omega t)::
+
+        Btheta(r, z) = -i omega / c**2 * (r / 2 * g - r**3 / 16 * (g'' + k**2 g))
+
+    Use :meth:`from_t7data` or :meth:`from_fieldmesh` to fit a map.
+
+    Parameters
+    ----------
+    method : {"spline", "fourier"}
+        ``"spline"``: least-squares B-spline of degree 5, ``"fourier"``:
+        cosine series on [zmin, zmax].
+    coefficients : ndarray
+        Series coefficients, in SI field units.
+    zmin, zmax : float
+        Extent of the fit, in meters.
+    field_type : {"electric", "magnetic"}
+        Type of the axial field.
+    frequency : float
+        Frequency in Hz, 0 for static fields.
+    knots : ndarray, optional
+        Full B-spline knot vector, for ``method="spline"``.
+
+    Attributes
+    ----------
+    degree : int
+        B-spline degree.
+    """
+
+    degree = 5
+
+    def __init__(
+        self,
+        method: str,
+        coefficients: np.ndarray,
+        zmin: float,
+        zmax: float,
+        field_type: str = "electric",
+        frequency: float = 0,
+        knots: np.ndarray | None = None,
+    ) -> None:
+        if method not in ("spline", "fourier"):
+            raise ValueError(
+                f"Unknown method: {method}. Allowed: 'spline' or 'fourier'"
+            )
+        if method == "spline" and knots is None:
+            raise ValueError("knots are required for method='spline'")
+        self.method = method
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.zmin = float(zmin)
+        self.zmax = float(zmax)
+        self.field_type = field_type
+        self.frequency = float(frequency)
+        self.knots = None if knots is None else np.asarray(knots, dtype=float)
+
+    @classmethod
+    def fit(
+        cls,
+        z: np.ndarray,
+        g: np.ndarray,
+        method: str = "spline",
+        n_terms: int = 50,
+        field_type: str = "electric",
+        frequency: float = 0,
+    ) -> "OnAxisExpansion":
+        """
+        Fit on-axis field samples.
+
+        Parameters
+        ----------
+        z : ndarray
+            Sample positions, in meters, increasing.
+        g : ndarray
+            On-axis axial field samples, in SI units.
+        method : {"spline", "fourier"}
+            Series type.
+        n_terms : int
+            Number of series coefficients. Must not exceed ``len(z)``; keep
+            it well below, since Er and Br use up to the third derivative
+            and amplify any overfitting.
+        field_type : {"electric", "magnetic"}
+            Type of the axial field.
+        frequency : float
+            Frequency in Hz, 0 for static fields.
+
+        Returns
+        -------
+        OnAxisExpansion
+        """
+        z = np.asarray(z, dtype=float)
+        g = np.asarray(g, dtype=float)
+        zmin, zmax = z[0], z[-1]
+        if n_terms > len(z):
+            raise ValueError(f"n_terms {n_terms} exceeds the {len(z)} samples")
+
+        if method == "spline":
+            k = cls.degree
+            n_interior = max(n_terms - k - 1, 0)
+            interior = np.linspace(zmin, zmax, n_interior + 2)[1:-1]
+            knots = np.concatenate([[zmin] * (k + 1), interior, [zmax] * (k + 1)])
+            spline = make_lsq_spline(z, g, knots, k=k)
+            return cls(
+                "spline",
+                spline.c,
+                zmin,
+                zmax,
+                field_type=field_type,
+                frequency=frequency,
+                knots=knots,
+            )
+
+        if method == "fourier":
+            A = _cosine_basis(z, zmin, zmax, n_terms, 0)
+            coefficients = np.linalg.lstsq(A, g, rcond=None)[0]
+            return cls(
+                "fourier",
+                coefficients,
+                zmin,
+                zmax,
+                field_type=field_type,
+                frequency=frequency,
+            )
+
+        raise ValueError(f"Unknown method: {method}. Allowed: 'spline' or 'fourier'")
+
+    @classmethod
+    def from_t7data(
+        cls,
+        t7data: FishT7Data | PoissonT7Data,
+        method: str = "spline",
+        n_terms: int = 50,
+    ) -> "OnAxisExpansion":
+        """
+        Fit the on-axis field of t7data.
+
+        Parameters
+        ----------
+        t7data : FishT7Data or PoissonT7Data
+            Parsed T7 data with ``rmin == 0``.
+        method : {"spline", "fourier"}
+            Series type.
+        n_terms : int
+            Number of series coefficients.
+
+        Returns
+        -------
+        OnAxisExpansion
+        """
+        td = cast("dict[str, Any]", t7data)
+        assert td["rmin"] == 0, f"rmin is not zero: {td['rmin']}"
+        z = np.linspace(td["zmin"], td["zmax"], td["nz"]) * 1e-2  # cm -> m
+
+        if td["problem"] == "fish":
+            frequency = td["freq"] * 1e6
+            field_type = "electric"
+        else:
+            frequency = 0
+            field_type = "electric" if "Ez" in td else "magnetic"
+
+        for key, component, factor in t7_openpmd_components(td["problem"], field_type):
+            if component.endswith("Field/z"):
+                g = td[key][0, :] * factor
+                break
+
+        return cls.fit(
+            z,
+            g,
+            method=method,
+            n_terms=n_terms,
+            field_type=field_type,
+            frequency=frequency,
+        )
+
+    @classmethod
+    def from_fieldmesh(
+        cls,
+        fm: FieldMesh,
+        method: str = "spline",
+        n_terms: int = 50,
+    ) -> "OnAxisExpansion":
+        """
+        Fit the on-axis field of a cylindrical FieldMesh.
+
+        Uses Ez if the map has an electric field, otherwise Bz.
+
+        Parameters
+        ----------
+        fm : FieldMesh
+            Cylindrical field map with r starting at 0.
+        method : {"spline", "fourier"}
+            Series type.
+        n_terms : int
+            Number of series coefficients.
+
+        Returns
+        -------
+        OnAxisExpansion
+        """
+        assert fm.geometry == "cylindrical", "Only cylindrical FieldMesh"
+        assert fm.mins[0] == 0, f"rmin is not zero: {fm.mins[0]}"
+        z = fm.coord_vec("z")
+
+        if "electricField/z" in fm.components:
+            field_type = "electric"
+            g = fm.components["electricField/z"][0, 0, :]
+        else:
+            field_type = "magnetic"
+            g = fm.components["magneticField/z"][0, 0, :]
+
+        return cls.fit(
+            z,
+            np.real(g),
+            method=method,
+            n_terms=n_terms,
+            field_type=field_type,
+            frequency=fm.frequency,
+        )
+
+    @property
+    def n_coefficients(self) -> int:
+        """Number of stored coefficients."""
+        return len(self.coefficients)
+
+    @property
+    def k(self) -> float:
+        """Wave number omega / c, in 1/m."""
+        return 2 * np.pi * self.frequency / c_light
+
+    def __call__(self, z: np.ndarray, nu: int = 0) -> np.ndarray:
+        """
+        Evaluate the on-axis field or its derivative.
+
+        Parameters
+        ----------
+        z : ndarray
+            Positions, in meters. Outside [zmin, zmax] the field is 0.
+        nu : int
+            Derivative order.
+
+        Returns
+        -------
+        ndarray
+            d^nu g / dz^nu at ``z``.
+        """
+        z = np.asarray(z, dtype=float)
+        if self.method == "spline":
+            spline = BSpline(self.knots, self.coefficients, self.degree)
+            out = spline.derivative(nu)(z) if nu else spline(z)
+        else:
+            A = _cosine_basis(z.ravel(), self.zmin, self.zmax, self.n_coefficients, nu)
+            out = (A @ self.coefficients).reshape(z.shape)
+        return np.where((z >= self.zmin) & (z <= self.zmax), out, 0)
+
+    def fields(self, r: np.ndarray, z: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Reconstruct the off-axis fields with the paraxial expansion.
+
+        Parameters
+        ----------
+        r, z : ndarray
+            Positions, in meters. Broadcast against each other.
+
+        Returns
+        -------
+        dict of ndarray
+            openPMD component name to field, in SI units. RF maps have
+            ``electricField/r``, ``electricField/z``, and the complex
+            ``magneticField/theta``.
+        """
+        r, z = np.broadcast_arrays(
+            np.asarray(r, dtype=float), np.asarray(z, dtype=float)
+        )
+        g, g1, g2, g3 = (self(z, nu) for nu in range(4))
+        k2 = self.k**2
+
+        fz = g - r**2 / 4 * (g2 + k2 * g)
+        fr = -r / 2 * g1 + r**3 / 16 * (g3 + k2 * g1)
+
+        prefix = "electricField" if self.field_type == "electric" else "magneticField"
+        out = {f"{prefix}/r": fr, f"{prefix}/z": fz}
+
+        if self.frequency:
+            omega = 2 * np.pi * self.frequency
+            out["magneticField/theta"] = (
+                -1j * omega / c_light**2 * (r / 2 * g - r**3 / 16 * (g2 + k2 * g))
+            )
+
+        return out
+
+    def error_report(
+        self,
+        field: FieldMesh | FishT7Data | PoissonT7Data,
+        rmax: float | None = None,
+    ) -> OnAxisErrorReport:
+        """
+        Compare the reconstruction against a full 2D map.
+
+        Parameters
+        ----------
+        field : FieldMesh or FishT7Data or PoissonT7Data
+            Reference map, usually the one that was fitted.
+        rmax : float, optional
+            Only compare points with r <= rmax, in meters.
+
+        Returns
+        -------
+        OnAxisErrorReport
+            Per component, the maximum absolute error, the RMS error, and the
+            maximum error relative to the peak field. Also the number of
+            stored coefficients and of reference map points.
+        """
+        if isinstance(field, FieldMesh):
+            r = field.coord_vec("r")
+            z = field.coord_vec("z")
+            reference = {k: v[:, 0, :] for k, v in field.components.items()}
+        else:
+            td = cast("dict[str, Any]", field)
+            r = np.linspace(td["rmin"], td["rmax"], td["nr"]) * 1e-2
+            z = np.linspace(td["zmin"], td["zmax"], td["nz"]) * 1e-2
+            type = None if td["problem"] == "fish" else self.field_type
+            reference = {
+                component: td[key] * factor
+                for key, component, factor in t7_openpmd_components(td["problem"], type)
+            }
+
+        if rmax is not None:
+            keep = r <= rmax
+            r = r[keep]
+            reference = {k: v[keep] for k, v in reference.items()}
+
+        R, Z = np.meshgrid(r, z, indexing="ij")
+        fields = self.fields(R, Z)
+
+        max_error = {}
+        rms_error = {}
+        rel_error = {}
+        for key, ref in reference.items():
+            if key not in fields:
+                continue
+            diff = np.abs(fields[key] - ref)
+            peak = np.abs(ref).max()
+            max_error[key] = float(diff.max())
+            rms_error[key] = float(np.sqrt(np.mean(diff**2)))
+            rel_error[key] = float(diff.max() / peak) if peak else 0.0
+
+        return OnAxisErrorReport(
+            max_error=max_error,
+            rms_error=rms_error,
+            relative_max_error=rel_error,
+            n_coefficients=self.n_coefficients,
+            n_map_points=int(R.size),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Plain dict of the representation, for storage.
+
+        Returns
+        -------
+        dict
+            Inverse of :meth:`from_dict`.
+        """
+        d = {
+            "method": self.method,
+            "coefficients": self.coefficients,
+            "zmin": self.zmin,
+            "zmax": self.zmax,
+            "field_type": self.field_type,
+            "frequency": self.frequency,
+        }
+        if self.knots is not None:
+            d["knots"] = self.knots
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "OnAxisExpansion":
+        """
+        Create from the output of :meth:`to_dict`.
+
+        Parameters
+        ----------
+        d : dict
+            Stored representation.
+
+        Returns
+        -------
+        OnAxisExpansion
+        """
+        return cls(**d)
+
+    def __repr__(self) -> str:
+        return (
+            f"<OnAxisExpansion {self.method} {self.field_type} with "
+            f"{self.n_coefficients} coefficients on [{self.zmin}, {self.zmax}] m>"
+        )
+
+
+def _cosine_basis(
+    z: np.ndarray,
+    zmin: float,
+    zmax: float,
+    n_terms: int,
+    nu: int,
+) -> np.ndarray:
+    """
+    Derivative ``nu`` of the basis cos(n pi (z - zmin) / L), n < n_terms,
+    of shape (len(z), n_terms).
+    """
+    w = np.pi * np.arange(n_terms) / (zmax - zmin)
+    phase = np.outer(z - zmin, w) + nu * np.pi / 2
+    return w**nu * np.cos(phase)
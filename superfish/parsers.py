@@ -1,3 +1,5 @@
+from collections.abc import Iterator
+from itertools import islice
 from typing import Any, cast
 
 import numpy as np
@@ -349,6 +351,134 @@ def parse_poisson_t7(
     return d
 
 
+def parse_t7_header(t7file: str) -> tuple[dict[str, Any], int]:
+    """
+    Parse only the header of a Fish or Poisson T7 file.
+
+    The problem type is detected from the second line, which holds a single
+    value (the frequency) for Fish files.
+
+    Parameters
+    ----------
+    t7file : str
+        Path to the T7 file.
+
+    Returns
+    -------
+    header : dict
+        Keys ``problem``, ``zmin``, ``zmax``, ``nz``, ``rmin``, ``rmax``,
+        ``nr``, and ``freq`` for Fish files. Extents are in cm.
+    n_header_lines : int
+        Number of lines before the data columns.
+    """
+    with open(t7file, "r") as f:
+        line1 = f.readline().split()
+        line2 = f.readline().split()
+        if len(line2) == 1:
+            line3 = f.readline().split()
+
+    if len(line2) == 1:
+        header = {
+            "problem": "fish",
+            "zmin": float(line1[0]),
+            "zmax": float(line1[1]),
+            "nz": int(line1[2]) + 1,
+            "freq": float(line2[0]),
+            "rmin": float(line3[0]),
+            "rmax": float(line3[1]),
+            "nr": int(line3[2]) + 1,
+        }
+        return header, 3
+
+    header = {
+        "problem": "poisson",
+        "rmin": float(line1[0]),
+        "rmax": float(line1[1]),
+        "nr": int(line1[2]) + 1,
+        "zmin": float(line2[0]),
+        "zmax": float(line2[1]),
+        "nz": int(line2[2]) + 1,
+    }
+    return header, 2
+
+
+def iter_t7_chunks(
+    t7file: str,
+    chunk_lines: int = 64,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Read the data of a T7 file in chunks of whole grid lines.
+
+    Fish files are stored r-major (z varies fastest), and Poisson files
+    z-major (r varies fastest). Each chunk holds up to ``chunk_lines``
+    complete lines along the fast axis, so only one chunk is in memory at a
+    time.
+
+    Parameters
+    ----------
+    t7file : str
+        Path to the T7 file.
+    chunk_lines : int
+        Maximum number of grid lines per chunk.
+
+    Yields
+    ------
+    start : int
+        Index of the first line of the chunk along the slow axis
+        (r for Fish, z for Poisson).
+    data : ndarray
+        Array of shape (k, n, ncols), with ``n`` points along the fast
+        axis and ``ncols`` data columns (4 for Fish, 2 for Poisson).
+
+    See Also
+    --------
+    parse_t7_header
+    """
+    header, n_header_lines = parse_t7_header(t7file)
+
+    if header["problem"] == "fish":
+        n_slow, n_fast, ncols = header["nr"], header["nz"], 4
+    else:
+        n_slow, n_fast, ncols = header["nz"], header["nr"], 2
+
+    with open(t7file, "r") as f:
+        for _ in range(n_header_lines):
+            f.readline()
+
+        for start in range(0, n_slow, chunk_lines):
+            k = min(chunk_lines, n_slow - start)
+            dat = np.loadtxt(islice(f, k * n_fast), ndmin=2)
+            yield start, dat.reshape(k, n_fast, ncols)
+
+
+def parse_binary_t7(filename: str) -> FishT7Data | PoissonT7Data:
+    """
+    Parse a binary T7 file written by
+    :func:`superfish.writers.write_binary_t7`.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the ``.npz`` file.
+
+    Returns
+    -------
+    FishT7Data or PoissonT7Data
+        Parsed data with the same keys as :func:`parse_fish_t7` or
+        :func:`parse_poisson_t7`, depending on the stored ``problem``.
+    """
+    d: dict[str, Any] = {}
+    with np.load(filename, allow_pickle=False) as npz:
+        for key in npz.files:
+            val = npz[key]
+            # Scalars are stored as 0-d arrays
+            d[key] = val.item() if val.ndim == 0 else val
+
+    if d["problem"] == "fish":
+        return cast(FishT7Data, d)
+    return cast(PoissonT7Data, d)
+
+
 # _________________________________
 # _________________________________
 # Individual parsers
@@ -1,3 +1,4 @@
+import weakref
 from copy import copy
 from typing import Any, cast
 
@@ -5,8 +6,10 @@ import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
 from matplotlib.colors import Colormap
 from matplotlib.figure import Figure
+from matplotlib.image import AxesImage
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 from .types import FishT7Data, PoissonT7Data, WallSegment
@@ -26,6 +29,214 @@ def get_cmap0() -> Colormap:
     return cmap0
 
 
+# Cached E/B magnitudes, keyed by the ids of the component arrays
+_magnitude_cache: dict[
+    tuple[int, int], tuple[weakref.ref, weakref.ref, np.ndarray]
+] = {}
+
+
+def t7_field_data(t7data: FishT7Data | PoissonT7Data, field: str) -> np.ndarray:
+    """
+    Get a field array from t7data, computing magnitudes when needed.
+
+    ``"E"`` or ``"B"`` magnitudes are computed from the r and z components
+    when not present in ``t7data``. The result is cached for as long as the
+    component arrays are alive, so repeated plots don't recompute it.
+    Arrays modified in place after the first call are not detected.
+
+    Parameters
+    ----------
+    t7data : FishT7Data or PoissonT7Data
+        Parsed T7 data.
+    field : str
+        Field key, or ``"E"``/``"B"`` for the magnitude.
+
+    Returns
+    -------
+    ndarray
+        Field array of shape (nr, nz).
+    """
+    # The field key is dynamic, so bypass the TypedDict for lookups
+    td = cast("dict[str, Any]", t7data)
+    if field not in ("E", "B") or field in td:
+        return td[field]
+
+    fr, fz = td[field + "r"], td[field + "z"]
+    key = (id(fr), id(fz))
+    cached = _magnitude_cache.get(key)
+    if cached and cached[0]() is fr and cached[1]() is fz:
+        return cached[2]
+
+    def forget(_: weakref.ref) -> None:
+        _magnitude_cache.pop(key, None)
+
+    data = np.hypot(fr, fz)
+    _magnitude_cache[key] = (weakref.ref(fr, forget), weakref.ref(fz, forget), data)
+    return data
+
+
+def _block_mean(a: np.ndarray) -> np.ndarray:
+    """Downsample a 2D array by averaging 2x2 blocks, dropping odd edges."""
+    n0, n1 = a.shape[0] // 2 * 2, a.shape[1] // 2 * 2
+    return a[:n0, :n1].reshape(n0 // 2, 2, n1 // 2, 2).mean(axis=(1, 3))
+
+
+class T7ImagePyramid:
+    """
+    Multi-resolution representation of a T7 field image.
+
+    Level 0 is the full-resolution field, and each further level averages
+    2x2 blocks of the previous one. :meth:`select` picks the coarsest level
+    that still has at least one data point per screen pixel in the visible
+    region, and crops it to that region.
+
+    Parameters
+    ----------
+    t7data : FishT7Data or PoissonT7Data
+        Parsed T7 data.
+    field : str
+        Field to plot, as in :func:`t7_field_data`.
+    scale : float
+        Scales the extents, to account for different units.
+    min_size : int
+        Levels are added until the smaller dimension drops below this.
+
+    Attributes
+    ----------
+    levels : list of ndarray
+        Field arrays of shape (nr, nz), finest first.
+    extent : tuple of float
+        Full (zmin, zmax, rmin, rmax) image extent.
+    """
+
+    def __init__(
+        self,
+        t7data: FishT7Data | PoissonT7Data,
+        field: str = "E",
+        scale: float = 1,
+        min_size: int = 64,
+    ) -> None:
+        self.extent = (
+            t7data["zmin"] * scale,
+            t7data["zmax"] * scale,
+            t7data["rmin"] * scale,
+            t7data["rmax"] * scale,
+        )
+        self.levels = [t7_field_data(t7data, field)]
+        while min(self.levels[-1].shape) >= 2 * min_size:
+            self.levels.append(_block_mean(self.levels[-1]))
+
+    def select(
+        self,
+        xlim: tuple[float, float],
+        ylim: tuple[float, float],
+        width_px: float,
+        height_px: float,
+    ) -> tuple[np.ndarray, tuple[float, float, float, float]]:
+        """
+        Pick a level for a view, cropped to the visible region.
+
+        Parameters
+        ----------
+        xlim, ylim : tuple of float
+            Visible z and r ranges.
+        width_px, height_px : float
+            Size of the view in screen pixels.
+
+        Returns
+        -------
+        data : ndarray
+            View into one level, of shape (nr, nz).
+        extent : tuple of float
+            (zmin, zmax, rmin, rmax) of ``data``.
+        """
+        zmin, zmax, rmin, rmax = self.extent
+        nr0, nz0 = self.levels[0].shape
+
+        # Visible fraction of the full image
+        fz = min(1.0, abs(xlim[1] - xlim[0]) / (zmax - zmin))
+        fr = min(1.0, abs(ylim[1] - ylim[0]) / (rmax - rmin))
+
+        ilevel = 0
+        for i, level in enumerate(self.levels):
+            nr, nz = level.shape
+            if nz * fz < width_px or nr * fr < height_px:
+                break
+            ilevel = i
+        data = self.levels[ilevel]
+        nr, nz = data.shape
+
+        # Extent actually covered by this level, after dropping odd edges
+        f = 2**ilevel
+        dz = (zmax - zmin) / nz0
+        dr = (rmax - rmin) / nr0
+
+        # Crop to the visible region, with a one-cell margin
+        z0, z1 = sorted(xlim)
+        r0, r1 = sorted(ylim)
+        iz0 = int(np.clip((z0 - zmin) / (f * dz) - 1, 0, nz))
+        iz1 = int(np.clip(np.ceil((z1 - zmin) / (f * dz)) + 1, iz0 + 1, nz))
+        ir0 = int(np.clip((r0 - rmin) / (f * dr) - 1, 0, nr))
+        ir1 = int(np.clip(np.ceil((r1 - rmin) / (f * dr)) + 1, ir0 + 1, nr))
+
+        extent = (
+            zmin + iz0 * f * dz,
+            zmin + iz1 * f * dz,
+            rmin + ir0 * f * dr,
+            rmin + ir1 * f * dr,
+        )
+        return data[ir0:ir1, iz0:iz1], extent
+
+    def draw(self, ax: Axes, **kwargs: Any) -> AxesImage:
+        """
+        Draw the image on an axes, updating the level on zoom and pan.
+
+        Parameters
+        ----------
+        ax : matplotlib.axes.Axes
+            Axes to draw on.
+        **kwargs
+            Passed to ``ax.imshow``.
+
+        Returns
+        -------
+        matplotlib.image.AxesImage
+            The image artist.
+        """
+        im = ax.imshow(self.levels[-1], extent=self.extent, origin="lower", **kwargs)
+
+        updating = False
+
+        def update(_: Axes) -> None:
+            nonlocal updating
+            if updating:
+                return
+            updating = True
+            try:
+                bbox = ax.get_window_extent()
+                data, extent = self.select(
+                    ax.get_xlim(), ax.get_ylim(), bbox.width, bbox.height
+                )
+                im.set_data(data)
+                # Keep the limits fixed when the extent changes with the
+                # level, without changing the autoscale state of the axes
+                autoscale = ax.get_autoscalex_on(), ax.get_autoscaley_on()
+                ax.set_autoscale_on(False)
+                try:
+                    im.set_extent(extent)
+                finally:
+                    ax.set_autoscalex_on(autoscale[0])
+                    ax.set_autoscaley_on(autoscale[1])
+            finally:
+                updating = False
+
+        update(ax)
+        ax.callbacks.connect("xlim_changed", update)
+        ax.callbacks.connect("ylim_changed", update)
+
+        return im
+
+
 def add_t7data_to_axes(
     t7data: FishT7Data | PoissonT7Data,
     ax: Axes,
@@ -33,6 +244,7 @@ def add_t7data_to_axes(
     cmap: Colormap | None = None,
     vmin: float = 1e-19,
     scale: float = 1,
+    lod: bool = False,
 ) -> Axes:
     """
     Add a field image from t7data to an axes.
@@ -47,7 +259,7 @@ def add_t7data_to_axes(
         Axes to draw on.
     field : str
         Field to plot. ``"E"`` or ``"B"`` magnitudes are computed from the
-        r and z components when not present in ``t7data``.
+        r and z components when not present in ``t7data``, and cached.
     cmap : matplotlib.colors.Colormap, optional
         Color map. Defaults to :func:`get_cmap0`.
     vmin : float
@@ -55,6 +267,9 @@ def add_t7data_to_axes(
     scale : float
         Scales the extents, to account for different units.
         Example: ``scale=10`` will place this data in cm on a plot in mm.
+    lod : bool
+        Draw through a :class:`T7ImagePyramid`, so that only as many points
+        as the axes has pixels are rendered, updated on zoom and pan.
 
     Returns
     -------
@@ -62,6 +277,13 @@ def add_t7data_to_axes(
         The axes that was drawn on.
     """
 
+    if not cmap:
+        cmap = get_cmap0()
+
+    if lod:
+        T7ImagePyramid(t7data, field=field, scale=scale).draw(ax, cmap=cmap, vmin=vmin)
+        return ax
+
     extent = (
         t7data["zmin"] * scale,
         t7data["zmax"] * scale,
@@ -69,17 +291,10 @@ def add_t7data_to_axes(
         t7data["rmax"] * scale,
     )
 
-    if not cmap:
-        cmap = get_cmap0()
+    data = t7_field_data(t7data, field)
 
-    # The field key is dynamic, so bypass the TypedDict for lookups
-    td = cast("dict[str, Any]", t7data)
-    if field in ("E", "B") and field not in td:
-        data = np.hypot(td[field + "r"], td[field + "z"])
-    else:
-        data = td[field]
-
-    ax.imshow(np.flipud(data), extent=extent, cmap=cmap, vmin=vmin)
+    # origin="lower" puts r=rmin at the bottom without a flipped copy
+    ax.imshow(data, extent=extent, cmap=cmap, vmin=vmin, origin="lower")
 
     return ax
 
@@ -130,6 +345,68 @@ def perp(
     return np.array([px0, px1]).T, np.array([py0, py1]).T
 
 
+def wall_segment_lines(
+    seg: WallSegment,
+    perp_scale: float = 0,
+    max_field: float = 1,
+    field: str = "E",
+    conv: float = 1,
+    max_perp_lines: int | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Line vertices for a wall segment and its perpendicular field lines.
+
+    Parameters
+    ----------
+    seg : WallSegment
+        Parsed wall segment, as returned by
+        :func:`superfish.parsers.parse_sfo_segment`.
+    perp_scale : float
+        Maximum length of the perpendicular lines. If 0, no perpendicular
+        lines are returned.
+    max_field : float
+        Maximum field value, used to normalize the perpendicular line
+        lengths.
+    field : str
+        Wall field column, e.g. ``"E"`` or ``"H"``.
+    conv : float
+        Unit conversion factor used by Superfish.
+    max_perp_lines : int, optional
+        Maximum number of perpendicular lines. Denser segments are
+        decimated with a uniform stride.
+
+    Returns
+    -------
+    wall : ndarray
+        Wall vertices, of shape (n, 2).
+    perps : ndarray
+        Perpendicular line endpoints, of shape (m, 2, 2), suitable for a
+        ``LineCollection``.
+    values : ndarray
+        Normalized field value of each perpendicular line, of shape (m,).
+    """
+    x = seg["wall"]["Z"] * conv
+    y = seg["wall"]["R"] * conv
+    wall = np.column_stack([x, y])
+
+    if not perp_scale:
+        return wall, np.empty((0, 2, 2)), np.empty(0)
+
+    # Fetch the field
+    F = seg["wall"][field][:-1] / max_field  # field, E or B
+
+    px, py = perp(x, y, scale=perp_scale * F)
+
+    if max_perp_lines and len(F) > max_perp_lines:
+        stride = -(-len(F) // max_perp_lines)
+        px, py, F = px[::stride], py[::stride], F[::stride]
+
+    # (line, endpoint, xy)
+    perps = np.stack([px, py], axis=-1)
+
+    return wall, perps, F
+
+
 def add_wall_segment_to_axes(
     seg: WallSegment,
     ax: Axes,
@@ -138,10 +415,14 @@ def add_wall_segment_to_axes(
     field: str = "E",
     cmap: Colormap | None = None,
     conv: float = 1,
+    max_perp_lines: int | None = None,
 ) -> None:
     """
     Add a wall segment to an axes.
 
+    The wall and the perpendicular field lines are each drawn as a single
+    ``LineCollection``.
+
     Parameters
     ----------
     seg : WallSegment
@@ -162,30 +443,58 @@ def add_wall_segment_to_axes(
         :func:`get_cmap0`.
     conv : float
         Unit conversion factor used by Superfish.
+    max_perp_lines : int, optional
+        Maximum number of perpendicular lines. See
+        :func:`wall_segment_lines`.
     """
+    wall, perps, F = wall_segment_lines(
+        seg,
+        perp_scale=perp_scale,
+        max_field=max_field,
+        field=field,
+        conv=conv,
+        max_perp_lines=max_perp_lines,
+    )
+    add_wall_lines_to_axes(ax, [wall], perps, F, cmap=cmap)
 
-    x = seg["wall"]["Z"] * conv
-    y = seg["wall"]["R"] * conv
-
-    # Wall segment
-    ax.plot(x, y, color="black")
-
-    if perp_scale:
-        # Fetch the field
-        F = seg["wall"][field] / max_field  # field, E or B
 
-        scales = perp_scale * F[:-1]
+def add_wall_lines_to_axes(
+    ax: Axes,
+    walls: list[np.ndarray],
+    perps: np.ndarray,
+    values: np.ndarray,
+    cmap: Colormap | None = None,
+) -> None:
+    """
+    Draw wall polylines and perpendicular field lines as collections.
 
-        px, py = perp(x, y, scale=scales)
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        Axes to draw on.
+    walls : list of ndarray
+        Wall polylines, each of shape (n, 2).
+    perps : ndarray
+        Perpendicular line endpoints, of shape (m, 2, 2).
+    values : ndarray
+        Normalized field value of each perpendicular line, used for the
+        colors.
+    cmap : matplotlib.colors.Colormap, optional
+        Color map for the perpendicular lines. Defaults to
+        :func:`get_cmap0`.
+    """
+    # Wall segments
+    ax.add_collection(LineCollection(walls, colors="black"))
 
+    if len(perps):
         if not cmap:
             cmap = get_cmap0()
 
-        color = cmap(F[:-1])
-
         # Draw perp lines
-        for i in range(len(px)):
-            ax.plot(px[i, :], py[i, :], color=color[i])
+        ax.add_collection(LineCollection(perps, colors=cmap(values)))
+
+    # Collections don't update the data limits
+    ax.autoscale_view()
 
 
 def plot_wall(
@@ -197,6 +506,7 @@ def plot_wall(
     ax: Axes | None = None,
     conv: float = 1,
     return_figure: bool = False,
+    max_perp_lines: int | None = None,
     **kwargs: Any,
 ) -> Figure | None:
     """
@@ -224,6 +534,9 @@ def plot_wall(
         Conversion factor to internal units (cm).
     return_figure : bool
         Return the figure object.
+    max_perp_lines : int, optional
+        Maximum number of perpendicular lines per segment. Denser segments
+        are decimated.
     **kwargs
         Passed to ``plt.subplots`` when creating a new figure.
 
@@ -241,19 +554,29 @@ def plot_wall(
 
     if perp_scale and not max_field:
         max_field = np.array([seg["wall"][field].max() for seg in wall_segments]).max()
-    else:
+    elif not perp_scale:
         max_field = 0
 
+    # Collect all segments, to draw them as single collections
+    walls = []
+    perps = []
+    values = []
     for seg in wall_segments:
-        add_wall_segment_to_axes(
+        wall, perp_lines, F = wall_segment_lines(
             seg,
-            ax,
             perp_scale=perp_scale,
             field=field,
             max_field=max_field,
-            cmap=cmap,
             conv=conv,
+            max_perp_lines=max_perp_lines,
         )
+        walls.append(wall)
+        perps.append(perp_lines)
+        values.append(F)
+
+    add_wall_lines_to_axes(
+        ax, walls, np.concatenate(perps), np.concatenate(values), cmap=cmap
+    )
 
     # Labels and units
     units = wall_segments[0]["units"]
@@ -0,0 +1,369 @@
+"""
+Reduced-order model of field maps across a parameter sweep.
+
+:class:`FieldMapROM` decomposes a set of field maps on a common grid into
+POD modes (a truncated SVD of the snapshot matrix) and interpolates the
+modal coefficients over the sweep parameters, so a map at a new geometry
+costs one small matrix product instead of a solve and an SF7 run.
+"""
+
+from typing import TYPE_CHECKING, Any, cast
+
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+
+from .types import FishT7Data, PoissonT7Data
+
+if TYPE_CHECKING:
+    from beamphysics import FieldMesh
+
+    from superfish.surrogate import Surrogate
+
+# T7 keys that define the grid; all maps of a model must agree on them
+_T7_GRID_KEYS = ("geometry", "problem", "zmin", "zmax", "nz", "rmin", "rmax", "nr")
+
+
+def _map_arrays(
+    field: "FishT7Data | PoissonT7Data | FieldMesh",
+) -> tuple[str, dict[str, np.ndarray], float | None, tuple]:
+    """Kind, component arrays, frequency and grid signature of a map."""
+    if isinstance(field, dict):
+        t7 = cast("dict[str, Any]", field)
+        arrays = {
+            k: v
+            for k, v in t7.items()
+            if isinstance(v, np.ndarray) and v.ndim == 2 and k != "E"
+        }
+        grid = tuple(t7[k] for k in _T7_GRID_KEYS)
+        return "t7", arrays, t7.get("freq"), grid
+    grid = (field.geometry, tuple(field.shape), tuple(field.mins), tuple(field.deltas))
+    frequency = None if field.is_static else float(field.frequency)
+    return "fieldmesh", dict(field.components), frequency, grid
+
+
+class FieldMapROM:
+    """
+    POD reduced-order model of field maps over sweep parameters.
+
+    The snapshot matrix of all field components (each scaled by its RMS,
+    complex components split into real and imaginary parts) is decomposed
+    with an SVD and truncated to the modes that hold all but ``tol`` of
+    the energy. The modal coefficients, and the frequency of RF maps, are
+    interpolated over the parameters, scaled to the unit box, with a
+    thin-plate radial basis function or a Gaussian process (see
+    :class:`superfish.surrogate.Surrogate`), which also gives an
+    uncertainty.
+
+    Use :meth:`fit` to build a model.
+
+    Parameters
+    ----------
+    params : list of str
+        Parameter names.
+    x : ndarray
+        Parameters of the snapshots, shape (n, n_params).
+    mean : ndarray
+        Mean snapshot, scaled.
+    modes : ndarray
+        POD modes, shape (n_modes, n_features).
+    coefficients : ndarray
+        Modal coefficients of the snapshots, shape (n, n_modes).
+    singular_values : ndarray
+        All singular values of the centered snapshot matrix.
+    layout : list of tuple
+        ``(key, shape, complex, scale)`` of each component, in feature order.
+    reference : FishT7Data or PoissonT7Data or FieldMesh
+        A snapshot, whose grid and metadata the predictions take.
+    frequencies : ndarray, optional
+        Frequency of each snapshot, in the units of the maps.
+    method : {"rbf", "gp"}
+        Coefficient interpolation.
+
+    Examples
+    --------
+    >>> maps = [parse_fish_t7(f"gap_{g}/CELL.T7") for g in gaps]
+    >>> rom = FieldMapROM.fit(maps, np.array(gaps)[:, None], params=["GAP"])
+    >>> t7 = rom.predict([4.73])
+    >>> rom.leave_one_out()
+    array([0.0012, 0.0004, ...])
+    """
+
+    def __init__(
+        self,
+        params: list[str],
+        x: np.ndarray,
+        mean: np.ndarray,
+        modes: np.ndarray,
+        coefficients: np.ndarray,
+        singular_values: np.ndarray,
+        layout: list[tuple[str, tuple[int, ...], bool, float]],
+        reference: "FishT7Data | PoissonT7Data | FieldMesh",
+        frequencies: np.ndarray | None = None,
+        method: str = "rbf",
+    ) -> None:
+        if method not in ("rbf", "gp"):
+            raise ValueError(f"Unknown method: {method}. Allowed: 'rbf' or 'gp'")
+        self.params = list(params)
+        self.x = np.asarray(x, dtype=float)
+        self.mean = mean
+        self.modes = modes
+        self.coefficients = coefficients
+        self.singular_values = singular_values
+        self.layout = layout
+        self.reference = reference
+        self.frequencies = frequencies
+        self.method = method
+
+        self._lo = self.x.min(axis=0)
+        span = self.x.max(axis=0) - self._lo
+        self._span = np.where(span > 0, span, 1.0)
+        self._interpolator = self._fit_interpolator(self.x, self._targets())
+
+    @classmethod
+    def fit(
+        cls,
+        maps: "list[FishT7Data | PoissonT7Data] | list[FieldMesh]",
+        x: np.ndarray,
+        params: list[str] | None = None,
+        n_modes: int | None = None,
+        tol: float = 1e-8,
+        method: str = "rbf",
+    ) -> "FieldMapROM":
+        """
+        Build a model from field maps on a common grid.
+
+        Parameters
+        ----------
+        maps : list of FishT7Data, PoissonT7Data or FieldMesh
+            Snapshots, all of the same kind and on the same grid. Resample
+            with :func:`superfish.interpolate.interpolate2d` if needed.
+        x : ndarray
+            Parameters of each map, shape (n,) or (n, n_params).
+        params : list of str, optional
+            Parameter names.
+        n_modes : int, optional
+            Number of POD modes. Defaults to the fewest that leave a
+            relative energy of at most ``tol`` out.
+        tol : float
+            Relative truncation energy, when ``n_modes`` is not given.
+        method : {"rbf", "gp"}
+            Coefficient interpolation.
+
+        Returns
+        -------
+        FieldMapROM
+        """
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 1:
+            x = x[:, None]
+        if len(maps) != len(x):
+            raise ValueError(f"{len(maps)} maps but {len(x)} parameter points")
+        if len(maps) < 2:
+            raise ValueError("A reduced-order model needs at least two maps")
+        params = params or [f"x{i}" for i in range(x.shape[1])]
+        if len(params) != x.shape[1]:
+            raise ValueError(f"{len(params)} names for {x.shape[1]} parameters")
+
+        kind, arrays0, _, grid0 = _map_arrays(maps[0])
+        snapshots: dict[str, list[np.ndarray]] = {k: [] for k in arrays0}
+        frequencies = []
+        for i, m in enumerate(maps):
+            kind_i, arrays, frequency, grid = _map_arrays(m)
+            if kind_i != kind or grid != grid0 or set(arrays) != set(arrays0):
+                raise ValueError(f"Map {i} is not on the grid of map 0")
+            for k, arrs in snapshots.items():
+                arrs.append(arrays[k])
+            frequencies.append(np.nan if frequency is None else frequency)
+
+        # Scaled feature matrix, components side by side
+        layout = []
+        columns = []
+        for k, arrs in snapshots.items():
+            a = np.stack(arrs).reshape(len(maps), -1)
+            is_complex = np.iscomplexobj(a)
+            scale = float(np.sqrt(np.mean(np.abs(a) ** 2))) or 1.0
+            layout.append((k, arrs[0].shape, is_complex, scale))
+            if is_complex:
+                columns += [a.real / scale, a.imag / scale]
+            else:
+                columns.append(a / scale)
+        snap = np.hstack(columns)
+
+        mean = snap.mean(axis=0)
+        u, s, vt = np.linalg.svd(snap - mean, full_matrices=False)
+        if n_modes is None:
+            energy = np.cumsum(s**2)
+            total = energy[-1] if energy[-1] > 0 else 1.0
+            n_modes = int(np.argmax(1 - energy / total <= tol)) + 1
+        modes = vt[:n_modes]
+        coefficients = u[:, :n_modes] * s[:n_modes]
+
+        freqs = np.array(frequencies)
+        return cls(
+            params,
+            x,
+            mean,
+            modes,
+            coefficients,
+            s,
+            layout,
+            maps[0],
+            frequencies=None if np.isnan(freqs).all() else freqs,
+            method=method,
+        )
+
+    @property
+    def n_modes(self) -> int:
+        """Number of POD modes kept."""
+        return len(self.modes)
+
+    @property
+    def truncation_error(self) -> float:
+        """Relative energy of the discarded modes."""
+        e = self.singular_values**2
+        return float(e[self.n_modes :].sum() / e.sum()) if e.sum() > 0 else 0.0
+
+    def _targets(self) -> np.ndarray:
+        if self.frequencies is None:
+            return self.coefficients
+        return np.column_stack([self.coefficients, self.frequencies])
+
+    def _fit_interpolator(self, x: np.ndarray, y: np.ndarray) -> "Any":
+        xs = (x - self._lo) / self._span
+        if self.method == "gp":
+            from .surrogate import Surrogate
+
+            names = [f"c{i}" for i in range(y.shape[1])]
+            return Surrogate(self.params, names, noise=1e-10).fit(xs, y)
+        if len(x) <= x.shape[1]:
+            raise ValueError(f"The rbf method needs more than {x.shape[1]} maps")
+        return RBFInterpolator(xs, y, kernel="thin_plate_spline")
+
+    def _interpolate(
+        self, interpolator: "RBFInterpolator | Surrogate", x: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        xs = (x - self._lo) / self._span
+        if self.method == "gp":
+            return interpolator.predict(xs)
+        return interpolator(xs), None
+
+    def predict_coefficients(
+        self,
+        x: np.ndarray | list[float],
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        Interpolated modal coefficients.
+
+        Parameters
+        ----------
+        x : array-like
+            Parameters, shape (n_params,) or (m, n_params).
+
+        Returns
+        -------
+        coefficients : ndarray
+            Shape (m, n_modes).
+        std : ndarray or None
+            Their standard deviations, for ``method="gp"``.
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        y, std = self._interpolate(self._interpolator, x)
+        n = self.n_modes
+        return y[:, :n], None if std is None else std[:, :n]
+
+    def _features_to_arrays(self, features: np.ndarray) -> dict[str, np.ndarray]:
+        out = {}
+        i = 0
+        for key, shape, is_complex, scale in self.layout:
+            size = int(np.prod(shape))
+            a = features[i : i + size]
+            i += size
+            if is_complex:
+                a = a + 1j * features[i : i + size]
+                i += size
+            out[key] = (a * scale).reshape(shape)
+        return out
+
+    def _to_map(
+        self,
+        arrays: dict[str, np.ndarray],
+        frequency: float | None,
+    ) -> "FishT7Data | PoissonT7Data | FieldMesh":
+        if isinstance(self.reference, dict):
+            t7 = {
+                k: v for k, v in self.reference.items() if not isinstance(v, np.ndarray)
+            }
+            t7.update(arrays)
+            if "Hphi" in t7:
+                t7["E"] = np.hypot(t7["Ez"], t7["Er"])
+            if frequency is not None:
+                t7["freq"] = float(frequency)
+            if t7["problem"] == "fish":
+                return cast(FishT7Data, t7)
+            return cast(PoissonT7Data, t7)
+
+        from beamphysics import FieldMesh
+
+        attrs = dict(self.reference.attrs)
+        if frequency is not None:
+            attrs["fundamentalFrequency"] = float(frequency) / attrs.get("harmonic", 1)
+        return FieldMesh(data={"attrs": attrs, "components": arrays})
+
+    def predict(
+        self,
+        x: np.ndarray | list[float],
+    ) -> "FishT7Data | PoissonT7Data | FieldMesh":
+        """
+        Predicted field map at one parameter point.
+
+        Parameters
+        ----------
+        x : array-like
+            Parameters, shape (n_params,).
+
+        Returns
+        -------
+        FishT7Data, PoissonT7Data or FieldMesh
+            A map of the same kind and grid as the snapshots. The frequency
+            of RF maps is interpolated too.
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        if len(x) != 1:
+            raise ValueError("predict takes one parameter point")
+        y, _ = self._interpolate(self._interpolator, x)
+        features = self.mean + y[0, : self.n_modes] @ self.modes
+        frequency = y[0, self.n_modes] if self.frequencies is not None else None
+        return self._to_map(self._features_to_arrays(features), frequency)
+
+    def leave_one_out(self) -> np.ndarray:
+        """
+        Relative L2 error of predicting each snapshot from the others.
+
+        The modes come from all snapshots, so this measures the
+        interpolation of the coefficients, plus the truncation error.
+
+        Returns
+        -------
+        ndarray
+            Relative error of each snapshot, in scaled feature space.
+        """
+        targets = self._targets()
+        n = len(self.x)
+        errors = np.zeros(n)
+        for i in range(n):
+            keep = np.arange(n) != i
+            interp = self._fit_interpolator(self.x[keep], targets[keep])
+            y, _ = self._interpolate(interp, self.x[i : i + 1])
+            truth = self.mean + self.coefficients[i] @ self.modes
+            pred = self.mean + y[0, : self.n_modes] @ self.modes
+            # The exact snapshot adds the truncated part back
+            residual = np.linalg.norm(pred - truth) ** 2
+            discarded = self.truncation_error * np.sum(self.singular_values**2) / n
+            errors[i] = np.sqrt(residual + discarded) / np.linalg.norm(truth)
+        return errors
+
+    def __repr__(self) -> str:
+        return (
+            f"<FieldMapROM {self.n_modes} modes from {len(self.x)} maps "
+            f"over {self.params}, truncation error {self.truncation_error:.2e}>"
+        )
@@ -0,0 +1,366 @@
+"""
+Batch runs of automesh files, shared by the command line and the library.
+
+:func:`run_automesh` runs one input, reusing a cached run of an identical
+input, and :func:`run_tasks` runs many serially or in worker processes.
+:func:`expand_template` writes the inputs of a parameter sweep, and
+:class:`ResultEncoder` serializes results, including numpy values, to
+JSON.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import re
+import subprocess
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from time import time
+from typing import Any
+
+import numpy as np
+
+from .superfish import Superfish
+
+RESULT_FILE = "result.json"
+
+# Errors of a single run that are reported in its result instead of raised:
+# solver failures and timeouts, IO, and unparsable or missing output
+RUN_ERRORS = (
+    RuntimeError,
+    OSError,
+    ValueError,
+    KeyError,
+    AssertionError,
+    subprocess.SubprocessError,
+)
+
+
+def cache_key(automesh: str, problem: str = "fish") -> str:
+    """
+    Key of a run in the cache.
+
+    Parameters
+    ----------
+    automesh : str
+        Path to the automesh input file.
+    problem : {"fish", "poisson"}
+        Type of problem.
+
+    Returns
+    -------
+    str
+        sha256 of the problem type, the upper case base name, and the file
+        contents. Runs with the same key produce the same output.
+    """
+    basename = os.path.splitext(os.path.basename(automesh))[0].upper()
+    h = hashlib.sha256()
+    h.update(f"{problem}\n{basename}\n".encode())
+    with open(automesh, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+@contextmanager
+def cache_lock(path: str) -> Iterator[None]:
+    """
+    Exclusive lock on a cache entry, across processes and hosts.
+
+    The lock is a POSIX record lock (or an msvcrt lock on Windows) on the
+    file ``<path>.lock``, which also works on NFS. It is released when the
+    block exits or the process dies.
+
+    Parameters
+    ----------
+    path : str
+        Cache entry directory, ``<cache_dir>/<key>``.
+    """
+    with open(path + ".lock", "a+") as f:
+        if os.name == "posix":
+            import fcntl
+
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+        else:
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    # Retries for about 10 s before raising
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ResultEncoder(json.JSONEncoder):
+    """
+    JSON encoder for run results, which may hold numpy arrays and scalars.
+
+    Examples
+    --------
+    >>> json.dumps({"Frequency": np.float64(1300.0)}, cls=ResultEncoder)
+    '{"Frequency": 1300.0}'
+    """
+
+    def default(self, obj: Any) -> Any:
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return super().default(obj)
+
+
+def _summary(sf: Superfish) -> dict[str, Any]:
+    sfo = sf.output.get("sfo", {})
+    if "summary" not in sfo:
+        return {}
+    return {"data": sfo["summary"]["data"], "units": sfo["summary"]["units"]}
+
+
+def run_automesh(
+    automesh: str,
+    problem: str = "fish",
+    cache_dir: str | None = None,
+    container_method: str | None = None,
+    history: str | None = None,
+    **kwargs: Any,
+) -> tuple[Superfish, dict[str, Any]]:
+    """
+    Run an automesh file, reusing a cached run when there is one.
+
+    With a ``cache_dir``, the problem runs in ``<cache_dir>/<key>``, see
+    :func:`cache_key`, and a later call with an identical input only parses
+    the existing output. The entry is locked with :func:`cache_lock` while
+    it runs, so concurrent runs of the same input, from other processes or
+    hosts sharing the cache, wait and then reuse the result.
+
+    Parameters
+    ----------
+    automesh : str
+        Path to the automesh input file.
+    problem : {"fish", "poisson"}
+        Type of problem.
+    cache_dir : str, optional
+        Cache directory. If not given, runs in a temporary directory.
+    container_method : {"docker", "shifter", "singularity"}, optional
+        Container method. See :class:`superfish.Superfish`.
+    history : str, optional
+        Run-history database to record new runs in.
+    **kwargs
+        Passed to :class:`superfish.Superfish`, e.g. ``timeout``,
+        ``retries``, ``cpus``, ``memory``.
+
+    Returns
+    -------
+    sf : Superfish
+        Superfish object with its output loaded.
+    result : dict
+        Keys ``input``, ``basename``, ``status`` (``"ok"`` or
+        ``"cached"``), ``path`` (the cache entry, or None), ``elapsed``
+        (seconds), and ``summary`` (SFO summary data and units).
+    """
+    t0 = time()
+    kwargs.update(
+        problem=problem,
+        container_method=container_method,
+        verbose=False,
+        history=history or False,
+    )
+
+    if cache_dir is None:
+        sf = Superfish(automesh, **kwargs)
+        return sf, _run_or_load(sf, automesh, None, t0)
+
+    path = os.path.join(os.path.abspath(cache_dir), cache_key(automesh, problem))
+    os.makedirs(path, exist_ok=True)
+    with cache_lock(path):
+        sf = Superfish(automesh, use_tempdir=False, workdir=path, **kwargs)
+        return sf, _run_or_load(sf, automesh, path, t0)
+
+
+def _run_or_load(
+    sf: Superfish,
+    automesh: str,
+    path: str | None,
+    t0: float,
+) -> dict[str, Any]:
+    """Run, or load a cache entry at ``path``, and write its result file."""
+    cached = path is not None and os.path.exists(os.path.join(path, RESULT_FILE))
+    if cached:
+        sf.load_output()
+    else:
+        sf.run()
+        if "sfo" not in sf.output:
+            raise RuntimeError(f"No SFO output; see {sf.path}/output.log")
+
+    result = {
+        "input": os.path.abspath(automesh),
+        "basename": sf.basename,
+        "status": "cached" if cached else "ok",
+        "path": path,
+        "elapsed": time() - t0,
+        "summary": _summary(sf),
+    }
+
+    if path and not cached:
+        # Written last, and atomically: its presence marks a complete entry
+        tmpfile = os.path.join(path, f"{RESULT_FILE}.{os.getpid()}.tmp")
+        with open(tmpfile, "w") as f:
+            json.dump(result, f, cls=ResultEncoder)
+        os.replace(tmpfile, os.path.join(path, RESULT_FILE))
+
+    return result
+
+
+def _run_task(args: tuple[str, dict[str, Any], dict[str, Any]]) -> dict[str, Any]:
+    """
+    Worker entry point: run, and optionally interpolate. Never raises.
+    """
+    automesh, options, extra = args
+    options = dict(options)
+    interpolate = options.pop("interpolate", None)
+    try:
+        sf, result = run_automesh(automesh, **options)
+        if interpolate:
+            interpolate = dict(interpolate)
+            output = interpolate.pop("output")
+            if result["path"]:
+                # SF7 writes and removes T7 files in the shared cache entry
+                with cache_lock(result["path"]):
+                    fm = sf.fieldmesh(**interpolate)
+            else:
+                fm = sf.fieldmesh(**interpolate)
+            fm.write(output)
+            result["output"] = output
+    except RUN_ERRORS as ex:
+        result = {
+            "input": os.path.abspath(automesh),
+            "status": "failed",
+            "error": f"{type(ex).__name__}: {ex}",
+        }
+    result.update(extra)
+    return result
+
+
+def run_tasks(
+    tasks: list[tuple[str, dict[str, Any], dict[str, Any]]],
+    jobs: int = 1,
+    history: str | None = None,
+    problem: str = "fish",
+    progress: Callable[[dict[str, Any]], None] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Run tasks serially or in ``jobs`` worker processes.
+
+    With a run-history database, tasks start longest predicted runtime
+    first, see :meth:`superfish.history.RunHistory.longest_first`. Results
+    are always returned in task order.
+
+    Parameters
+    ----------
+    tasks : list of tuple
+        ``(automesh, options, extra)`` per task: the input file, keyword
+        arguments of :func:`run_automesh` (plus ``interpolate``, keyword
+        arguments of :meth:`superfish.Superfish.fieldmesh` with an
+        ``output`` file), and items added to the result.
+    jobs : int
+        Number of worker processes.
+    history : str, optional
+        Run-history database used to order the tasks.
+    problem : {"fish", "poisson"}
+        Problem type, for the runtime predictions.
+    progress : callable, optional
+        Called with each result as its task finishes, e.g. to report
+        progress. Failed tasks are reported, not raised.
+
+    Returns
+    -------
+    list of dict
+        The result of each task, see :func:`run_automesh`, with ``status``
+        ``"failed"`` and an ``error`` message for failed tasks.
+    """
+    order = list(range(len(tasks)))
+    if history and len(tasks) > 1:
+        from .history import RunHistory
+
+        files = [task[0] for task in tasks]
+        ranked = RunHistory(history).longest_first(files, problem=problem)
+        position = {f: i for i, f in enumerate(ranked)}
+        order.sort(key=lambda i: position[files[i]])
+
+    scheduled = [tasks[i] for i in order]
+    results: list[dict[str, Any]] = [{}] * len(tasks)
+    parallel = jobs != 1 and len(tasks) > 1
+    with ProcessPoolExecutor(max_workers=jobs) if parallel else nullcontext() as pool:
+        # Results arrive in scheduled order, as they finish
+        done = pool.map(_run_task, scheduled) if pool else map(_run_task, scheduled)
+        for i, result in zip(order, done):
+            results[i] = result
+            if progress is not None:
+                progress(result)
+
+    return results
+
+
+def expand_template(
+    template: str,
+    params: dict[str, list[str]],
+    output_dir: str,
+) -> list[tuple[str, dict[str, str]]]:
+    """
+    Write one automesh file per point of a parameter sweep.
+
+    Each ``{NAME}`` in the template is replaced by the value of parameter
+    ``NAME``; other braces are left alone. Points are the Cartesian product
+    of the parameter values.
+
+    Parameters
+    ----------
+    template : str
+        Path to the automesh template.
+    params : dict
+        Parameter name to list of values.
+    output_dir : str
+        Directory for the expanded files. Each goes in its own
+        subdirectory, keeping the template's file name.
+
+    Returns
+    -------
+    list of tuple
+        ``(automesh_file, point)`` for each point, where ``point`` maps
+        parameter names to values.
+    """
+    with open(template) as f:
+        text = f.read()
+
+    missing = [name for name in params if "{" + name + "}" not in text]
+    if missing:
+        raise ValueError(f"Parameters not found in {template}: {missing}")
+
+    names = list(params)
+    fname = os.path.basename(template)
+    out = []
+    for i, values in enumerate(itertools.product(*params.values())):
+        point = dict(zip(names, values))
+        expanded = re.sub(
+            r"\{(\w+)\}", lambda m, point=point: point.get(m.group(1), m.group(0)), text
+        )
+        case_dir = os.path.join(output_dir, f"case_{i:05d}")
+        os.makedirs(case_dir, exist_ok=True)
+        file = os.path.join(case_dir, fname)
+        with open(file, "w") as f:
+            f.write(expanded)
+        out.append((file, point))
+    return out
@@ -0,0 +1,198 @@
+"""
+Finite-difference sensitivities of SFO summary quantities to geometry
+parameters.
+
+:func:`sensitivity` writes every perturbed automesh input of a template
+at once and runs them as one parallel batch, then assembles the Jacobian
+``d quantity / d parameter`` with an error estimate from two step sizes.
+"""
+
+import os
+import tempfile
+from typing import Any
+
+import numpy as np
+
+from .runner import expand_template, run_tasks
+from .types import SensitivityReport
+
+# Summary quantities differentiated by default
+DEFAULT_QUANTITIES = ("Frequency", "Q", "r/Q", "MaxE", "MaxH")
+
+# Step multiples of each scheme: without and with an error estimate
+SCHEME_OFFSETS = {
+    "forward": ((1,), (1, 2)),
+    "central": ((-1, 1), (-2, -1, 1, 2)),
+    "richardson": ((-2, -1, 1, 2), (-2, -1, 1, 2)),
+}
+
+
+def _derivative(
+    scheme: str,
+    f: dict[int, float],
+    h: dict[int, float],
+) -> tuple[float, float]:
+    """
+    Derivative and error estimate from values ``f`` at offsets ``h``,
+    both keyed by step multiple (0 is the nominal point).
+    """
+    if scheme == "forward":
+        d1 = (f[1] - f[0]) / h[1]
+        if 2 not in f:
+            return d1, np.nan
+        d2 = (f[2] - f[0]) / h[2]
+        # First order: the error at h is about the change from h to 2h
+        return d1, abs(d2 - d1)
+
+    d1 = (f[1] - f[-1]) / (h[1] - h[-1])
+    if 2 not in f:
+        return d1, np.nan
+    d2 = (f[2] - f[-2]) / (h[2] - h[-2])
+    if scheme == "central":
+        # Second order: the error at h is a third of the change
+        return d1, abs(d2 - d1) / 3
+    # Richardson: fourth-order combination, bounded by the central error
+    return (4 * d1 - d2) / 3, abs(d2 - d1) / 3
+
+
+def sensitivity(
+    template: str,
+    params: dict[str, float],
+    quantities: tuple[str, ...] | list[str] = DEFAULT_QUANTITIES,
+    vary: list[str] | None = None,
+    scheme: str = "central",
+    step: float | dict[str, float] = 1e-3,
+    relative: bool = True,
+    estimate_error: bool = True,
+    fmt: str = "%.8g",
+    problem: str = "fish",
+    jobs: int = 1,
+    **options: Any,
+) -> SensitivityReport:
+    """
+    Jacobian of summary quantities with respect to template parameters.
+
+    Schemes, with the number of runs for ``n`` parameters:
+
+    - ``"forward"``: ``(f(x+h) - f(x)) / h``, first order. ``n + 1`` runs,
+      or ``2n + 1`` with an error estimate from the step ``2h``.
+    - ``"central"``: ``(f(x+h) - f(x-h)) / 2h``, second order. ``2n + 1``
+      runs, or ``4n + 1`` with an error estimate from the step ``2h``.
+    - ``"richardson"``: Richardson extrapolation of the central
+      differences at ``h`` and ``2h``, fourth order, ``4n + 1`` runs.
+
+    Each step is taken as written to the automesh file, after formatting
+    with ``fmt``, so rounding does not bias the derivatives.
+
+    Parameters
+    ----------
+    template : str
+        Automesh template with ``{NAME}`` placeholders, see
+        :func:`superfish.runner.expand_template`.
+    params : dict
+        Nominal value of every template parameter.
+    quantities : list of str
+        SFO summary quantities to differentiate.
+    vary : list of str, optional
+        Parameters to differentiate with respect to. Defaults to all.
+    scheme : {"forward", "central", "richardson"}
+        Finite-difference scheme.
+    step : float or dict
+        Step size, for all parameters or by name.
+    relative : bool
+        Steps are relative to the nominal values (absolute for a nominal
+        value of zero).
+    estimate_error : bool
+        Run the extra ``2h`` points needed for error estimates.
+    fmt : str
+        printf-style format of the parameters in the automesh file.
+    problem : {"fish", "poisson"}
+        Problem type.
+    jobs : int
+        Number of parallel worker processes.
+    **options
+        Passed to :func:`superfish.runner.run_automesh`, e.g. ``cache_dir`` or
+        ``history``.
+
+    Returns
+    -------
+    SensitivityReport
+
+    Examples
+    --------
+    >>> report = sensitivity("CELL.AM", {"GAP": 4.5, "REQ": 10.2}, jobs=9)
+    >>> report["jacobian"][report["quantities"].index("Frequency")]
+    array([ 21.3, -126.8])
+    """
+
+    if scheme not in SCHEME_OFFSETS:
+        raise ValueError(f"Unknown scheme {scheme}, use one of {list(SCHEME_OFFSETS)}")
+    names = list(vary or params)
+    unknown = [n for n in names if n not in params]
+    if unknown:
+        raise ValueError(f"Parameters without a nominal value: {unknown}")
+    offsets = SCHEME_OFFSETS[scheme][int(estimate_error)]
+
+    # Every perturbed point, as written to the files
+    x0 = {k: float(fmt % v) for k, v in params.items()}
+    points: list[tuple[str | None, int, dict[str, float]]] = [(None, 0, x0)]
+    steps = {}
+    for name in names:
+        h = step[name] if isinstance(step, dict) else step
+        if relative and x0[name] != 0:
+            h *= abs(x0[name])
+        steps[name] = h
+        for m in offsets:
+            x = dict(x0)
+            x[name] = float(fmt % (x0[name] + m * h))
+            if x[name] == x0[name]:
+                raise ValueError(f"Step of {name} vanishes when formatted with {fmt}")
+            points.append((name, m, x))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tasks = []
+        for i, (name, m, x) in enumerate(points):
+            values = {k: [fmt % v] for k, v in x.items()}
+            case_dir = os.path.join(tmpdir, f"point_{i:04d}")
+            ((file, _),) = expand_template(template, values, case_dir)
+            extra = {"params": x, "vary": name, "offset": m}
+            tasks.append((file, dict(options, problem=problem), extra))
+        results = run_tasks(
+            tasks, jobs=jobs, history=options.get("history"), problem=problem
+        )
+    for r in results:
+        r["input"] = os.path.abspath(template)
+
+    failed = [r for r in results if r["status"] == "failed"]
+    if failed:
+        raise RuntimeError(
+            f"{len(failed)} of {len(results)} runs failed: "
+            + "; ".join(f"{r['params']}: {r['error']}" for r in failed)
+        )
+
+    def value(r: dict[str, Any], q: str) -> float:
+        return float(r["summary"].get("data", {}).get(q, np.nan))
+
+    nominal = results[0]
+    jacobian = np.full((len(quantities), len(names)), np.nan)
+    error = np.full_like(jacobian, np.nan)
+    for j, name in enumerate(names):
+        runs = {r["offset"]: r for r in results if r["vary"] == name}
+        runs[0] = nominal
+        h = {m: r["params"][name] - x0[name] for m, r in runs.items()}
+        for i, q in enumerate(quantities):
+            f = {m: value(r, q) for m, r in runs.items()}
+            jacobian[i, j], error[i, j] = _derivative(scheme, f, h)
+
+    return SensitivityReport(
+        params=names,
+        quantities=list(quantities),
+        nominal=x0,
+        values={q: value(nominal, q) for q in quantities},
+        units={q: nominal["summary"].get("units", {}).get(q, "") for q in quantities},
+        step=steps,
+        scheme=scheme,
+        jacobian=jacobian,
+        error=error,
+        results=results,
+    )
@@ -0,0 +1,298 @@
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+import scipy.constants
+
+from .types import SFOOutput, WallSegmentData
+
+if TYPE_CHECKING:
+    from superfish.superfish import Superfish
+
+mu_0 = scipy.constants.mu_0
+epsilon_0 = scipy.constants.epsilon_0
+
+# Length units of the SFO wall tables, in meters
+_LENGTH_UNITS = {"(m)": 1.0, "(cm)": 1e-2, "(mm)": 1e-3}
+
+# Column names tried for the wall fields, in order
+E_COLUMNS = ("E", "Emag", "Enormal", "Enorm")
+H_COLUMNS = ("H", "Hmag", "Htan")
+
+
+def _column(wall: dict[str, np.ndarray], names: tuple[str, ...]) -> str:
+    for name in names:
+        if name in wall:
+            return name
+    raise ValueError(f"Wall segment has none of the columns {names}: {list(wall)}")
+
+
+def _trapezoid_weights(z: np.ndarray, r: np.ndarray) -> np.ndarray:
+    """Trapezoid-rule weights of the arc length along a polyline."""
+    ds = np.hypot(np.diff(z), np.diff(r))
+    w = np.zeros(len(z))
+    w[:-1] += ds / 2
+    w[1:] += ds / 2
+    return w
+
+
+class SlaterPredictor:
+    """
+    Frequency shifts of wall displacements from the Slater perturbation
+    theorem, without re-solving.
+
+    Moving the wall outward by ``dn`` (positive enlarges the cavity)
+    shifts the frequency by::
+
+        df = -f / (4 U) * integral(dn * (mu_0 H**2 - epsilon_0 E**2) dA)
+
+    with the peak wall fields E and H, the stored energy U, and the wall
+    area element ``dA = 2 pi r ds`` of the axisymmetric cavity. The
+    integral is a trapezoid sum over the wall points of the SFO tables, so
+    it reduces to a dot product with a per-point kernel, and any number of
+    displacement scenarios are evaluated in one matrix product.
+
+    The theorem is first order in the displacement: it holds while the
+    displacements are small compared to the distances over which the wall
+    fields change.
+
+    Use :meth:`from_sfo` or :meth:`from_superfish` to build a predictor
+    from a Fish run.
+
+    Parameters
+    ----------
+    wall_segments : list of WallSegmentData
+        Wall-segment tables, e.g. ``output["sfo"]["wall_segments"]``.
+    frequency : float
+        Unperturbed frequency, in MHz.
+    stored_energy : float
+        Stored energy of the solved region, in J, with the same field
+        normalization as the wall tables.
+    segments : list of int, optional
+        Segment numbers to include. Defaults to all.
+
+    Attributes
+    ----------
+    z, r : ndarray
+        Wall points, in the units of the wall tables.
+    normal : ndarray
+        Outward unit normal ``(nz, nr)`` at each point, shape (n, 2).
+    segment : ndarray
+        Segment number of each point.
+    kernel : ndarray
+        Frequency shift per unit outward displacement of each point, in
+        MHz per table length unit, with the trapezoid weight included.
+
+    Examples
+    --------
+    >>> slater = SlaterPredictor.from_superfish(SF)
+    >>> dn = rng.normal(scale=0.001, size=(5000, slater.n_points))  # cm
+    >>> df = slater.frequency_shift(dn)  # MHz, shape (5000,)
+    >>> slater.segment_sensitivity()  # MHz/cm per segment
+    """
+
+    def __init__(
+        self,
+        wall_segments: list[WallSegmentData],
+        frequency: float,
+        stored_energy: float,
+        segments: list[int] | None = None,
+    ) -> None:
+        if stored_energy <= 0:
+            raise ValueError(f"stored_energy must be positive: {stored_energy}")
+        self.frequency = float(frequency)
+        self.stored_energy = float(stored_energy)
+
+        z, r, e2, h2, w, seg = [], [], [], [], [], []
+        length_unit = None
+        for s in wall_segments:
+            number = s["info"].get("segment_number")
+            if segments is not None and number not in segments:
+                continue
+            wall = s["wall"]
+            unit = _LENGTH_UNITS.get(s["units"].get("Z", "(cm)"), 1e-2)
+            if length_unit is not None and unit != length_unit:
+                raise ValueError("Wall segments have different length units")
+            length_unit = unit
+            e = wall[_column(wall, E_COLUMNS)] * 1e6  # MV/m
+            h = wall[_column(wall, H_COLUMNS)]
+            z.append(wall["Z"])
+            r.append(wall["R"])
+            e2.append(e**2)
+            h2.append(h**2)
+            w.append(_trapezoid_weights(wall["Z"], wall["R"]))
+            seg.append(np.full(len(e), number))
+        if not z:
+            raise ValueError("No wall segments selected")
+
+        self.length_unit = float(length_unit or 1e-2)
+        self.z = np.concatenate(z)
+        self.r = np.concatenate(r)
+        self.segment = np.concatenate(seg)
+        self.normal = self._outward_normals(z, r)
+
+        # df per unit displacement, in MHz per table length unit
+        area = 2 * np.pi * self.r * np.concatenate(w) * self.length_unit**2
+        density = mu_0 * np.concatenate(h2) - epsilon_0 * np.concatenate(e2)
+        self.kernel = (
+            -self.frequency / (4 * self.stored_energy) * density * area
+        ) * self.length_unit
+
+    @staticmethod
+    def _outward_normals(z: list[np.ndarray], r: list[np.ndarray]) -> np.ndarray:
+        normals = []
+        for zs, rs in zip(z, r):
+            tz, tr = np.gradient(zs), np.gradient(rs)
+            norm = np.hypot(tz, tr)
+            norm[norm == 0] = 1
+            # Right of the direction of travel
+            normals.append(np.stack([tr / norm, -tz / norm], axis=-1))
+        n = np.concatenate(normals)
+
+        # The cavity lies between the wall and the axis. Closing the wall
+        # along the axis gives a polygon whose orientation tells which
+        # side is outward: counterclockwise has the inside on the left.
+        zc = np.concatenate(z)
+        rc = np.concatenate(r)
+        zp = np.concatenate([[zc[0]], zc, [zc[-1]]])
+        rp = np.concatenate([[0.0], rc, [0.0]])
+        area = 0.5 * np.sum(zp * np.roll(rp, -1) - np.roll(zp, -1) * rp)
+        return n if area > 0 else -n
+
+    @classmethod
+    def from_sfo(
+        cls,
+        sfo: SFOOutput,
+        stored_energy: float | None = None,
+        segments: list[int] | None = None,
+    ) -> "SlaterPredictor":
+        """
+        Predictor from parsed SFO output.
+
+        Parameters
+        ----------
+        sfo : SFOOutput
+            Parsed SFO file, see :func:`superfish.parsers.parse_sfo`.
+        stored_energy : float, optional
+            Stored energy in J. Defaults to ``Stored energy`` in the SFO
+            summary.
+        segments : list of int, optional
+            Segment numbers to include.
+        """
+        data: dict[str, Any] = sfo.get("summary", {}).get("data", {})
+        frequency = data.get("Frequency")
+        if frequency is None:
+            frequency = sfo.get("header", {}).get("variable", {}).get("FREQ")
+        if frequency is None:
+            raise ValueError("No frequency in the SFO summary or header")
+        if stored_energy is None:
+            stored_energy = data.get("Stored energy")
+        if stored_energy is None:
+            raise ValueError("No stored energy in the SFO summary; pass stored_energy")
+        return cls(sfo["wall_segments"], frequency, stored_energy, segments=segments)
+
+    @classmethod
+    def from_superfish(
+        cls,
+        sf: "Superfish",
+        stored_energy: float | None = None,
+        segments: list[int] | None = None,
+    ) -> "SlaterPredictor":
+        """
+        Predictor from a Fish run. See :meth:`from_sfo`.
+        """
+        if "sfo" not in sf.output:
+            raise ValueError("Superfish object has no SFO output")
+        return cls.from_sfo(sf.output["sfo"], stored_energy, segments)
+
+    @property
+    def n_points(self) -> int:
+        """Number of wall points."""
+        return len(self.kernel)
+
+    def frequency_shift(self, displacement: np.ndarray) -> np.ndarray:
+        """
+        Frequency shift of normal wall displacements.
+
+        Parameters
+        ----------
+        displacement : ndarray
+            Outward displacement at each wall point, in table length units,
+            of shape (n_points,) or (n_scenarios, n_points).
+
+        Returns
+        -------
+        ndarray
+            Frequency shift in MHz, a scalar or of shape (n_scenarios,).
+        """
+        displacement = np.asarray(displacement, dtype=float)
+        if displacement.shape[-1] != self.n_points:
+            raise ValueError(
+                f"Last axis of displacement must have {self.n_points} points, "
+                f"got {displacement.shape}"
+            )
+        return displacement @ self.kernel
+
+    def vector_frequency_shift(
+        self,
+        dz: np.ndarray | float,
+        dr: np.ndarray | float,
+    ) -> np.ndarray:
+        """
+        Frequency shift of wall displacements given as ``(dz, dr)`` vectors.
+
+        Only the normal component moves the wall; tangential components
+        slide it along itself.
+
+        Parameters
+        ----------
+        dz, dr : ndarray or float
+            Displacement components at each wall point, broadcastable to
+            (n_scenarios, n_points). A scalar moves the whole wall rigidly.
+
+        Returns
+        -------
+        ndarray
+            Frequency shift in MHz.
+        """
+        dz, dr = np.broadcast_arrays(np.asarray(dz, float), np.asarray(dr, float))
+        if dz.ndim == 0:
+            dz = np.full(self.n_points, dz)
+            dr = np.full(self.n_points, dr)
+        dn = dz * self.normal[:, 0] + dr * self.normal[:, 1]
+        return self.frequency_shift(dn)
+
+    def segment_sensitivity(self) -> dict[int, float]:
+        """
+        Frequency shift per unit uniform outward displacement of each
+        segment, in MHz per table length unit.
+        """
+        return {
+            int(s): float(self.kernel[self.segment == s].sum())
+            for s in np.unique(self.segment)
+        }
+
+    def segment_frequency_shift(self, displacement: np.ndarray) -> np.ndarray:
+        """
+        Frequency shift of uniform outward displacements of whole segments.
+
+        Parameters
+        ----------
+        displacement : ndarray
+            Displacement of each segment, in the order of
+            :meth:`segment_sensitivity`, of shape (n_segments,) or
+            (n_scenarios, n_segments).
+
+        Returns
+        -------
+        ndarray
+            Frequency shift in MHz.
+        """
+        return np.asarray(displacement, dtype=float) @ np.array(
+            list(self.segment_sensitivity().values())
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"<SlaterPredictor f = {self.frequency} MHz, "
+            f"{self.n_points} wall points in {len(np.unique(self.segment))} segments>"
+        )
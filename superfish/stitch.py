@@ -0,0 +1,271 @@
+"""
+Multicell field maps stitched from separately solved cells.
+
+:func:`stitch_cells` places single-cell maps (end cells, middle cells,
+couplers) along z, weights each with an amplitude and phase, and joins
+them into one cylindrical map, so beam-dynamics work can skip the
+full-structure solve. The field discontinuity at every seam is reported
+as a measure of how well the cells fit together.
+"""
+
+import warnings
+from itertools import pairwise
+from typing import Any
+
+import numpy as np
+from beamphysics import FieldMesh
+
+from .superpose import _linear_weights, _source_data, common_frequency
+from .types import ExternalFieldData, FieldSource, StitchReport, StitchSeam
+
+
+def _resample(
+    grid: tuple[float, float, int, float, float, int],
+    components: dict[str, tuple[np.ndarray, Any]],
+    z: np.ndarray,
+    r: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """Bilinear resampling of SI components onto (r, z), zero outside."""
+    szmin, sdz, snz, srmin, sdr, snr = grid
+    iz, wz, zin = _linear_weights(z, szmin, sdz, snz)
+    ir, wr, rin = _linear_weights(r, srmin, sdr, snr)
+    mask = np.outer(rin, zin)
+    out = {}
+    for key, (a, factor) in components.items():
+        az = a[:, iz] * (1 - wz) + a[:, iz + 1] * wz
+        val = az[ir] * (1 - wr)[:, None] + az[ir + 1] * wr[:, None]
+        out[key] = np.where(mask, val * factor, 0)
+    return out
+
+
+def _seam_match(left: dict[str, np.ndarray], right: dict[str, np.ndarray]) -> complex:
+    """Least-squares factor c minimizing |left - c * right| over all components."""
+    num = 0j
+    den = 0.0
+    for key in left.keys() & right.keys():
+        num += np.vdot(right[key], left[key])
+        den += float(np.vdot(right[key], right[key]).real)
+    return num / den if den > 0 else 1.0
+
+
+def _seam_level(
+    seam: dict[str, np.ndarray],
+    components: dict[str, tuple[np.ndarray, Any]],
+) -> float:
+    """Largest ratio of a component on the seam to its peak in the cell."""
+    level = 0.0
+    for key, (a, factor) in components.items():
+        peak = float(np.abs(a).max() * abs(factor))
+        if peak > 0 and key in seam:
+            level = max(level, float(np.abs(seam[key]).max()) / peak)
+    return level
+
+
+def stitch_cells(
+    cells: list[FieldSource],
+    nz: int | None = None,
+    rmax: float | None = None,
+    nr: int | None = None,
+    match_seams: bool = False,
+    match_rtol: float = 1e-3,
+    freq_rtol: float = 1e-3,
+    dtype: Any = None,
+    return_fieldmesh: bool = False,
+) -> tuple[ExternalFieldData | FieldMesh, StitchReport]:
+    """
+    Stitch separately solved cells into one multicell field map.
+
+    Each cell is shifted, scaled, and phased as in
+    :func:`superfish.superpose.superpose_fields`, then resampled onto a
+    common grid. Where two cells overlap, their fields are blended with
+    linear weights across the overlap; on a shared boundary plane they are
+    averaged. Solve half cells with a symmetry plane and complete them with
+    :func:`superfish.interpolate.mirror_t7data` first.
+
+    With ``match_seams``, each cell after the first (in z order) gets the
+    complex factor that best matches its field to its left neighbor's on
+    the seam plane, on top of its own ``scale`` and ``phase``. This fixes
+    the arbitrary normalization and sign of separately solved cells, e.g.
+    the alternating sign of a pi-mode structure. A seam where either cell's
+    field is below ``match_rtol`` of its peak, e.g. at a beam pipe, does
+    not determine the factor: that cell keeps its own weights, with a
+    warning.
+
+    Parameters
+    ----------
+    cells : list of FieldSource
+        Cell maps with their placement: ``field`` (FieldMesh or t7data),
+        and optional ``z_offset`` (m), ``scale``, ``phase`` (rad, RF only),
+        and ``type`` (for Poisson t7data). A cell without ``z_offset``
+        starts where the previous cell in the list ends.
+    nz : int, optional
+        Number of z points. Defaults to the finest z spacing of the cells.
+    rmax : float, optional
+        Radial extent of the output grid, in meters, starting at r = 0.
+        Defaults to the smallest rmax of the cells.
+    nr : int, optional
+        Number of radius points. Defaults to the finest r spacing of the
+        cells.
+    match_seams : bool
+        Match the amplitude and phase of each cell to its left neighbor.
+    match_rtol : float
+        Smallest field on a seam, relative to the peak of each cell, for
+        the seam to be matched.
+    freq_rtol : float
+        Maximum relative spread of the cell frequencies.
+    dtype : dtype-like, optional
+        Output dtype. Defaults to complex for RF fields and float for
+        static fields.
+    return_fieldmesh : bool
+        Return an openPMD-beamphysics FieldMesh instead of a dict.
+
+    Returns
+    -------
+    field : ExternalFieldData or FieldMesh
+        The stitched map, at the mean frequency of the cells.
+    report : StitchReport
+        Placement, weights, and seam discontinuities.
+
+    Raises
+    ------
+    ValueError
+        If the cells mix static and RF fields, differ in frequency by more
+        than ``freq_rtol``, or leave a gap along z.
+
+    Examples
+    --------
+    >>> end, mid = parse_fish_t7("END.T7"), parse_fish_t7("MID.T7")
+    >>> cells = [{"field": end}] + [{"field": mid}] * 7 + [{"field": end, "scale": -1}]
+    >>> fm, report = stitch_cells(cells, match_seams=True, return_fieldmesh=True)
+    >>> report["max_error"]
+    0.0031
+    """
+    if not cells:
+        raise ValueError("No cells to stitch")
+
+    prepared = []
+    end = None
+    for cell in cells:
+        grid, frequency, comps = _source_data(cell["field"], cell.get("type"))
+        szmin, sdz, snz, _, _, _ = grid
+        if "z_offset" in cell:
+            z_offset = float(cell["z_offset"])
+        else:
+            z_offset = 0.0 if end is None else end - szmin
+        end = szmin + sdz * (snz - 1) + z_offset
+        factor: complex = cell.get("scale", 1)
+        if frequency:
+            factor = factor * np.exp(1j * cell.get("phase", 0))
+        # Grid in the stitched frame
+        grid = (szmin + z_offset,) + grid[1:]
+        prepared.append([grid, frequency, comps, factor, z_offset])
+
+    frequencies = [float(p[1]) for p in prepared]
+    frequency = common_frequency(frequencies, freq_rtol)
+    if dtype is None:
+        dtype = complex if frequency else float
+
+    # Output grid
+    starts = np.array([p[0][0] for p in prepared])
+    ends = np.array([p[0][0] + p[0][1] * (p[0][2] - 1) for p in prepared])
+    dz = min(p[0][1] for p in prepared)
+    dr = min(p[0][4] for p in prepared)
+    if rmax is None:
+        rmax = min(p[0][3] + p[0][4] * (p[0][5] - 1) for p in prepared)
+    zmin, zmax = float(starts.min()), float(ends.max())
+    nz = nz or round((zmax - zmin) / dz) + 1
+    nr = nr or round(rmax / dr) + 1
+    z = np.linspace(zmin, zmax, nz)
+    r = np.linspace(0, rmax, nr)
+
+    # Seams between neighbors in z order
+    order = np.argsort(starts, kind="stable")
+    seams = []
+    for i, j in pairwise(order):
+        if starts[j] > ends[i] + 1e-6 * dz:
+            raise ValueError(
+                f"Gap between cells {i} and {j}: {ends[i]:.6g} m to {starts[j]:.6g} m"
+            )
+        seams.append((int(i), int(j), 0.5 * (starts[j] + min(ends[i], ends[j]))))
+
+    if match_seams:
+        for i, j, zs in seams:
+            zi = np.array([zs])
+            left = _resample(prepared[i][0], prepared[i][2], zi, r)
+            right = _resample(prepared[j][0], prepared[j][2], zi, r)
+            level = min(
+                _seam_level(left, prepared[i][2]), _seam_level(right, prepared[j][2])
+            )
+            if level < match_rtol:
+                warnings.warn(
+                    f"Fields at the seam of cells {i} and {j} (z = {zs:.6g} m) are "
+                    f"{level:.2g} of their peak; cell {j} is not matched"
+                )
+                continue
+            left = {k: v * prepared[i][3] for k, v in left.items()}
+            right = {k: v * prepared[j][3] for k, v in right.items()}
+            prepared[j][3] = prepared[j][3] * _seam_match(left, right)
+
+    # Blend weights: within an overlap, the cell the point is deeper inside
+    # dominates linearly; on a shared plane both count equally
+    depth = np.minimum(z[None, :] - starts[:, None], ends[:, None] - z[None, :])
+    inside = depth >= -1e-9 * dz
+    h = np.where(inside, np.maximum(depth, 0) + 1e-12 * dz, 0)
+    blend = h / np.maximum(h.sum(axis=0), np.finfo(float).tiny)
+
+    keys = sorted({k for p in prepared for k in p[2]})
+    components = {k: np.zeros((nr, 1, nz), dtype=dtype) for k in keys}
+    for n, (grid, _, comps, factor, _) in enumerate(prepared):
+        cols = np.flatnonzero(inside[n])
+        if not len(cols):
+            continue
+        sl = slice(cols[0], cols[-1] + 1)
+        w = blend[n, sl] * factor
+        for key, val in _resample(grid, comps, z[sl], r).items():
+            components[key][:, 0, sl] += val * w
+
+    # Seam discontinuities, relative to the peak of each component
+    peak = {k: float(np.abs(v).max()) for k, v in components.items()}
+    seam_reports = []
+    for i, j, zs in seams:
+        zi = np.array([zs])
+        left = _resample(prepared[i][0], prepared[i][2], zi, r)
+        right = _resample(prepared[j][0], prepared[j][2], zi, r)
+        error = {}
+        for key in left.keys() & right.keys():
+            diff = left[key] * prepared[i][3] - right[key] * prepared[j][3]
+            error[key] = float(np.abs(diff).max() / peak[key]) if peak[key] else 0.0
+        seam_reports.append(
+            StitchSeam(
+                z=float(zs),
+                cells=(i, j),
+                error=error,
+                max_error=max(error.values(), default=0.0),
+            )
+        )
+
+    attrs = {
+        "eleAnchorPt": "beginning",
+        "gridGeometry": "cylindrical",
+        "axisLabels": ("r", "theta", "z"),
+        "gridLowerBound": (0, 1, 0),
+        "gridSize": (nr, 1, nz),
+        "gridSpacing": (r[1] - r[0] if nr > 1 else 0, 0, z[1] - z[0]),
+        "gridOriginOffset": (0, 0, zmin),
+        "fundamentalFrequency": frequency,
+        "harmonic": 1 if frequency else 0,
+        "RFphase": 0,
+    }
+    report = StitchReport(
+        frequency=frequency,
+        frequencies=frequencies,
+        z_offset=[p[4] for p in prepared],
+        weights=[complex(p[3]) for p in prepared],
+        seams=seam_reports,
+        max_error=max((s["max_error"] for s in seam_reports), default=0.0),
+    )
+
+    data = ExternalFieldData(attrs=attrs, components=components)
+    if return_fieldmesh:
+        return FieldMesh(data=data), report
+    return data, report
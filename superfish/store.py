@@ -0,0 +1,535 @@
+"""
+Indexed store of solved runs.
+
+Each run is indexed in a SQLite database by its key (the automesh input
+hash, see :func:`superfish.runner.cache_key`), its geometry parameters and its
+SFO summary quantities, so range queries over thousands of runs never open
+an SFO file. Wall-segment tables and optional field maps are kept next to
+the index as ``.npz`` files and loaded on demand.
+
+Layout of a store directory::
+
+    index.sqlite
+    runs/<key>/wall.npz
+    runs/<key>/field.npz    # optional, see superfish.writers.write_binary_t7
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
+from glob import glob
+from time import time
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from .parsers import parse_binary_t7, parse_sfo
+from .runner import cache_key
+from .types import (
+    FishT7Data,
+    PoissonT7Data,
+    SFOOutput,
+    StoredRun,
+    WallSegmentData,
+)
+from .writers import write_binary_t7
+
+if TYPE_CHECKING:
+    from superfish.superfish import Superfish
+
+INDEX_FILE = "index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    basename TEXT,
+    problem TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    params TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    units TEXT NOT NULL,
+    source TEXT,
+    has_wall_segments INTEGER NOT NULL,
+    has_field INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scalars (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS scalars_value ON scalars (name, value, run_id);
+CREATE INDEX IF NOT EXISTS scalars_text ON scalars (name, text, run_id);
+CREATE INDEX IF NOT EXISTS scalars_run ON scalars (run_id);
+"""
+
+_COLUMNS = (
+    "key",
+    "basename",
+    "problem",
+    "timestamp",
+    "params",
+    "summary",
+    "units",
+    "source",
+    "has_wall_segments",
+    "has_field",
+)
+
+
+def _as_float(value: Any) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _condition(name: str, cond: Any) -> tuple[str, list[Any]]:
+    """SQL selecting the run ids that satisfy one condition."""
+    sql = "SELECT run_id FROM scalars WHERE name = ? AND "
+    if isinstance(cond, str):
+        return sql + "text = ?", [name, cond]
+    if isinstance(cond, (tuple, list)):
+        if len(cond) != 2:
+            raise ValueError(f"Range for {name} must be (min, max): {cond}")
+        lo, hi = cond
+        clauses = ["value IS NOT NULL"]
+        args: list[Any] = [name]
+        if lo is not None:
+            clauses.append("value >= ?")
+            args.append(float(lo))
+        if hi is not None:
+            clauses.append("value <= ?")
+            args.append(float(hi))
+        return sql + " AND ".join(clauses), args
+    return sql + "value = ?", [name, float(cond)]
+
+
+def _save_wall_segments(filename: str, segments: list[WallSegmentData]) -> None:
+    data: dict[str, np.ndarray] = {}
+    meta = []
+    for i, seg in enumerate(segments):
+        for col, arr in seg["wall"].items():
+            data[f"{i}/{col}"] = arr
+        meta.append(
+            {"columns": list(seg["wall"]), "info": seg["info"], "units": seg["units"]}
+        )
+    data["meta"] = np.asarray(json.dumps(meta))
+    np.savez_compressed(filename, **data)
+
+
+def _load_wall_segments(filename: str) -> list[WallSegmentData]:
+    with np.load(filename, allow_pickle=False) as npz:
+        meta = json.loads(npz["meta"].item())
+        return [
+            WallSegmentData(
+                wall={col: npz[f"{i}/{col}"] for col in m["columns"]},
+                info=m["info"],
+                units=m["units"],
+            )
+            for i, m in enumerate(meta)
+        ]
+
+
+class ResultsStore:
+    """
+    Local store of solved runs, indexed for fast queries.
+
+    Runs are indexed by key, geometry parameters and SFO summary
+    quantities. A query like "gap between 4.5 and 5.0 and frequency within
+    1 MHz of 1300" is a single indexed SQL query, however many runs the
+    store holds.
+
+    Parameters
+    ----------
+    directory : str
+        Store directory. Created if needed.
+
+    Examples
+    --------
+    >>> store = ResultsStore("results")
+    >>> store.import_journal("gap_sweep")
+    >>> runs = store.query(GAP=(4.5, 5.0), Frequency=(1299, 1301))
+    >>> segments = store.wall_segments(runs[0]["key"])
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.filename = os.path.join(self.directory, INDEX_FILE)
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.filename, timeout=30)
+        con.execute("PRAGMA foreign_keys = ON")
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def run_dir(self, key: str) -> str:
+        """Directory of the array files of a run."""
+        return os.path.join(self.directory, "runs", key)
+
+    def add(
+        self,
+        key: str,
+        params: dict[str, Any] | None = None,
+        summary: dict[str, float] | None = None,
+        units: dict[str, str] | None = None,
+        problem: str = "fish",
+        basename: str | None = None,
+        wall_segments: list[WallSegmentData] | None = None,
+        field: FishT7Data | PoissonT7Data | None = None,
+        source: str | None = None,
+    ) -> int:
+        """
+        Add a run, replacing any run with the same key.
+
+        Parameters
+        ----------
+        key : str
+            Run key, normally :func:`superfish.runner.cache_key` of its input.
+        params : dict, optional
+            Geometry parameters. Numeric values (including numeric strings
+            from a sweep) can be queried by range, others by equality.
+        summary : dict, optional
+            SFO summary quantities, ``output["sfo"]["summary"]["data"]``.
+        units : dict, optional
+            Units of the summary quantities.
+        problem : {"fish", "poisson"}
+            Problem type.
+        basename : str, optional
+            Problem base name.
+        wall_segments : list of WallSegmentData, optional
+            Wall-segment tables, ``output["sfo"]["wall_segments"]``.
+        field : FishT7Data or PoissonT7Data, optional
+            Field map.
+        source : str, optional
+            Where the run came from, e.g. its working directory.
+
+        Returns
+        -------
+        int
+            Row id of the run.
+        """
+        params = dict(params or {})
+        summary = dict(summary or {})
+
+        # Arrays first, so an indexed run always has its files
+        path = self.run_dir(key)
+        os.makedirs(path, exist_ok=True)
+        wall_file = os.path.join(path, "wall.npz")
+        field_file = os.path.join(path, "field.npz")
+        if wall_segments:
+            _save_wall_segments(wall_file, wall_segments)
+        elif os.path.exists(wall_file):
+            os.remove(wall_file)
+        if field is not None:
+            write_binary_t7(field_file, field, compress=True)
+        elif os.path.exists(field_file):
+            os.remove(field_file)
+
+        row = (
+            key,
+            basename,
+            problem,
+            time(),
+            json.dumps(params),
+            json.dumps(summary),
+            json.dumps(units or {}),
+            source,
+            int(bool(wall_segments)),
+            int(field is not None),
+        )
+        scalars = [("param", k, _as_float(v), str(v)) for k, v in params.items()]
+        scalars += [("summary", k, _as_float(v), None) for k, v in summary.items()]
+
+        with self._connect() as con:
+            con.execute("DELETE FROM runs WHERE key = ?", (key,))
+            cur = con.execute(
+                f"INSERT INTO runs ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                row,
+            )
+            run_id = int(cur.lastrowid or 0)
+            con.executemany(
+                "INSERT INTO scalars (run_id, kind, name, value, text) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(run_id, *s) for s in scalars],
+            )
+        return run_id
+
+    def add_sfo(
+        self,
+        key: str,
+        sfo: SFOOutput,
+        params: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> int:
+        """
+        Add a run from its parsed SFO output.
+
+        Parameters
+        ----------
+        key : str
+            Run key.
+        sfo : SFOOutput
+            Parsed SFO file, see :func:`superfish.parsers.parse_sfo`.
+        params : dict, optional
+            Geometry parameters.
+        **kwargs
+            Passed to :meth:`add`.
+
+        Returns
+        -------
+        int
+            Row id of the run.
+        """
+        summary = sfo.get("summary", {"data": {}, "units": {}})
+        segments = [
+            WallSegmentData(wall=s["wall"], info=s["info"], units=s["units"])
+            for s in sfo["wall_segments"]
+        ]
+        return self.add(
+            key,
+            params=params,
+            summary=summary["data"],
+            units=summary["units"],
+            wall_segments=segments,
+            **kwargs,
+        )
+
+    def add_superfish(
+        self,
+        sf: "Superfish",
+        params: dict[str, Any] | None = None,
+        field: FishT7Data | PoissonT7Data | None = None,
+        key: str | None = None,
+    ) -> int:
+        """
+        Add a Superfish run.
+
+        Parameters
+        ----------
+        sf : Superfish
+            Superfish object with its output loaded.
+        params : dict, optional
+            Geometry parameters.
+        field : FishT7Data or PoissonT7Data, optional
+            Field map to keep, e.g. from :meth:`superfish.Superfish.interpolate`.
+        key : str, optional
+            Run key. Defaults to :func:`superfish.runner.cache_key` of the
+            automesh file in the run directory.
+
+        Returns
+        -------
+        int
+            Row id of the run.
+        """
+        if "sfo" not in sf.output:
+            raise ValueError("Superfish object has no SFO output")
+        if key is None:
+            key = cache_key(os.path.join(sf.path, sf.automesh_name), sf.problem)
+        return self.add_sfo(
+            key,
+            sf.output["sfo"],
+            params=params,
+            problem=sf.problem,
+            basename=sf.basename,
+            field=field,
+            source=sf.path,
+        )
+
+    def import_journal(self, journal_dir: str, overwrite: bool = False) -> int:
+        """
+        Index the completed points of a sweep journal.
+
+        Parameters
+        ----------
+        journal_dir : str
+            Journal directory of :func:`superfish.journal.run_sweep`.
+        overwrite : bool
+            Re-import points already in the store.
+
+        Returns
+        -------
+        int
+            Number of points imported.
+        """
+        from .journal import SweepJournal
+
+        journal = SweepJournal(journal_dir)
+        known = set() if overwrite else self.keys()
+        n = 0
+        for key, record in journal.records().items():
+            if record["status"] == "failed" or key in known:
+                continue
+            sfo_files = glob(os.path.join(journal.artifact_dir(key), "*.SFO"))
+            if not sfo_files:
+                continue
+            self.add_sfo(
+                key,
+                parse_sfo(sfo_files[0]),
+                params=record.get("params"),
+                # Journals written before records kept the problem are fish
+                problem=record.get("problem", "fish"),
+                basename=record.get("basename"),
+                source=journal.artifact_dir(key),
+            )
+            n += 1
+        return n
+
+    def _runs(self, where: str = "", args: tuple | list = ()) -> list[StoredRun]:
+        with self._connect() as con:
+            rows = con.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM runs {where} ORDER BY id", args
+            ).fetchall()
+        out = []
+        for row in rows:
+            d = dict(zip(_COLUMNS, row))
+            for k in ("params", "summary", "units"):
+                d[k] = json.loads(d[k])
+            for k in ("has_wall_segments", "has_field"):
+                d[k] = bool(d[k])
+            out.append(StoredRun(**d))
+        return out
+
+    def get(self, key: str) -> StoredRun | None:
+        """
+        Run by key, or None if it is not in the store.
+        """
+        runs = self._runs("WHERE key = ?", (key,))
+        return runs[0] if runs else None
+
+    def keys(self) -> set[str]:
+        """Keys of all runs."""
+        with self._connect() as con:
+            return {r[0] for r in con.execute("SELECT key FROM runs")}
+
+    def query(
+        self,
+        where: dict[str, Any] | None = None,
+        **conditions: Any,
+    ) -> list[StoredRun]:
+        """
+        Runs satisfying all conditions.
+
+        Conditions apply to parameters and summary quantities alike, by
+        name. A condition is a ``(min, max)`` range (inclusive, either end
+        may be None), a number for equality, or a string matched against
+        the parameter text.
+
+        Parameters
+        ----------
+        where : dict, optional
+            Conditions by name, for names that are not valid keywords, e.g.
+            ``{"Shunt impedance": (50, None)}``.
+        **conditions
+            More conditions, e.g. ``GAP=(4.5, 5.0)``.
+
+        Returns
+        -------
+        list of StoredRun
+            Matching runs, in insertion order.
+
+        Examples
+        --------
+        >>> store.query(GAP=(4.5, 5.0), Frequency=(1300 - 1, 1300 + 1))
+        """
+        conditions = {**(where or {}), **conditions}
+        clauses = []
+        args: list[Any] = []
+        for name, cond in conditions.items():
+            sql, a = _condition(name, cond)
+            clauses.append(f"id IN ({sql})")
+            args += a
+        where_sql = "WHERE " + " AND ".join(clauses) if clauses else ""
+        return self._runs(where_sql, args)
+
+    def table(
+        self,
+        names: list[str],
+        where: dict[str, Any] | None = None,
+        **conditions: Any,
+    ) -> dict[str, np.ndarray]:
+        """
+        Columns of parameters and summary quantities of matching runs.
+
+        Parameters
+        ----------
+        names : list of str
+            Parameter or summary names.
+        where, **conditions
+            Conditions, see :meth:`query`.
+
+        Returns
+        -------
+        dict
+            ``key`` (array of run keys) and one float array per name, NaN
+            where a run lacks the value.
+        """
+        runs = self.query(where, **conditions)
+        out: dict[str, np.ndarray] = {"key": np.array([r["key"] for r in runs])}
+        for name in names:
+            col = []
+            for r in runs:
+                v = r["params"].get(name, r["summary"].get(name))
+                f = _as_float(v)
+                col.append(np.nan if f is None else f)
+            out[name] = np.array(col, dtype=float)
+        return out
+
+    def wall_segments(self, key: str) -> list[WallSegmentData]:
+        """
+        Wall-segment tables of a run.
+
+        Raises
+        ------
+        ValueError
+            If the run has no wall segments in the store.
+        """
+        file = os.path.join(self.run_dir(key), "wall.npz")
+        if not os.path.exists(file):
+            raise ValueError(f"No wall segments stored for {key}")
+        return _load_wall_segments(file)
+
+    def field(self, key: str) -> FishT7Data | PoissonT7Data:
+        """
+        Field map of a run.
+
+        Raises
+        ------
+        ValueError
+            If the run has no field map in the store.
+        """
+        file = os.path.join(self.run_dir(key), "field.npz")
+        if not os.path.exists(file):
+            raise ValueError(f"No field map stored for {key}")
+        return parse_binary_t7(file)
+
+    def remove(self, key: str) -> None:
+        """Remove a run and its files."""
+        with self._connect() as con:
+            con.execute("DELETE FROM runs WHERE key = ?", (key,))
+        shutil.rmtree(self.run_dir(key), ignore_errors=True)
+
+    def __contains__(self, key: object) -> bool:
+        with self._connect() as con:
+            row = con.execute("SELECT 1 FROM runs WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._connect() as con:
+            return int(con.execute("SELECT COUNT(*) FROM runs").fetchone()[0])
+
+    def __repr__(self) -> str:
+        return f"<ResultsStore {self.directory} ({len(self)} runs)>"
@@ -1,20 +1,165 @@
 import os
 import platform
 import shutil
+import sqlite3
 import subprocess
 import tempfile
-from time import time
+import warnings
+import uuid
+from time import sleep, time
 from typing import TYPE_CHECKING, Any
 
 from . import parsers
-from .types import FishT7Data, PoissonT7Data
+from .adaptive import interpolate2d_adaptive
+from .types import AdaptiveT7Data, FishT7Data, PoissonT7Data
 from .interpolate import interpolate2d
-from .plot import plot_wall
 
 if TYPE_CHECKING:
+    import threading
+
     from beamphysics import FieldMesh
 
 
+def _kill(proc: subprocess.Popen, container_name: str | None) -> None:
+    """Kill a command started by :func:`_call_with_timeout`, and its container."""
+    if container_name:
+        try:
+            subprocess.run(
+                ["docker", "kill", container_name],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=30,
+                check=False,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    if os.name == "posix":
+        import signal
+
+        # Ask nicely, then force
+        for sig, grace in ((signal.SIGTERM, 5), (signal.SIGKILL, None)):
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                break
+            try:
+                proc.wait(timeout=grace)
+                break
+            except subprocess.TimeoutExpired:
+                continue
+    else:
+        proc.kill()
+    proc.wait()
+
+
+def _tree_peak_memory(pid: int) -> int:
+    """
+    Largest peak resident set (VmHWM) of a process and its descendants.
+
+    Read from ``/proc``, so the peak of each process is counted from its
+    last exec, not inherited from the parent it forked from. 0 for
+    processes that have exited or cannot be read.
+    """
+    peak = 0
+    pids = [pid]
+    while pids:
+        p = pids.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak = max(peak, int(line.split()[1]) * 1024)
+                        break
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pids.extend(int(c) for c in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return peak
+
+
+def _wait_with_peak_memory(
+    proc: subprocess.Popen,
+    timeout: float | None,
+    cancel: "threading.Event | None" = None,
+) -> tuple[int, int | None]:
+    """
+    Wait for a process, returning its return code and peak resident set.
+
+    While waiting, the process tree is polled for the largest VmHWM of any
+    of its processes, e.g. the solver started by the shell. Each process is
+    measured after its exec, so the resident set of this Python process,
+    which ``ru_maxrss`` would include, is not counted. A process that lives
+    shorter than the polling interval (at most 0.1 s) may be missed. None
+    where ``/proc`` is unavailable.
+
+    Raises RuntimeError, without waiting further, once ``cancel`` is set.
+    """
+    measure = os.path.exists(f"/proc/{proc.pid}/status")
+    peak = 0
+    deadline = None if timeout is None else time() + timeout
+    delay = 0.001
+    while True:
+        if measure:
+            peak = max(peak, _tree_peak_memory(proc.pid))
+        returncode = proc.poll()
+        if returncode is not None:
+            return returncode, peak if measure else None
+        if cancel is not None and cancel.is_set():
+            raise RuntimeError(f"Cancelled: {proc.args}")
+        if deadline is not None:
+            remaining = deadline - time()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(proc.args, timeout)  # type: ignore[arg-type]
+            delay = min(delay, remaining)
+        sleep(delay)
+        delay = min(2 * delay, 0.1)
+
+
+def _call_with_timeout(
+    cmd: str,
+    timeout: float | None,
+    container_name: str | None = None,
+    cancel: "threading.Event | None" = None,
+    **kwargs: Any,
+) -> tuple[int, int | None]:
+    """
+    Run a shell command, killing it and its container on timeout.
+
+    The command runs in its own process group, so the shell and everything
+    it started are terminated together. A named docker container is also
+    killed through the docker daemon, since killing the client alone leaves
+    it running. The same cleanup runs if the wait is interrupted, e.g. by
+    Ctrl-C or by setting ``cancel``, before the exception propagates.
+
+    Returns
+    -------
+    returncode : int
+        The return code.
+    peak_memory : int or None
+        Largest resident set of any process started by the command, in
+        bytes, see :func:`_wait_with_peak_memory`. None for docker runs,
+        where that is the docker client rather than the solver, and where
+        it cannot be measured.
+
+    Raises
+    ------
+    subprocess.TimeoutExpired
+        If the command runs longer than ``timeout`` seconds.
+    RuntimeError
+        If ``cancel`` is set while the command runs.
+    """
+    posix = os.name == "posix"
+    proc = subprocess.Popen(cmd, shell=True, start_new_session=posix, **kwargs)
+    try:
+        returncode, peak_memory = _wait_with_peak_memory(proc, timeout, cancel)
+    except BaseException:
+        _kill(proc, container_name)
+        raise
+    if container_name:
+        peak_memory = None
+    return returncode, peak_memory
+
+
 class Superfish:
     """
     Interface to the Poisson Superfish programs.
@@ -53,12 +198,17 @@ class Superfish:
 
     _container_commands = {
         "docker": (
-            "docker run {interactive_flags} --rm -v {local_path}:/data/ {image} {cmds}"
+            "docker run {interactive_flags} {limit_flags} --rm "
+            "-v {local_path}:/data/ {image} {cmds}"
         ),
         "shifter": "shifter --image={image} {cmds}",
-        "singularity": "singularity exec {singularity_image} {cmds}",
+        "singularity": "singularity exec {limit_flags} {singularity_image} {cmds}",
     }
 
+    # Exit codes of a container that failed to start, rather than of the
+    # program inside it: docker daemon/invocation errors, and singularity
+    _container_launch_failures = frozenset({125, 126, 127, 255})
+
     @classmethod
     def _detect_container_method(cls) -> str | None:
         """
@@ -101,6 +251,13 @@ class Superfish:
         interactive: bool = False,
         workdir: str | None = None,
         verbose: bool = True,
+        history: str | bool | None = None,
+        timeout: float | dict[str, float] | None = None,
+        retries: int = 0,
+        retry_backoff: float = 2.0,
+        cpus: float | None = None,
+        memory: str | None = None,
+        cancel: "threading.Event | None" = None,
     ) -> None:
         """
         Poisson-Superfish object
@@ -129,13 +286,47 @@ class Superfish:
             Base directory for the working directory.
         verbose : bool
             Print progress messages.
+        history : str or bool, optional
+            Run-history database to record each run in, see
+            :class:`superfish.history.RunHistory`. ``None`` uses the
+            ``PYSUPERFISH_HISTORY`` environment variable, and records nothing
+            if it is unset. ``False`` disables recording.
+        timeout : float or dict, optional
+            Time limit of each program run, in seconds, or a dict of program
+            name to time limit, e.g. ``{"autofish": 600, "sf7": 60}``. A
+            program that runs over is killed and ``subprocess.TimeoutExpired``
+            is raised.
+        retries : int
+            Number of times to retry a container that failed to launch
+            (exit codes 125, 126, 127, 255). Failures of the programs
+            themselves are not retried.
+        retry_backoff : float
+            Delay before the first retry, in seconds. Doubles on each retry.
+        cpus : float, optional
+            CPU limit of the container (docker, singularity).
+        memory : str, optional
+            Memory limit of the container (docker, singularity), e.g.
+            ``"4g"``.
+        cancel : threading.Event, optional
+            Set from another thread to kill a running container program,
+            which then raises RuntimeError.
         """
         self.configured = False
         self.problem = problem
 
         self.verbose = verbose
+        if history is None:
+            history = os.environ.get("PYSUPERFISH_HISTORY") or False
+        self.history = history
+        self.run_info: dict[str, Any] = {}
         self.use_tempdir = use_tempdir
         self.interactive = interactive
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.cpus = cpus
+        self.memory = memory
+        self.cancel = cancel
         if workdir:
             workdir = os.path.abspath(workdir)
             assert os.path.exists(workdir), f"workdir does not exist: {workdir}"
@@ -254,6 +445,8 @@ class Superfish:
         rmax: float = 100,
         nr: int = 0,
         dr: float = 0,
+        symmetry: str | None = None,
+        symmetry_z: float = 0,
     ) -> "FieldMesh":
         """
         Interpolate the field over a grid, returning a FieldMesh.
@@ -280,6 +473,13 @@ class Superfish:
         dr : float
             Radial spacing, in meters. Overrides ``rmax`` when given with
             ``nr``.
+        symmetry : {"even", "odd"}, optional
+            Declare the field mirror-symmetric about ``z = symmetry_z``,
+            with this parity of the axial component, so that SF7 only
+            interpolates half of the grid. See
+            :func:`superfish.interpolate.interpolate2d`.
+        symmetry_z : float
+            z position of the mirror plane, in meters.
 
         Returns
         -------
@@ -318,6 +518,8 @@ class Superfish:
             rmax=rmax * fac,
             nr=nr,
             return_fieldmesh=True,
+            symmetry=symmetry,
+            symmetry_z=symmetry_z * fac,
         )
 
         return FM
@@ -330,6 +532,8 @@ class Superfish:
         rmin: float = 0,
         rmax: float = 0,
         nr: int = 1,
+        symmetry: str | None = None,
+        symmetry_z: float = 0,
     ) -> FishT7Data | PoissonT7Data:
         """
         Interpolate the field over a grid.
@@ -344,6 +548,12 @@ class Superfish:
             Radial extent of the grid, in the problem's input units.
         nr : int
             Number of radius points.
+        symmetry : {"even", "odd"}, optional
+            Declare the field mirror-symmetric about ``z = symmetry_z``,
+            with this parity of the axial component. See
+            :func:`superfish.interpolate.interpolate2d`.
+        symmetry_z : float
+            z position of the mirror plane, in the problem's input units.
 
         Returns
         -------
@@ -353,17 +563,71 @@ class Superfish:
         """
 
         t7data = interpolate2d(
-            self, zmin=zmin, zmax=zmax, nz=nz, rmin=rmin, rmax=rmax, nr=nr
+            self,
+            zmin=zmin,
+            zmax=zmax,
+            nz=nz,
+            rmin=rmin,
+            rmax=rmax,
+            nr=nr,
+            symmetry=symmetry,
+            symmetry_z=symmetry_z,
         )
 
         return t7data
 
+    def interpolate_adaptive(
+        self,
+        zmin: float = -1000,
+        zmax: float = 1000,
+        nz: int = 21,
+        rmin: float = 0,
+        rmax: float = 0,
+        nr: int = 21,
+        **kwargs: Any,
+    ) -> AdaptiveT7Data:
+        """
+        Interpolate the field with adaptive grid refinement.
+
+        Starts from a coarse ``nz`` x ``nr`` grid and requests refined
+        patches from SF7 only where the estimated interpolation error is
+        large.
+
+        Parameters
+        ----------
+        zmin, zmax : float
+            z extent of the grid, in the problem's input units.
+        nz : int
+            Number of z points of the coarse grid.
+        rmin, rmax : float
+            Radial extent of the grid, in the problem's input units.
+            ``rmax`` must be greater than ``rmin``.
+        nr : int
+            Number of radius points of the coarse grid, at least 2.
+        **kwargs
+            Passed to :func:`superfish.adaptive.interpolate2d_adaptive`,
+            e.g. ``rtol``, ``refine``, ``max_level``.
+
+        Returns
+        -------
+        AdaptiveT7Data
+            The coarse grid and refined patches.
+        """
+        return interpolate2d_adaptive(
+            self, zmin=zmin, zmax=zmax, nz=nz, rmin=rmin, rmax=rmax, nr=nr, **kwargs
+        )
+
     def run(self) -> None:
         """
         Write input, run the problem, and load the output.
 
         Runs ``autofish`` for fish problems, or the
         ``automesh``/``poisson``/``sfo`` chain for poisson problems.
+
+        The duration of each program and the peak memory are stored in
+        ``.run_info``, and recorded in the run-history database if
+        ``history`` is set. The peak memory is measured per run, and is None
+        for docker runs, where only the docker client could be measured.
         """
 
         assert self.configured, "not configured to run"
@@ -371,20 +635,45 @@ class Superfish:
         self.write_input()
 
         t0 = time()
+        stages: dict[str, float] = {}
+        peaks = []
 
         if self.problem == "fish":
-            self.run_cmd("autofish", self.automesh_name)
+            chain = [("autofish", self.automesh_name)]
         else:
-            self.run_cmd("automesh", self.automesh_name)
-            self.run_cmd("poisson")
-            self.run_cmd("sfo")
+            chain = [("automesh", self.automesh_name), ("poisson",), ("sfo",)]
+
+        for cmds in chain:
+            t1 = time()
+            self.run_cmd(*cmds)
+            stages[cmds[0]] = time() - t1
+            peaks.append(self._last_peak_memory)
 
         dt = time() - t0
         self.vprint(f"Done in {dt:10.2f} seconds")
 
+        self.run_info = {
+            "elapsed": dt,
+            "stages": stages,
+            "peak_memory": None if None in peaks else max(peaks, default=None),
+        }
+
         self.load_output()
 
-    def container_run_cmd(self, *args: str) -> str:
+        if self.history and "sfo" in self.output:
+            self._record_history()
+
+    def _record_history(self) -> None:
+        """Record the last run in the history database, warning on failure."""
+        from .history import RunHistory
+
+        filename = None if self.history is True else str(self.history)
+        try:
+            RunHistory(filename).record_superfish(self)
+        except (sqlite3.Error, OSError) as ex:
+            warnings.warn(f"Could not record run history: {ex}")
+
+    def container_run_cmd(self, *args: str, name: str | None = None) -> str:
         """
         Form the run command string for the container.
 
@@ -394,6 +683,8 @@ class Superfish:
         ----------
         *args : str
             Program name and arguments, e.g. ``("automesh", "TEST.AM")``.
+        name : str, optional
+            Container name (docker only), so it can be killed on timeout.
 
         Returns
         -------
@@ -427,12 +718,59 @@ class Superfish:
             local_path=self.path,
             image=self._container_image,
             interactive_flags=interactive_flags,
+            limit_flags=self.container_limit_flags(name=name),
             cmds=cmds,
             singularity_image=self._singularity_image,
         )
 
         return cmd0 + cmd
 
+    def container_limit_flags(self, name: str | None = None) -> str:
+        """
+        Resource limit flags for the container command.
+
+        Parameters
+        ----------
+        name : str, optional
+            Container name (docker only).
+
+        Returns
+        -------
+        str
+            ``--cpus`` and ``--memory`` flags (docker, singularity), and
+            ``--name`` (docker). Shifter has no limit flags; setting limits
+            with it warns.
+        """
+        flags = []
+        if self.cpus is not None:
+            flags.append(f"--cpus {self.cpus}")
+        if self.memory is not None:
+            flags.append(f"--memory {self.memory}")
+        if flags and self.container_method == "shifter":
+            warnings.warn("cpus and memory limits are not supported with shifter")
+            return ""
+        if name and self.container_method == "docker":
+            flags.append(f"--name {name}")
+        return " ".join(flags)
+
+    def stage_timeout(self, program: str) -> float | None:
+        """
+        Time limit of a program, from ``timeout``.
+
+        Parameters
+        ----------
+        program : str
+            Program name, e.g. ``"autofish"``.
+
+        Returns
+        -------
+        float or None
+            Time limit in seconds, or None for no limit.
+        """
+        if isinstance(self.timeout, dict):
+            return self.timeout.get(program.lower())
+        return self.timeout
+
     def windows_run_cmd(self, *args: str) -> str:
         """
         Form the run command string for the native Windows executables.
@@ -465,13 +803,18 @@ class Superfish:
         Output is appended to ``output.log`` in the working directory when
         running through a container.
 
+        The program is killed if it runs longer than its
+        :meth:`stage_timeout`, and a container that fails to launch is
+        retried up to ``retries`` times with exponential backoff.
+
         Parameters
         ----------
         *cmds : str
             Program name and arguments, e.g. ``("automesh", "TEST.AM")``.
         **kwargs
-            Passed to ``subprocess.call`` (container) or
-            ``subprocess.run`` (native Windows).
+            Passed to ``subprocess.Popen`` (container) or
+            ``subprocess.run`` (native Windows). A ``timeout`` here
+            overrides the configured one.
 
         Returns
         -------
@@ -479,33 +822,57 @@ class Superfish:
             The return code (container), or the completed process (native
             Windows).
 
+        Raises
+        ------
+        subprocess.TimeoutExpired
+            If the program runs over its time limit.
+
         Examples
         --------
         >>> sf.run_cmd("automesh", "TEST.AM", timeout=1)
         """
-        if self.use_container:
-            cmd = self.container_run_cmd(*cmds)
-        else:
-            cmd = self.windows_run_cmd(*cmds)
+        timeout = kwargs.pop("timeout", self.stage_timeout(cmds[0]))
+        self._last_peak_memory: int | None = None
 
-        self.vprint(f"Running: {cmd}")
+        if not self.use_container:
+            cmd = self.windows_run_cmd(*cmds)
+            self.vprint(f"Running: {cmd}")
+            # Windows needs this
+            return subprocess.run(cmd.split(), cwd=self.path, timeout=timeout, **kwargs)
 
         logfile = os.path.join(self.path, "output.log")
 
-        if self.use_container:
-            # Shifter and Singularity don't need volume mounting
-            if self.container_method in ("shifter", "singularity"):
-                cwd = self.path
-            else:
-                cwd = None
+        # Shifter and Singularity don't need volume mounting
+        if self.container_method in ("shifter", "singularity"):
+            cwd = self.path
+        else:
+            cwd = None
+
+        for attempt in range(self.retries + 1):
+            name = f"pysuperfish-{uuid.uuid4().hex[:12]}"
+            cmd = self.container_run_cmd(*cmds, name=name)
+            self.vprint(f"Running: {cmd}")
 
             with open(logfile, "a") as output:
-                P = subprocess.call(
-                    cmd, shell=True, stdout=output, stderr=output, cwd=cwd, **kwargs
+                P, self._last_peak_memory = _call_with_timeout(
+                    cmd,
+                    timeout,
+                    container_name=name if self.container_method == "docker" else None,
+                    cancel=self.cancel,
+                    stdout=output,
+                    stderr=output,
+                    cwd=cwd,
+                    **kwargs,
                 )
-        else:
-            # Windows needs this
-            P = subprocess.run(cmd.split(), cwd=self.path, **kwargs)
+
+            if P not in self._container_launch_failures or attempt == self.retries:
+                break
+
+            delay = self.retry_backoff * 2**attempt
+            self.vprint(
+                f"Container launch failed with exit code {P}, retrying in {delay} s"
+            )
+            sleep(delay)
 
         return P
 
@@ -563,6 +930,9 @@ class Superfish:
         else:
             raise ValueError(f"Units must be original or cm: {units}")
 
+        # matplotlib is only imported when plotting
+        from .plot import plot_wall
+
         plot_wall(self.output["sfo"]["wall_segments"], conv=conv, **kwargs)
 
     def write_input(self) -> None:
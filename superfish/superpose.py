@@ -0,0 +1,296 @@
+from typing import Any, cast
+
+import numpy as np
+from beamphysics import FieldMesh
+
+from .types import ExternalFieldData, FieldSource, FishT7Data, PoissonT7Data
+from .writers import t7_openpmd_components
+
+
+def _source_data(
+    field: FieldMesh | FishT7Data | PoissonT7Data,
+    type: str | None = None,
+) -> tuple[tuple[float, float, int, float, float, int], float, dict[str, Any]]:
+    """
+    Grid, frequency, and SI components of a field map.
+
+    Returns ``(zmin, dz, nz, rmin, dr, nr)`` in meters, the frequency in
+    Hz, and a dict of openPMD component name to ``(array, factor)``, with
+    (nr, nz) arrays in native units that give SI when multiplied by
+    ``factor``.
+    """
+    if isinstance(field, FieldMesh):
+        assert field.geometry == "cylindrical", "Only cylindrical FieldMesh"
+        rmin, _, zmin = field.mins
+        dr, _, dz = field.deltas
+        nr, _, nz = field.shape
+        # Views, (nr, nz)
+        components = {k: (v[:, 0, :], 1) for k, v in field.components.items()}
+        grid = (float(zmin), float(dz), int(nz), float(rmin), float(dr), int(nr))
+        return grid, field.frequency, components
+
+    t7 = cast("dict[str, Any]", field)
+    # cm -> m
+    nz, nr = t7["nz"], t7["nr"]
+    dz = (t7["zmax"] - t7["zmin"]) * 1e-2 / (nz - 1)
+    dr = (t7["rmax"] - t7["rmin"]) * 1e-2 / (nr - 1)
+    grid = (t7["zmin"] * 1e-2, dz, nz, t7["rmin"] * 1e-2, dr, nr)
+    if t7["problem"] == "fish":
+        frequency = t7["freq"] * 1e6
+    else:
+        frequency = 0
+        type = type or ("electric" if "Ez" in t7 else "magnetic")
+    components = {
+        component: (t7[key], factor)
+        for key, component, factor in t7_openpmd_components(t7["problem"], type)
+    }
+    return grid, frequency, components
+
+
+def _linear_weights(
+    x: np.ndarray,
+    x0: float,
+    dx: float,
+    n: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Lower indices, upper weights, and in-range mask for linear
+    interpolation on a regular grid.
+    """
+    f = (x - x0) / dx
+    inside = (f >= -1e-9) & (f <= n - 1 + 1e-9)
+    i = np.clip(np.floor(f).astype(int), 0, n - 2)
+    w = np.clip(f - i, 0, 1)
+    return i, w, inside
+
+
+def common_frequency(frequencies: list[float], freq_rtol: float = 1e-3) -> float:
+    """
+    Frequency shared by several field maps, within a relative tolerance.
+
+    Separate solves of the same mode differ in the last digits, so the
+    frequencies only have to agree to ``freq_rtol``.
+
+    Parameters
+    ----------
+    frequencies : list of float
+        Frequencies in Hz, 0 for static fields.
+    freq_rtol : float
+        Maximum spread of the frequencies, relative to their mean.
+
+    Returns
+    -------
+    float
+        The mean frequency, or 0 if all are static.
+
+    Raises
+    ------
+    ValueError
+        If static and RF fields are mixed, or the spread exceeds
+        ``freq_rtol``.
+    """
+    if any(frequencies) and not all(frequencies):
+        raise ValueError(
+            "Static and RF fields cannot be combined in one map; "
+            "use superpose_by_frequency"
+        )
+    frequency = float(np.mean(frequencies))
+    if frequency and np.ptp(frequencies) > freq_rtol * frequency:
+        raise ValueError(
+            f"Frequencies {sorted(frequencies)} differ by more than {freq_rtol:g}"
+        )
+    return frequency
+
+
+def superpose_fields(
+    sources: list[FieldSource],
+    zmin: float,
+    zmax: float,
+    nz: int,
+    rmax: float,
+    nr: int,
+    chunk_nz: int = 1024,
+    dtype: Any = None,
+    return_fieldmesh: bool = False,
+    freq_rtol: float = 1e-3,
+) -> ExternalFieldData | FieldMesh:
+    """
+    Superpose several cylindrical field maps on a common grid.
+
+    Each source is shifted, scaled, and phased, then bilinearly resampled
+    onto the output grid and summed. Outside its own extent a source
+    contributes zero. The output grid is filled in chunks of ``chunk_nz``
+    z columns, so temporaries never exceed one chunk per source.
+
+    All sources must share one frequency, to within ``freq_rtol``: a field
+    map has a single frequency. To combine RF and static maps, e.g. an RF
+    gun with its solenoid, use :func:`superpose_by_frequency`, which
+    returns one map per frequency on a common grid.
+
+    Parameters
+    ----------
+    sources : list of FieldSource
+        Field maps with their placement: ``field`` (FieldMesh or t7data),
+        and optional ``z_offset`` (m), ``scale``, ``phase`` (rad, applied
+        as ``exp(1j * phase)`` to RF fields only), and ``type`` (for
+        Poisson t7data).
+    zmin, zmax : float
+        z extent of the output grid, in meters.
+    nz : int
+        Number of z points.
+    rmax : float
+        Radial extent of the output grid, in meters. The grid starts at
+        r = 0.
+    nr : int
+        Number of radius points.
+    chunk_nz : int
+        Number of z columns resampled at a time.
+    dtype : dtype-like, optional
+        Output dtype, e.g. ``np.complex64``. Defaults to complex for RF
+        fields and float for static fields.
+    return_fieldmesh : bool
+        Return an openPMD-beamphysics FieldMesh instead of a dict.
+    freq_rtol : float
+        Maximum relative spread of the source frequencies. The output has
+        their mean frequency.
+
+    Returns
+    -------
+    ExternalFieldData or FieldMesh
+        Keys ``attrs`` and ``components``, or a FieldMesh.
+
+    Raises
+    ------
+    ValueError
+        If the sources mix static and RF fields, or their frequencies
+        differ by more than ``freq_rtol``.
+
+    Examples
+    --------
+    >>> gun = {"field": parse_fish_t7("GUN.T7"), "scale": 1.2, "phase": 0.1}
+    >>> sol = {"field": FieldMesh("SOLENOID.h5"), "z_offset": 0.25, "scale": 0.8}
+    >>> rf = superpose_fields([gun], zmin=0, zmax=0.5, nz=1001, rmax=0.01, nr=11)
+    >>> dc = superpose_fields([sol], zmin=0, zmax=0.5, nz=1001, rmax=0.01, nr=11)
+    """
+    prepared = []
+    for source in sources:
+        grid, frequency, comps = _source_data(source["field"], source.get("type"))
+        factor = source.get("scale", 1)
+        if frequency:
+            factor = factor * np.exp(1j * source.get("phase", 0))
+        prepared.append((grid, frequency, comps, factor, source.get("z_offset", 0)))
+
+    frequency = common_frequency([float(p[1]) for p in prepared], freq_rtol)
+    if dtype is None:
+        dtype = complex if frequency else float
+
+    z = np.linspace(zmin, zmax, nz)
+    r = np.linspace(0, rmax, nr)
+
+    keys = sorted({k for p in prepared for k in p[2]})
+    components = {k: np.zeros((nr, 1, nz), dtype=dtype) for k in keys}
+
+    for grid, _, comps, factor, z_offset in prepared:
+        szmin, sdz, snz, srmin, sdr, snr = grid
+        ir, wr, rin = _linear_weights(r, srmin, sdr, snr)
+        for iz0 in range(0, nz, chunk_nz):
+            zc = z[iz0 : iz0 + chunk_nz]
+            iz, wz, zin = _linear_weights(zc - z_offset, szmin, sdz, snz)
+            if not zin.any():
+                continue
+            mask = np.outer(rin, zin)
+            for key, (a, cfactor) in comps.items():
+                # Interpolate along z on the source r rows, then along r
+                az = a[:, iz] * (1 - wz) + a[:, iz + 1] * wz
+                val = az[ir] * (1 - wr)[:, None] + az[ir + 1] * wr[:, None]
+                val = val * (cfactor * factor)
+                components[key][:, 0, iz0 : iz0 + len(zc)] += np.where(mask, val, 0)
+
+    attrs = {
+        "eleAnchorPt": "beginning",
+        "gridGeometry": "cylindrical",
+        "axisLabels": ("r", "theta", "z"),
+        "gridLowerBound": (0, 1, 0),
+        "gridSize": (nr, 1, nz),
+        "gridSpacing": (r[1] - r[0] if nr > 1 else 0, 0, z[1] - z[0]),
+        "gridOriginOffset": (0, 0, zmin),
+        "fundamentalFrequency": frequency,
+        "harmonic": 1 if frequency else 0,
+        "RFphase": 0,
+    }
+
+    data = ExternalFieldData(attrs=attrs, components=components)
+    if return_fieldmesh:
+        return FieldMesh(data=data)
+    return data
+
+
+def superpose_by_frequency(
+    sources: list[FieldSource],
+    zmin: float,
+    zmax: float,
+    nz: int,
+    rmax: float,
+    nr: int,
+    freq_rtol: float = 1e-3,
+    **kwargs: Any,
+) -> dict[float, ExternalFieldData | FieldMesh]:
+    """
+    Superpose field maps of different frequencies, one map per frequency.
+
+    A field map has a single frequency, so an element with RF and static
+    fields, e.g. an RF gun with its solenoid, is described by a list of
+    maps on a common grid. The sources are grouped by frequency (within
+    ``freq_rtol``) and each group is superposed with
+    :func:`superpose_fields`.
+
+    Parameters
+    ----------
+    sources : list of FieldSource
+        Field maps with their placement, see :func:`superpose_fields`.
+    zmin, zmax, nz, rmax, nr
+        Output grid, see :func:`superpose_fields`.
+    freq_rtol : float
+        Relative tolerance for sources to share a frequency.
+    **kwargs
+        Passed to :func:`superpose_fields`, e.g. ``return_fieldmesh``.
+
+    Returns
+    -------
+    dict
+        Superposed map of each frequency, keyed by the mean frequency of
+        its group in Hz (0 for static fields), in increasing order.
+
+    Examples
+    --------
+    >>> gun = {"field": parse_fish_t7("GUN.T7"), "scale": 1.2}
+    >>> sol = {"field": parse_poisson_t7("SOL.T7", type="magnetic"), "z_offset": 0.1}
+    >>> maps = superpose_by_frequency([gun, sol], 0, 0.5, 1001, 0.01, 11)
+    >>> static, rf = maps.values()
+    """
+    frequencies = [float(_source_data(s["field"], s.get("type"))[1]) for s in sources]
+    groups: list[list[int]] = []
+    for i in np.argsort(frequencies, kind="stable"):
+        f = frequencies[i]
+        if groups:
+            f0 = frequencies[groups[-1][0]]
+            # Static fields only group with static fields
+            if (f == 0) == (f0 == 0) and f - f0 <= freq_rtol * f:
+                groups[-1].append(int(i))
+                continue
+        groups.append([int(i)])
+
+    out = {}
+    for group in groups:
+        frequency = float(np.mean([frequencies[i] for i in group]))
+        out[frequency] = superpose_fields(
+            [sources[i] for i in group],
+            zmin,
+            zmax,
+            nz,
+            rmax,
+            nr,
+            freq_rtol=freq_rtol,
+            **kwargs,
+        )
+    return out
@@ -0,0 +1,460 @@
+"""
+Gaussian-process surrogate of summary quantities over geometry parameters.
+
+A :class:`Surrogate` is trained on stored sweep results, answers instantly
+with an uncertainty estimate, and calls the solver (an *oracle*, see
+:func:`template_oracle`) only where its uncertainty is too high.
+"""
+
+import os
+import tempfile
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+
+from .runner import cache_key, expand_template, run_tasks
+
+if TYPE_CHECKING:
+    from superfish.store import ResultsStore
+
+# An oracle maps parameter points (n, d) to quantities (n, q)
+Oracle = Callable[[np.ndarray], np.ndarray]
+
+# Random restarts of the hyperparameter fit, besides the default start
+N_RESTARTS = 4
+
+
+def _sq_distances(a: np.ndarray, b: np.ndarray, length_scale: np.ndarray) -> np.ndarray:
+    a = a / length_scale
+    b = b / length_scale
+    d2 = (a**2).sum(1)[:, None] + (b**2).sum(1)[None, :] - 2 * a @ b.T
+    return np.maximum(d2, 0)
+
+
+def _matern52(d2: np.ndarray) -> np.ndarray:
+    d = np.sqrt(5 * d2)
+    return (1 + d + d**2 / 3) * np.exp(-d)
+
+
+def _fit_gp(x: np.ndarray, y: np.ndarray, noise: float | None) -> dict[str, Any]:
+    """
+    Fit one output by maximizing the marginal likelihood over the length
+    scales (and noise), with the signal variance profiled out.
+
+    The likelihood is often multimodal, e.g. with a length scale running
+    to its bound, so L-BFGS-B starts from the default and from
+    ``N_RESTARTS`` random points (seeded, so fits are reproducible), and
+    the best optimum is kept.
+    """
+    n, dim = x.shape
+    ymean = y.mean()
+    yscale = y.std() or 1.0
+    yn = (y - ymean) / yscale
+
+    def unpack(theta: np.ndarray) -> tuple[np.ndarray, float]:
+        ls = np.exp(theta[:dim])
+        nz = noise if noise is not None else np.exp(theta[dim])
+        return ls, nz
+
+    def nll(theta: np.ndarray) -> float:
+        ls, nz = unpack(theta)
+        K = _matern52(_sq_distances(x, x, ls)) + (nz + 1e-10) * np.eye(n)
+        try:
+            c, low = cho_factor(K)
+        except np.linalg.LinAlgError:
+            return 1e25
+        alpha = cho_solve((c, low), yn)
+        sf2 = max(float(yn @ alpha) / n, 1e-300)
+        return 0.5 * n * np.log(sf2) + np.log(np.diag(c)).sum()
+
+    theta0 = np.log(np.full(dim, 0.5))
+    bounds = [(np.log(1e-3), np.log(1e2))] * dim
+    if noise is None:
+        theta0 = np.append(theta0, np.log(1e-6))
+        bounds.append((np.log(1e-12), np.log(1e-1)))
+    if n > 1:
+        rng = np.random.default_rng(0)
+        lo, hi = np.array(bounds).T
+        starts = [theta0]
+        for _ in range(N_RESTARTS):
+            start = theta0.copy()
+            # Length scales log-uniform over [0.01, 10] of the unit box
+            start[:dim] = rng.uniform(np.log(1e-2), np.log(1e1), dim)
+            starts.append(np.clip(start, lo, hi))
+        fits = [minimize(nll, t, method="L-BFGS-B", bounds=bounds) for t in starts]
+        theta = min(fits, key=lambda r: r.fun).x
+    else:
+        theta = theta0
+    ls, nz = unpack(theta)
+
+    K = _matern52(_sq_distances(x, x, ls)) + (nz + 1e-10) * np.eye(n)
+    cho = cho_factor(K)
+    alpha = cho_solve(cho, yn)
+    sf2 = float(yn @ alpha) / n if n > 1 else 1.0
+    return {
+        "x": x,
+        "cho": cho,
+        "alpha": alpha,
+        "length_scale": ls,
+        "noise": nz,
+        "signal_variance": sf2,
+        "mean": ymean,
+        "scale": yscale,
+    }
+
+
+class Surrogate:
+    """
+    Gaussian-process regression of summary quantities over parameters.
+
+    Each quantity gets its own Matérn-5/2 Gaussian process with one length
+    scale per parameter, fitted by maximum marginal likelihood on
+    parameters scaled to the unit box. Predictions come with a standard
+    deviation, which :meth:`refine` and :meth:`predict_or_solve` use to
+    decide where the solver is needed.
+
+    Parameters
+    ----------
+    params : list of str
+        Parameter names, the columns of ``x``.
+    quantities : list of str
+        Quantity names, the columns of ``y``.
+    noise : float, optional
+        Noise variance, relative to the variance of each quantity. Fitted
+        if not given.
+
+    Examples
+    --------
+    >>> sur = Surrogate.from_store(store, ["GAP", "REQ"], ["Frequency", "Q"])
+    >>> mean, std = sur.predict([[4.6, 10.1]])
+    >>> oracle = template_oracle("CELL.AM", ["GAP", "REQ"], ["Frequency", "Q"],
+    ...                          store=store, jobs=8)
+    >>> sur.refine(oracle, candidates, atol=[0.01, 50])
+    """
+
+    def __init__(
+        self,
+        params: list[str],
+        quantities: list[str],
+        noise: float | None = None,
+    ) -> None:
+        self.params = list(params)
+        self.quantities = list(quantities)
+        self.noise = noise
+        self.x = np.empty((0, len(self.params)))
+        self.y = np.empty((0, len(self.quantities)))
+        self._models: list[dict[str, Any] | None] = []
+
+    @classmethod
+    def from_store(
+        cls,
+        store: "ResultsStore",
+        params: list[str],
+        quantities: list[str],
+        where: dict[str, Any] | None = None,
+        noise: float | None = None,
+        **conditions: Any,
+    ) -> "Surrogate":
+        """
+        Surrogate trained on the runs of a results store.
+
+        Parameters
+        ----------
+        store : ResultsStore
+            Results store.
+        params, quantities : list of str
+            Parameter and summary quantity names.
+        where, **conditions
+            Which runs to train on, see
+            :meth:`superfish.store.ResultsStore.query`.
+        noise : float, optional
+            See :class:`Surrogate`.
+        """
+        table = store.table(params + quantities, where, **conditions)
+        x = np.stack([table[p] for p in params], axis=-1)
+        y = np.stack([table[q] for q in quantities], axis=-1)
+        keep = np.isfinite(x).all(axis=1)
+        return cls(params, quantities, noise=noise).fit(x[keep], y[keep])
+
+    @property
+    def n_samples(self) -> int:
+        """Number of training points."""
+        return len(self.x)
+
+    def _scale(self, x: np.ndarray) -> np.ndarray:
+        return (x - self._lo) / self._span
+
+    def fit(self, x: np.ndarray, y: np.ndarray) -> "Surrogate":
+        """
+        Fit to training data, replacing any previous data.
+
+        Parameters
+        ----------
+        x : ndarray
+            Parameters, shape (n, n_params).
+        y : ndarray
+            Quantities, shape (n, n_quantities). NaN entries are left out
+            of the fit of their quantity.
+
+        Returns
+        -------
+        Surrogate
+            self
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        y = np.asarray(y, dtype=float).reshape(len(x), len(self.quantities))
+        if x.shape[1] != len(self.params):
+            raise ValueError(f"x must have {len(self.params)} columns")
+        self.x, self.y = x, y
+        self._lo = x.min(axis=0) if len(x) else np.zeros(x.shape[1])
+        span = x.max(axis=0) - self._lo if len(x) else np.ones(x.shape[1])
+        self._span = np.where(span > 0, span, 1.0)
+
+        xs = self._scale(x)
+        self._models = []
+        for j in range(len(self.quantities)):
+            ok = np.isfinite(y[:, j])
+            self._models.append(
+                _fit_gp(xs[ok], y[ok, j], self.noise) if ok.any() else None
+            )
+        return self
+
+    def add(self, x: np.ndarray, y: np.ndarray) -> "Surrogate":
+        """
+        Add training points and refit.
+
+        Returns
+        -------
+        Surrogate
+            self
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        y = np.asarray(y, dtype=float).reshape(len(x), len(self.quantities))
+        return self.fit(np.vstack([self.x, x]), np.vstack([self.y, y]))
+
+    def predict(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predicted quantities and their standard deviations.
+
+        Parameters
+        ----------
+        x : ndarray
+            Parameters, shape (m, n_params) or (n_params,).
+
+        Returns
+        -------
+        mean, std : ndarray
+            Shape (m, n_quantities). NaN for quantities without data.
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        xs = self._scale(x)
+        mean = np.full((len(x), len(self.quantities)), np.nan)
+        std = np.full_like(mean, np.nan)
+        for j, m in enumerate(self._models):
+            if m is None:
+                continue
+            ks = _matern52(_sq_distances(xs, m["x"], m["length_scale"]))
+            mu = ks @ m["alpha"]
+            v = cho_solve(m["cho"], ks.T)
+            var = np.maximum(1 - np.einsum("ij,ji->i", ks, v), 0) * m["signal_variance"]
+            mean[:, j] = m["mean"] + m["scale"] * mu
+            std[:, j] = m["scale"] * np.sqrt(var)
+        return mean, std
+
+    def uncertain(
+        self,
+        x: np.ndarray,
+        atol: float | list[float] | np.ndarray,
+    ) -> np.ndarray:
+        """
+        Mask of the points where any quantity's standard deviation
+        exceeds its tolerance ``atol`` (scalar or one per quantity).
+        """
+        _, std = self.predict(x)
+        return (~(std <= np.asarray(atol, dtype=float))).any(axis=1)
+
+    def predict_or_solve(
+        self,
+        x: np.ndarray,
+        oracle: Oracle,
+        atol: float | list[float] | np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predict, calling the oracle only for points that are too uncertain.
+
+        Solved points are added to the training data.
+
+        Parameters
+        ----------
+        x : ndarray
+            Parameters, shape (m, n_params).
+        oracle : callable
+            Maps parameters (k, n_params) to quantities (k, n_quantities),
+            e.g. from :func:`template_oracle`.
+        atol : float or array-like
+            Largest acceptable standard deviation, per quantity.
+
+        Returns
+        -------
+        mean, std : ndarray
+            Shape (m, n_quantities). Solved points have zero std.
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        mask = self.uncertain(x, atol) if self.n_samples else np.ones(len(x), bool)
+        if mask.any():
+            y = oracle(x[mask])
+            self.add(x[mask], y)
+        mean, std = self.predict(x)
+        if mask.any():
+            mean[mask] = y
+            std[mask] = 0
+        return mean, std
+
+    def refine(
+        self,
+        oracle: Oracle,
+        candidates: np.ndarray,
+        atol: float | list[float] | np.ndarray,
+        max_solves: int = 50,
+        batch_size: int = 1,
+    ) -> int:
+        """
+        Active learning: solve the most uncertain candidates until every
+        candidate is within tolerance.
+
+        Each round solves the ``batch_size`` candidates with the largest
+        standard deviation relative to ``atol``, so a batch can run in
+        parallel in the oracle. Each candidate is solved at most once: one
+        whose std stays above ``atol`` after its solve (fitted noise), or
+        whose oracle result is NaN (failed solve), is not picked again.
+
+        Parameters
+        ----------
+        oracle : callable
+            See :meth:`predict_or_solve`.
+        candidates : ndarray
+            Points to bring within tolerance, shape (m, n_params), e.g. a
+            dense grid or a Latin hypercube over the design space.
+        atol : float or array-like
+            Largest acceptable standard deviation, per quantity.
+        max_solves : int
+            Maximum number of oracle calls, in points.
+        batch_size : int
+            Points solved per round.
+
+        Returns
+        -------
+        int
+            Number of points solved.
+        """
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=float))
+        atol = np.asarray(atol, dtype=float)
+        solved = np.zeros(len(candidates), dtype=bool)
+        n = 0
+        while n < max_solves:
+            if self.n_samples:
+                _, std = self.predict(candidates)
+                score = np.nanmax(np.where(np.isnan(std), np.inf, std) / atol, axis=1)
+            else:
+                score = np.full(len(candidates), np.inf)
+            score[solved] = -np.inf
+            if not (score > 1).any():
+                break
+            k = min(batch_size, max_solves - n, int((score > 1).sum()))
+            pick = np.argsort(-score)[:k]
+            solved[pick] = True
+            self.add(candidates[pick], oracle(candidates[pick]))
+            n += k
+        return n
+
+    def __repr__(self) -> str:
+        return (
+            f"<Surrogate {self.quantities} over {self.params}, "
+            f"{self.n_samples} samples>"
+        )
+
+
+def template_oracle(
+    template: str,
+    params: list[str],
+    quantities: list[str],
+    fixed: dict[str, Any] | None = None,
+    fmt: str = "%.8g",
+    store: "ResultsStore | None" = None,
+    problem: str = "fish",
+    jobs: int = 1,
+    **options: Any,
+) -> Oracle:
+    """
+    Oracle that solves an automesh template at parameter points.
+
+    Each call expands the template at every point and runs the batch in
+    ``jobs`` worker processes.
+
+    Parameters
+    ----------
+    template : str
+        Automesh template with ``{NAME}`` placeholders.
+    params : list of str
+        Names of the template parameters, in the column order of the
+        points.
+    quantities : list of str
+        SFO summary quantities returned, NaN where missing or failed.
+    fixed : dict, optional
+        Values of the other template parameters.
+    fmt : str
+        printf-style format of the parameters in the automesh file.
+    store : ResultsStore, optional
+        Results store to record every solve in.
+    problem : {"fish", "poisson"}
+        Problem type.
+    jobs : int
+        Number of parallel worker processes.
+    **options
+        Passed to :func:`superfish.runner.run_automesh`, e.g. ``cache_dir``.
+
+    Returns
+    -------
+    callable
+        Maps points (k, n_params) to quantities (k, n_quantities).
+    """
+
+    fixed = dict(fixed or {})
+
+    def oracle(x: np.ndarray) -> np.ndarray:
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tasks = []
+            for i, row in enumerate(x):
+                values = {k: [str(v)] for k, v in fixed.items()}
+                values.update({p: [fmt % v] for p, v in zip(params, row)})
+                case_dir = os.path.join(tmpdir, f"point_{i:04d}")
+                ((file, point),) = expand_template(template, values, case_dir)
+                extra = {"params": point, "key": cache_key(file, problem)}
+                tasks.append((file, dict(options, problem=problem), extra))
+            results = run_tasks(
+                tasks, jobs=jobs, history=options.get("history"), problem=problem
+            )
+
+        y = np.full((len(x), len(quantities)), np.nan)
+        for i, r in enumerate(results):
+            if r["status"] == "failed":
+                continue
+            data = r["summary"].get("data", {})
+            y[i] = [data.get(q, np.nan) for q in quantities]
+            if store is not None:
+                store.add(
+                    r["key"],
+                    params=r["params"],
+                    summary=data,
+                    units=r["summary"].get("units", {}),
+                    problem=problem,
+                    basename=r.get("basename"),
+                    source=r.get("path"),
+                )
+        return y
+
+    return oracle
@@ -0,0 +1,339 @@
+"""
+Frequency tuning: adjust one geometry parameter until a summary quantity,
+normally the fish frequency, hits a target.
+
+:func:`tune` uses a safeguarded secant method: secant steps while they
+make progress, falling back to bisection inside a sign-change bracket
+(Dekker/Brent style), so it converges in a few solves on smooth problems
+and never diverges once the root is bracketed. Identical inputs are
+served from the run cache, and a :class:`superfish.store.ResultsStore`
+provides warm starts from previously tuned neighboring geometries.
+"""
+
+import os
+import tempfile
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from .runner import cache_key, expand_template, run_tasks
+from .types import TuningResult, TuningStep
+
+if TYPE_CHECKING:
+    from superfish.store import ResultsStore
+
+
+def warm_start(
+    store: "ResultsStore",
+    param: str,
+    target: float,
+    fixed: dict[str, Any] | None = None,
+    quantity: str = "Frequency",
+    rtol: float = 1e-4,
+) -> dict[str, Any] | None:
+    """
+    Starting point from previously tuned neighbors in a results store.
+
+    A neighbor is a stored run with ``quantity`` within ``rtol`` of the
+    target. The nearest one in the space of the ``fixed`` parameters
+    (relative distance), and of those the closest to the target, gives the
+    starting value of ``param``. Stored runs
+    with the same fixed parameters as that neighbor give the slope
+    ``d quantity / d param``, if there are at least two.
+
+    Parameters
+    ----------
+    store : ResultsStore
+        Results store.
+    param : str
+        Tuned parameter.
+    target : float
+        Target value of ``quantity``.
+    fixed : dict, optional
+        The other geometry parameters of the problem being tuned.
+    quantity : str
+        Summary quantity being tuned.
+    rtol : float
+        Relative tolerance for a stored run to count as tuned.
+
+    Returns
+    -------
+    dict or None
+        ``value`` (starting value of ``param``), ``slope`` (or None),
+        ``key`` and ``params`` of the neighbor, and ``distance``. None if
+        the store has no tuned neighbor.
+    """
+    fixed = {k: float(v) for k, v in (fixed or {}).items()}
+    band = rtol * abs(target)
+    candidates = store.query(
+        where={quantity: (target - band, target + band), param: (None, None)}
+    )
+
+    best = None
+    best_distance = np.inf
+    best_miss = np.inf
+    for run in candidates:
+        try:
+            values = {k: float(run["params"][k]) for k in fixed}
+        except (KeyError, TypeError, ValueError):
+            continue
+        distance = float(
+            np.sqrt(
+                sum(
+                    ((values[k] - v) / (abs(v) if v else 1.0)) ** 2
+                    for k, v in fixed.items()
+                )
+            )
+        )
+        # Nearest geometry first, then the best tuned
+        miss = abs(run["summary"][quantity] - target)
+        if (distance, miss) < (best_distance, best_miss):
+            best, best_distance, best_miss = run, distance, miss
+    if best is None:
+        return None
+
+    # Slope from runs of the neighbor's geometry at other values of param
+    where: dict[str, Any] = {k: float(best["params"][k]) for k in fixed}
+    where[param] = (None, None)
+    same = store.query(where)
+    x = np.array([float(r["params"][param]) for r in same if quantity in r["summary"]])
+    y = np.array([r["summary"][quantity] for r in same if quantity in r["summary"]])
+    slope = None
+    if len(np.unique(x)) >= 2:
+        slope = float(np.polyfit(x, y, 1)[0]) or None
+
+    return {
+        "value": float(best["params"][param]),
+        "slope": slope,
+        "key": best["key"],
+        "params": best["params"],
+        "distance": best_distance,
+    }
+
+
+def _secant_step(steps: list[TuningStep], target: float) -> float | None:
+    # Secant through the two most recent successful solves
+    (xa, fa), (xb, fb) = [(s["value"], s["result"] - target) for s in steps[-2:]]
+    if fb == fa:
+        return None
+    return xb - fb * (xb - xa) / (fb - fa)
+
+
+def tune(
+    template: str,
+    param: str,
+    target: float,
+    x0: float | None = None,
+    x1: float | None = None,
+    bracket: tuple[float, float] | None = None,
+    fixed: dict[str, Any] | None = None,
+    quantity: str = "Frequency",
+    ftol: float = 1e-3,
+    xtol: float = 1e-6,
+    max_solves: int = 12,
+    step: float | None = None,
+    bounds: tuple[float | None, float | None] = (None, None),
+    fmt: str = "%.7g",
+    store: "ResultsStore | None" = None,
+    problem: str = "fish",
+    **options: Any,
+) -> TuningResult:
+    """
+    Tune one template parameter until a summary quantity hits a target.
+
+    Parameters
+    ----------
+    template : str
+        Automesh template with ``{NAME}`` placeholders, see
+        :func:`superfish.runner.expand_template`.
+    param : str
+        Name of the tuned parameter.
+    target : float
+        Target value of ``quantity``, e.g. the frequency in MHz.
+    x0, x1 : float, optional
+        First two values of ``param``. ``x0`` defaults to the warm start
+        from ``store``, and ``x1`` to a Newton step with the stored slope,
+        or ``x0 + step``.
+    bracket : tuple of float, optional
+        Values of ``param`` known to bracket the target. Both ends are
+        solved concurrently, and every later step stays inside.
+    fixed : dict, optional
+        Values of the other template parameters.
+    quantity : str
+        SFO summary quantity to tune.
+    ftol : float
+        Absolute tolerance on ``quantity``.
+    xtol : float
+        Stop when the bracket is narrower than this.
+    max_solves : int
+        Maximum number of solves.
+    step : float, optional
+        Initial step in ``param``. Defaults to 1% of ``x0``.
+    bounds : tuple, optional
+        Limits on ``param``; steps outside are clipped.
+    fmt : str
+        printf-style format of ``param`` in the automesh file.
+    store : ResultsStore, optional
+        Results store for warm starts. Every solve is added to it.
+    problem : {"fish", "poisson"}
+        Problem type.
+    **options
+        Passed to :func:`superfish.runner.run_automesh`, e.g. ``cache_dir`` to
+        reuse earlier solves of identical inputs.
+
+    Returns
+    -------
+    TuningResult
+
+    Examples
+    --------
+    >>> result = tune("CELL.AM", "REQ", 1300.0, x0=10.2, fixed={"GAP": 4.5},
+    ...               cache_dir="sfcache")
+    >>> result["value"], result["n_solves"]
+    (10.16413, 4)
+    """
+
+    fixed = dict(fixed or {})
+    lo_bound, hi_bound = bounds
+    steps: list[TuningStep] = []
+
+    start = None
+    if store is not None and x0 is None and bracket is None:
+        start = warm_start(store, param, target, fixed, quantity=quantity)
+    if bracket is None and x0 is None:
+        if start is None:
+            raise ValueError("Give x0 or bracket, or a store with tuned neighbors")
+        x0 = start["value"]
+
+    def clip(x: float) -> float:
+        if lo_bound is not None:
+            x = max(x, lo_bound)
+        if hi_bound is not None:
+            x = min(x, hi_bound)
+        return x
+
+    def solve(xs: list[float]) -> list[TuningStep]:
+        # One run per value, concurrently
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tasks = []
+            for i, x in enumerate(xs):
+                point = {param: [fmt % x]} | {k: [str(v)] for k, v in fixed.items()}
+                file, params = expand_template(
+                    template, point, os.path.join(tmpdir, f"solve_{i}")
+                )[0]
+                extra = {"params": params, "key": cache_key(file, problem)}
+                tasks.append((file, dict(options, problem=problem), extra))
+            results = run_tasks(tasks, jobs=len(tasks), problem=problem)
+
+        out = []
+        for x, r in zip(xs, results):
+            r["input"] = os.path.abspath(template)
+            value = r.get("summary", {}).get("data", {}).get(quantity)
+            if r["status"] != "failed" and value is None:
+                r = dict(r, status="failed", error=f"No {quantity} in SFO summary")
+            if store is not None and r["status"] != "failed":
+                store.add(
+                    r["key"],
+                    params=r["params"],
+                    summary=r["summary"]["data"],
+                    units=r["summary"]["units"],
+                    problem=problem,
+                    basename=r.get("basename"),
+                    source=r.get("path"),
+                )
+            out.append(
+                TuningStep(
+                    value=float(fmt % x),
+                    result=float(value) if r["status"] != "failed" else float("nan"),
+                    status=r["status"],
+                    run=r,
+                )
+            )
+        steps.extend(out)
+        return out
+
+    def failed(new: list[TuningStep]) -> str | None:
+        errors = [s["run"]["error"] for s in new if s["status"] == "failed"]
+        return "; ".join(errors) if errors else None
+
+    # Bracket, if any, from concurrent solves of both ends
+    a = b = None
+    if bracket is not None:
+        new = solve([clip(bracket[0]), clip(bracket[1])])
+        if failed(new):
+            raise RuntimeError(f"Solve failed: {failed(new)}")
+        a, b = new
+        if (a["result"] - target) * (b["result"] - target) > 0:
+            raise ValueError(
+                f"{quantity} does not cross {target} in {param} = {bracket}: "
+                f"{a['result']}, {b['result']}"
+            )
+    else:
+        assert x0 is not None
+        new = solve([clip(x0)])
+        if failed(new):
+            raise RuntimeError(f"Solve failed: {failed(new)}")
+        f0 = new[0]["result"] - target
+        if abs(f0) > ftol:
+            if x1 is None:
+                if start is not None and start["slope"]:
+                    x1 = x0 - f0 / start["slope"]
+                else:
+                    x1 = x0 + (step or (0.01 * abs(x0) or 0.01))
+            new = solve([clip(x1)])
+            if failed(new):
+                raise RuntimeError(f"Solve failed: {failed(new)}")
+        if len(steps) == 2:
+            f0, f1 = (s["result"] - target for s in steps)
+            if f0 * f1 <= 0:
+                a, b = steps
+
+    best = min(steps, key=lambda s: abs(s["result"] - target))
+    widths: list[float] = []
+    while abs(best["result"] - target) > ftol and len(steps) < max_solves:
+        if a is not None and b is not None and abs(b["value"] - a["value"]) <= xtol:
+            break
+
+        x = _secant_step(steps, target) if len(steps) >= 2 else None
+        if a is not None and b is not None:
+            lo, hi = sorted((a["value"], b["value"]))
+            widths.append(hi - lo)
+            # Bisect if the secant step leaves the bracket or stalls, i.e.
+            # the bracket did not shrink by half over the last two steps
+            stalled = len(widths) >= 3 and widths[-1] > 0.5 * widths[-3]
+            if x is None or stalled or not lo < x < hi:
+                x = 0.5 * (lo + hi)
+        elif x is None:
+            raise RuntimeError(f"{quantity} does not change with {param}")
+        x = clip(x)
+        if any(abs(s["value"] - float(fmt % x)) == 0 for s in steps):
+            # Format resolution reached
+            break
+
+        (s,) = solve([x])
+        if s["status"] == "failed":
+            raise RuntimeError(f"Solve failed: {s['run']['error']}")
+        if a is not None and b is not None:
+            if (s["result"] - target) * (a["result"] - target) <= 0:
+                b = s
+            else:
+                a = s
+        elif len(steps) >= 2:
+            prev = min(steps[:-1], key=lambda t: abs(t["result"] - target))
+            if (s["result"] - target) * (prev["result"] - target) <= 0:
+                a, b = prev, s
+        best = min(steps, key=lambda t: abs(t["result"] - target))
+
+    return TuningResult(
+        param=param,
+        value=best["value"],
+        result=best["result"],
+        target=target,
+        error=best["result"] - target,
+        converged=abs(best["result"] - target) <= ftol,
+        n_evaluations=len(steps),
+        n_solves=sum(1 for s in steps if s["status"] == "ok"),
+        steps=steps,
+        warm_start=start,
+        run=best["run"],
+    )
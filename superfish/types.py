@@ -105,3 +105,255 @@ class ExternalFieldData(TypedDict):
 
     attrs: dict[str, Any]
     components: dict[str, np.ndarray]
+
+
+class AdaptiveT7Data(TypedDict):
+    """Adaptively refined field map, as returned by
+    :func:`superfish.adaptive.interpolate2d_adaptive`.
+
+    ``patches`` are t7data on finer sub-grids of ``base``, with refinement
+    level ``levels[i]``.
+    """
+
+    base: FishT7Data | PoissonT7Data
+    patches: list[FishT7Data | PoissonT7Data]
+    levels: list[int]
+    rtol: float
+    n_points: int
+
+
+class _FieldSourceBase(TypedDict):
+    field: Any
+
+
+class FieldSource(_FieldSourceBase, total=False):
+    """A field map placed in a superposition, for
+    :func:`superfish.superpose.superpose_fields`.
+
+    ``field`` is a cylindrical FieldMesh or t7data. ``z_offset`` is in
+    meters and ``phase`` in radians.
+    """
+
+    z_offset: float
+    scale: float
+    phase: float
+    type: str
+
+
+class OnAxisErrorReport(TypedDict):
+    """Error of an on-axis expansion against a full map, from
+    :meth:`superfish.onaxis.OnAxisExpansion.error_report`.
+
+    Errors are keyed by openPMD component name, in SI units.
+    """
+
+    max_error: dict[str, float]
+    rms_error: dict[str, float]
+    relative_max_error: dict[str, float]
+    n_coefficients: int
+    n_map_points: int
+
+
+class _RunRecordBase(TypedDict):
+    input_hash: str
+    problem: str
+    elapsed: float
+
+
+class RunRecord(_RunRecordBase, total=False):
+    """One run in a :class:`superfish.history.RunHistory`.
+
+    ``dx`` is the ``&reg`` mesh spacing in input units, ``nodes`` the mesh
+    node count, ``elapsed`` and ``stages`` (program name to duration) are in
+    seconds, and ``peak_memory`` is the largest resident set of the solver
+    processes of that run, in bytes, measured after their exec so it does
+    not include the Python driver, or None where it cannot be measured per
+    run (docker, or no ``/proc``).
+    """
+
+    timestamp: float
+    basename: str | None
+    dx: float | None
+    nodes: int | None
+    stages: dict[str, float]
+    peak_memory: int | None
+    host: str | None
+
+
+class QueueTask(TypedDict, total=False):
+    """A task in a :class:`superfish.workqueue.WorkQueue`.
+
+    ``status`` is one of ``"queued"``, ``"running"``, ``"done"`` or
+    ``"failed"``. Times are Unix timestamps of the host that wrote them,
+    ``beats`` counts the heartbeats of the current attempt, and ``result``
+    is the result dict of :func:`superfish.runner.run_automesh` for done
+    tasks.
+    """
+
+    id: int
+    name: str
+    automesh: str
+    problem: str
+    params: dict[str, Any]
+    priority: float
+    status: str
+    worker: str | None
+    attempts: int
+    created: float
+    started: float | None
+    heartbeat: float | None
+    beats: int
+    finished: float | None
+    result: dict[str, Any] | None
+    error: str | None
+
+
+class StoredRun(TypedDict):
+    """A run in a :class:`superfish.store.ResultsStore`.
+
+    ``params`` are the geometry parameters, ``summary`` and ``units`` the
+    SFO summary quantities, and ``source`` where the run was imported
+    from. The wall-segment tables and field map, if stored, are loaded
+    with :meth:`superfish.store.ResultsStore.wall_segments` and
+    :meth:`superfish.store.ResultsStore.field`.
+    """
+
+    key: str
+    basename: str | None
+    problem: str
+    timestamp: float
+    params: dict[str, Any]
+    summary: dict[str, float]
+    units: dict[str, str]
+    source: str | None
+    has_wall_segments: bool
+    has_field: bool
+
+
+class RichardsonEstimate(TypedDict):
+    """Result of :func:`superfish.convergence.richardson_extrapolate`.
+
+    ``value`` is the extrapolated zero-spacing value, ``error`` and
+    ``relative_error`` the estimated discretization error of the finest
+    mesh, ``gci`` its grid convergence index (relative), and ``order`` the
+    order of convergence used, observed if ``observed_order`` is True.
+    """
+
+    value: float
+    error: float
+    relative_error: float
+    gci: float
+    order: float
+    observed_order: bool
+
+
+class ConvergedQuantity(RichardsonEstimate):
+    """A quantity of a :class:`MeshConvergenceReport`, with its ``values``
+    on each mesh and its ``units``."""
+
+    values: list[float]
+    units: str
+
+
+class MeshConvergenceReport(TypedDict):
+    """Result of :func:`superfish.convergence.mesh_convergence`.
+
+    ``dx`` are the mesh spacings that ran, ``recommended_dx`` the largest
+    spacing predicted to keep every quantity within ``rtol`` of its
+    extrapolated value, and ``results`` the result of each run, see
+    :func:`superfish.runner.run_automesh`.
+    """
+
+    dx: list[float]
+    quantities: dict[str, ConvergedQuantity]
+    rtol: float
+    recommended_dx: float | None
+    results: list[dict[str, Any]]
+
+
+class TuningStep(TypedDict):
+    """One evaluation of :func:`superfish.tuning.tune`: the parameter
+    ``value``, the tuned quantity ``result``, the run ``status`` (``"ok"``
+    or ``"cached"``), and the ``run`` result of
+    :func:`superfish.runner.run_automesh`."""
+
+    value: float
+    result: float
+    status: str
+    run: dict[str, Any]
+
+
+class TuningResult(TypedDict):
+    """Result of :func:`superfish.tuning.tune`.
+
+    ``value`` is the best parameter value found, ``result`` the tuned
+    quantity there and ``error`` its difference from ``target``.
+    ``n_evaluations`` counts every evaluation and ``n_solves`` only those
+    not served from the cache. ``warm_start`` is the neighbor used to
+    start, see :func:`superfish.tuning.warm_start`.
+    """
+
+    param: str
+    value: float
+    result: float
+    target: float
+    error: float
+    converged: bool
+    n_evaluations: int
+    n_solves: int
+    steps: list[TuningStep]
+    warm_start: dict[str, Any] | None
+    run: dict[str, Any]
+
+
+class SensitivityReport(TypedDict):
+    """Result of :func:`superfish.sensitivity.sensitivity`.
+
+    ``jacobian[i, j]`` is the derivative of ``quantities[i]`` with respect
+    to ``params[j]``, and ``error`` its estimated error (NaN without an
+    error estimate). ``nominal`` holds the parameter values and ``values``
+    the quantities at the nominal point, and ``step`` the step of each
+    parameter.
+    """
+
+    params: list[str]
+    quantities: list[str]
+    nominal: dict[str, float]
+    values: dict[str, float]
+    units: dict[str, str]
+    step: dict[str, float]
+    scheme: str
+    jacobian: np.ndarray
+    error: np.ndarray
+    results: list[dict[str, Any]]
+
+
+class StitchSeam(TypedDict):
+    """Field discontinuity at one seam of a stitched map, from
+    :func:`superfish.stitch.stitch_cells`.
+
+    ``error`` is keyed by openPMD component name: the maximum difference
+    between the two weighted cells on the seam plane, relative to the
+    maximum of the component over the stitched map.
+    """
+
+    z: float
+    cells: tuple[int, int]
+    error: dict[str, float]
+    max_error: float
+
+
+class StitchReport(TypedDict):
+    """Report of :func:`superfish.stitch.stitch_cells`.
+
+    ``weights`` are the complex factors applied to each cell, including
+    any seam matching, and ``z_offset`` the placement of each cell, in
+    meters. ``frequencies`` are those of the cells, in Hz.
+    """
+
+    frequency: float
+    frequencies: list[float]
+    z_offset: list[float]
+    weights: list[complex]
+    seams: list[StitchSeam]
+    max_error: float
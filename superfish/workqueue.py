@@ -0,0 +1,540 @@
+"""
+Work queue for running sweeps on many hosts.
+
+Tasks live in a SQLite file on storage shared by all hosts. Each host runs
+:func:`run_workers`, whose worker processes claim tasks atomically, send
+heartbeats while they run, and store their results. Tasks whose worker
+stopped sending heartbeats (a dead host or killed job) are put back in the
+queue for another worker, and a worker whose task was taken away kills
+its run.
+
+A heartbeat increments a counter rather than comparing clocks: each
+worker times how long it has seen a task's counter unchanged on its own
+monotonic clock, so clock skew between hosts cannot make a live task look
+stale, or a dead one look alive. The ``created``, ``started``,
+``heartbeat`` and ``finished`` times are informational only.
+
+SQLite locking relies on the shared file system honoring POSIX locks.
+Most cluster file systems (Lustre, GPFS, NFSv4 with locking) do; NFSv3
+without ``lockd`` does not.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from time import monotonic, sleep, time
+from typing import Any
+
+from .runner import RUN_ERRORS, ResultEncoder, run_automesh
+from .types import QueueTask
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    automesh TEXT NOT NULL,
+    problem TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    heartbeat REAL,
+    beats INTEGER NOT NULL DEFAULT 0,
+    finished REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, priority);
+"""
+
+STATUSES = ("queued", "running", "done", "failed")
+
+
+class WorkQueue:
+    """
+    SQLite work queue of Superfish runs.
+
+    Parameters
+    ----------
+    filename : str
+        Queue database, on storage shared by all hosts.
+    max_attempts : int
+        Number of times a task lost to a dead worker is tried before it is
+        marked failed.
+
+    Examples
+    --------
+    On the submitting host:
+
+    >>> queue = WorkQueue("/shared/sweep.sqlite")
+    >>> queue.submit("CAVITY_1.AM")
+
+    On each compute host:
+
+    >>> run_workers("/shared/sweep.sqlite", jobs=32, cache_dir="/shared/cache")
+    """
+
+    def __init__(self, filename: str, max_attempts: int = 3) -> None:
+        self.filename = os.path.abspath(filename)
+        self.max_attempts = max_attempts
+        # Task id to ((attempts, beats), monotonic time first seen)
+        self._seen: dict[int, tuple[tuple[int, int], float]] = {}
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+            columns = {row["name"] for row in con.execute("PRAGMA table_info(tasks)")}
+            if "beats" not in columns:
+                # Queue created before heartbeats were counted
+                con.execute(
+                    "ALTER TABLE tasks ADD COLUMN beats INTEGER NOT NULL DEFAULT 0"
+                )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit mode, so transactions are explicit and immediate
+        con = sqlite3.connect(self.filename, timeout=60, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        try:
+            yield con
+        finally:
+            con.close()
+
+    def submit(
+        self,
+        automesh: str,
+        problem: str = "fish",
+        params: dict[str, Any] | None = None,
+        priority: float = 0,
+        name: str | None = None,
+    ) -> int:
+        """
+        Add a task.
+
+        The automesh file contents are stored in the queue, so the file
+        itself need not be visible to the workers.
+
+        Parameters
+        ----------
+        automesh : str
+            Path to the automesh file.
+        problem : {"fish", "poisson"}
+            Problem type.
+        params : dict, optional
+            Sweep parameters, reported with the result.
+        priority : float
+            Tasks with higher priority are claimed first, e.g. the
+            predicted runtime for longest-first scheduling.
+        name : str, optional
+            File name to run as. Defaults to the base name of ``automesh``.
+
+        Returns
+        -------
+        int
+            Task id.
+        """
+        with open(automesh) as f:
+            text = f.read()
+        with self._connect() as con:
+            cur = con.execute(
+                "INSERT INTO tasks (name, automesh, problem, params, priority, "
+                "created) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    name or os.path.basename(automesh),
+                    text,
+                    problem,
+                    json.dumps(params or {}),
+                    priority,
+                    time(),
+                ),
+            )
+        return int(cur.lastrowid or 0)
+
+    def claim(self, worker: str) -> QueueTask | None:
+        """
+        Atomically claim the highest priority queued task.
+
+        Parameters
+        ----------
+        worker : str
+            Worker id, e.g. ``"host:pid"``.
+
+        Returns
+        -------
+        QueueTask or None
+            The claimed task, now ``"running"``, or None if the queue has
+            no queued tasks.
+        """
+        now = time()
+        with self._connect() as con:
+            # Take the write lock before reading, so no two workers see the
+            # same queued task
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                row = con.execute(
+                    "SELECT id FROM tasks WHERE status = 'queued' "
+                    "ORDER BY priority DESC, id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    con.execute("COMMIT")
+                    return None
+                con.execute(
+                    "UPDATE tasks SET status = 'running', worker = ?, "
+                    "attempts = attempts + 1, started = ?, heartbeat = ? "
+                    "WHERE id = ?",
+                    (worker, now, now, row["id"]),
+                )
+                task = con.execute(
+                    "SELECT * FROM tasks WHERE id = ?", (row["id"],)
+                ).fetchone()
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        return _task(task)
+
+    def heartbeat(self, task_id: int, worker: str) -> bool:
+        """
+        Mark a running task as alive.
+
+        Parameters
+        ----------
+        task_id : int
+            Task id.
+        worker : str
+            Worker id that claimed the task.
+
+        Returns
+        -------
+        bool
+            False if the task is no longer owned by ``worker`` (it was
+            requeued), in which case the worker should give it up.
+        """
+        with self._connect() as con:
+            cur = con.execute(
+                "UPDATE tasks SET heartbeat = ?, beats = beats + 1 "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time(), task_id, worker),
+            )
+        return cur.rowcount == 1
+
+    def finish(
+        self,
+        task_id: int,
+        worker: str,
+        result: dict[str, Any] | None = None,
+        error: str | None = None,
+    ) -> bool:
+        """
+        Store the outcome of a task.
+
+        Parameters
+        ----------
+        task_id : int
+            Task id.
+        worker : str
+            Worker id that claimed the task.
+        result : dict, optional
+            JSON-serializable result, for a successful task.
+        error : str, optional
+            Error message, for a failed task.
+
+        Returns
+        -------
+        bool
+            False if the task was requeued meanwhile; the outcome is then
+            discarded.
+        """
+        status = "failed" if error else "done"
+        with self._connect() as con:
+            cur = con.execute(
+                "UPDATE tasks SET status = ?, finished = ?, result = ?, error = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, time(), json.dumps(result), error, task_id, worker),
+            )
+        return cur.rowcount == 1
+
+    def requeue_stale(self, stale_after: float = 120) -> int:
+        """
+        Requeue running tasks whose worker stopped sending heartbeats.
+
+        A task is stale when this object has seen no heartbeat for it for
+        ``stale_after`` seconds, timed on this host's monotonic clock, so
+        the first call only starts the clock for each running task. Tasks
+        that already used ``max_attempts`` are marked failed instead.
+
+        Parameters
+        ----------
+        stale_after : float
+            Seconds without a heartbeat after which a worker is presumed
+            dead.
+
+        Returns
+        -------
+        int
+            Number of tasks requeued or failed.
+        """
+        now = monotonic()
+        n = 0
+        with self._connect() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                rows = con.execute(
+                    "SELECT id, attempts, beats FROM tasks WHERE status = 'running'"
+                ).fetchall()
+                seen = {}
+                for row in rows:
+                    state = (row["attempts"], row["beats"])
+                    last, since = self._seen.get(row["id"], (None, now))
+                    if last != state:
+                        since = now
+                    seen[row["id"]] = (state, since)
+                    if now - since < stale_after:
+                        continue
+                    if row["attempts"] >= self.max_attempts:
+                        con.execute(
+                            "UPDATE tasks SET status = 'failed', finished = ?, "
+                            "error = 'Worker lost ' || attempts || ' times' "
+                            "WHERE id = ?",
+                            (time(), row["id"]),
+                        )
+                    else:
+                        con.execute(
+                            "UPDATE tasks SET status = 'queued', worker = NULL "
+                            "WHERE id = ?",
+                            (row["id"],),
+                        )
+                    del seen[row["id"]]
+                    n += 1
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        self._seen = seen
+        return n
+
+    def retry_failed(self) -> int:
+        """
+        Put failed tasks back in the queue, with their attempts reset.
+
+        Returns
+        -------
+        int
+            Number of tasks requeued.
+        """
+        with self._connect() as con:
+            cur = con.execute(
+                "UPDATE tasks SET status = 'queued', worker = NULL, attempts = 0, "
+                "error = NULL WHERE status = 'failed'"
+            )
+        return cur.rowcount
+
+    def counts(self) -> dict[str, int]:
+        """
+        Number of tasks in each status.
+
+        Returns
+        -------
+        dict
+            Keys ``queued``, ``running``, ``done``, ``failed``.
+        """
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT status, COUNT(*) FROM tasks GROUP BY status"
+            ).fetchall()
+        out = dict.fromkeys(STATUSES, 0)
+        out.update({status: n for status, n in rows})
+        return out
+
+    def tasks(self, status: str | None = None) -> list[QueueTask]:
+        """
+        All tasks, in submission order, without their automesh text.
+
+        Parameters
+        ----------
+        status : {"queued", "running", "done", "failed"}, optional
+            Only tasks in this status.
+
+        Returns
+        -------
+        list of QueueTask
+        """
+        query = "SELECT * FROM tasks"
+        args: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            args = (status,)
+        with self._connect() as con:
+            rows = con.execute(query + " ORDER BY id", args).fetchall()
+        out = []
+        for row in rows:
+            task = _task(row)
+            del task["automesh"]
+            out.append(task)
+        return out
+
+    def __repr__(self) -> str:
+        return f"<WorkQueue {self.filename} {self.counts()}>"
+
+
+def _task(row: sqlite3.Row) -> QueueTask:
+    d = dict(row)
+    d["params"] = json.loads(d["params"])
+    if d["result"] is not None:
+        d["result"] = json.loads(d["result"])
+    return QueueTask(**d)
+
+
+def worker_id() -> str:
+    """Id of the current worker process, ``"host:pid"``."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _heartbeat_loop(
+    queue: WorkQueue,
+    task_id: int,
+    worker: str,
+    interval: float,
+    stop: threading.Event,
+    lost: threading.Event,
+) -> None:
+    """
+    Send heartbeats until ``stop`` is set. Sets ``lost`` and returns if the
+    task was requeued to another worker.
+    """
+    wait = interval
+    while not stop.wait(wait):
+        try:
+            owned = queue.heartbeat(task_id, worker)
+        except (sqlite3.Error, OSError):
+            # Locked or unreachable database: retry soon, before the task
+            # goes stale
+            wait = min(interval, 5)
+            continue
+        wait = interval
+        if not owned:
+            lost.set()
+            return
+
+
+def work(
+    filename: str,
+    heartbeat_interval: float = 30,
+    stale_after: float = 120,
+    poll_interval: float = 10,
+    exit_when_done: bool = True,
+    **options: Any,
+) -> int:
+    """
+    Claim and run tasks until the queue is drained.
+
+    This is the loop of one worker process. Each task runs with
+    :func:`superfish.runner.run_automesh` while a thread sends heartbeats. If
+    the task is requeued meanwhile (its heartbeats were late), the worker
+    kills the run, discards its result and moves on, leaving the task to
+    its new owner.
+
+    Parameters
+    ----------
+    filename : str
+        Queue database.
+    heartbeat_interval : float
+        Seconds between heartbeats.
+    stale_after : float
+        Seconds without a heartbeat after which another worker's task is
+        requeued. Must be well above ``heartbeat_interval``.
+    poll_interval : float
+        Seconds to wait when no task is queued.
+    exit_when_done : bool
+        Return when no task is queued or running. Otherwise keep polling
+        for new tasks forever.
+    **options
+        Passed to :func:`superfish.runner.run_automesh`, e.g. ``cache_dir``,
+        ``timeout``, ``container_method``.
+
+    Returns
+    -------
+    int
+        Number of tasks this worker ran.
+    """
+
+    queue = WorkQueue(filename)
+    worker = worker_id()
+    n_run = 0
+
+    while True:
+        queue.requeue_stale(stale_after)
+        task = queue.claim(worker)
+
+        if task is None:
+            counts = queue.counts()
+            # Running tasks may still be requeued if their worker dies
+            if exit_when_done and not counts["queued"] and not counts["running"]:
+                return n_run
+            sleep(poll_interval)
+            continue
+
+        stop = threading.Event()
+        lost = threading.Event()
+        beat = threading.Thread(
+            target=_heartbeat_loop,
+            args=(queue, task["id"], worker, heartbeat_interval, stop, lost),
+            daemon=True,
+        )
+        beat.start()
+
+        result = None
+        error = None
+        with tempfile.TemporaryDirectory() as tmpdir:
+            automesh = os.path.join(tmpdir, task["name"])
+            with open(automesh, "w") as f:
+                f.write(task["automesh"])
+            try:
+                _, result = run_automesh(
+                    automesh, problem=task["problem"], cancel=lost, **options
+                )
+                # Round trip, so numpy values are stored as plain JSON
+                result = json.loads(json.dumps(result, cls=ResultEncoder))
+                result["input"] = task["name"]
+            except RUN_ERRORS as ex:
+                error = f"{type(ex).__name__}: {ex}"
+            finally:
+                stop.set()
+                beat.join()
+
+        if lost.is_set():
+            continue
+        queue.finish(task["id"], worker, result=result, error=error)
+        n_run += 1
+
+
+def run_workers(filename: str, jobs: int = 1, **kwargs: Any) -> int:
+    """
+    Run ``jobs`` worker processes on this host until the queue is drained.
+
+    Parameters
+    ----------
+    filename : str
+        Queue database.
+    jobs : int
+        Number of worker processes.
+    **kwargs
+        Passed to :func:`work`.
+
+    Returns
+    -------
+    int
+        Number of tasks run on this host.
+    """
+    if jobs == 1:
+        return work(filename, **kwargs)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(work, filename, **kwargs) for _ in range(jobs)]
+        return sum(f.result() for f in futures)
@@ -1,12 +1,135 @@
 import warnings
+from collections.abc import Iterator, Sequence
+from typing import Any, cast
 
+import h5py
 import numpy as np
+import numpy.typing as npt
 import scipy.constants
+from beamphysics.readers import load_field_attrs
+from beamphysics.tools import encode_attrs
+from beamphysics.units import pg_units, write_unit_h5
+from beamphysics.writers import pmd_field_init
 
+from .parsers import iter_t7_chunks, parse_t7_header
 from .types import ExternalFieldData, FishT7Data, PoissonT7Data
 
 mu_0 = scipy.constants.mu_0
 
+# Data columns, in file order
+FISH_T7_COLUMNS = ("Ez", "Er", "E", "Hphi")
+
+
+def field_dtypes(dtype: npt.DTypeLike) -> tuple[np.dtype, np.dtype]:
+    """
+    Matching real and complex dtypes for a requested field precision.
+
+    Parameters
+    ----------
+    dtype : dtype-like
+        Real or complex dtype, e.g. ``"float32"`` or ``"complex64"``.
+
+    Returns
+    -------
+    real_dtype, complex_dtype : numpy.dtype
+        For example ``float32`` and ``complex64``.
+    """
+    real_dtype = np.finfo(np.dtype(dtype)).dtype
+    complex_dtype = np.result_type(real_dtype, np.complex64)
+    return real_dtype, complex_dtype
+
+
+def scaled_component(
+    a: np.ndarray,
+    shape: tuple[int, ...],
+    factor: float,
+    dtype: npt.DTypeLike,
+) -> np.ndarray:
+    """
+    Reshape and scale a field array with a single allocation.
+
+    Returns a view of ``a`` when no scaling or conversion is needed;
+    otherwise the result is allocated once in ``dtype`` and scaled in
+    place. ``a`` itself is never modified.
+
+    Parameters
+    ----------
+    a : ndarray
+        Field array.
+    shape : tuple of int
+        Output shape, e.g. ``(nr, 1, nz)``.
+    factor : float
+        Scale factor.
+    dtype : dtype-like
+        Output dtype.
+
+    Returns
+    -------
+    ndarray
+        ``a * factor`` with the requested shape and dtype.
+    """
+    a = a.reshape(shape)
+    if factor == 1:
+        return a.astype(dtype, copy=False)
+    out = np.empty(shape, dtype=dtype)
+    np.multiply(a, factor, out=out)
+    return out
+
+
+def t7_grid_attrs(
+    t7data: FishT7Data | PoissonT7Data | dict[str, Any],
+    z_offset: float = 0,
+) -> dict[str, Any]:
+    """
+    openPMD grid attributes for a cylindrical T7 grid.
+
+    Parameters
+    ----------
+    t7data : FishT7Data or PoissonT7Data or dict
+        Parsed T7 data, or a T7 header from
+        :func:`superfish.parsers.parse_t7_header`. Only the extents and
+        point counts are used.
+    z_offset : float
+        Offset added to the grid origin in z, in meters.
+
+    Returns
+    -------
+    dict
+        ``gridGeometry``, ``axisLabels``, ``gridLowerBound``, ``gridSize``,
+        ``gridSpacing``, and ``gridOriginOffset`` attributes.
+
+    Raises
+    ------
+    ValueError
+        If the grid does not start on axis.
+    """
+    # Use these to calculate spacing
+    zmin = t7data["zmin"] * 0.01
+    zmax = t7data["zmax"] * 0.01
+    rmin = t7data["rmin"] * 0.01
+    rmax = t7data["rmax"] * 0.01
+
+    if rmin != 0:
+        raise ValueError(f"rmin is not zero: {rmin}")
+
+    nr = t7data["nr"]
+    nz = t7data["nz"]
+
+    dz = (zmax - zmin) / (nz - 1)
+    dr = (rmax) / (nr - 1)
+
+    attrs: dict[str, Any] = {}
+    attrs["gridGeometry"] = "cylindrical"
+    attrs["axisLabels"] = ("r", "theta", "z")
+    attrs["gridLowerBound"] = (0, 1, 0)
+    attrs["gridSize"] = (nr, 1, nz)
+    attrs["gridSpacing"] = (dr, 0, dz)
+
+    # Set requested zmin
+    attrs["gridOriginOffset"] = (0, 0, zmin + z_offset)
+
+    return attrs
+
 
 def fish_externalfield_data(
     t7data: FishT7Data,
@@ -16,6 +139,8 @@ def fish_externalfield_data(
     z_offset: float = 0,
     name: str | None = None,
     normalize_by_Ez0: bool = False,
+    dtype: npt.DTypeLike = np.float64,
+    real_fields: bool = False,
 ) -> ExternalFieldData:
     """
     Convert Fish t7data to openPMD external field data.
@@ -53,6 +178,12 @@ def fish_externalfield_data(
         Name attribute.
     normalize_by_Ez0 : bool
         Normalize the fields by the maximum on-axis Ez.
+    dtype : dtype-like
+        Field precision, e.g. ``"float32"`` for complex64 output.
+    real_fields : bool
+        Store the electric field components, which are purely real, as real
+        arrays instead of complex arrays that are half zeros. The magnetic
+        field is always complex.
 
     Returns
     -------
@@ -68,29 +199,11 @@ def fish_externalfield_data(
     attrs = {}
     attrs["eleAnchorPt"] = eleAnchorPt
 
-    # Use these to calculate spacing
-    zmin = t7data["zmin"] * 0.01
-    zmax = t7data["zmax"] * 0.01
-    rmin = t7data["rmin"] * 0.01
-    rmax = t7data["rmax"] * 0.01
-
-    assert rmin == 0, f"rmin is not zero: {rmin}"
+    attrs.update(t7_grid_attrs(t7data, z_offset=z_offset))
 
     nr = t7data["nr"]
     nz = t7data["nz"]
 
-    dz = (zmax - zmin) / (nz - 1)
-    dr = (rmax) / (nr - 1)
-
-    attrs["gridGeometry"] = "cylindrical"
-    attrs["axisLabels"] = ("r", "theta", "z")
-    attrs["gridLowerBound"] = (0, 1, 0)
-    attrs["gridSize"] = (nr, 1, nz)
-    attrs["gridSpacing"] = (dr, 0, dz)
-
-    # Set requested zmin
-    attrs["gridOriginOffset"] = (0, 0, zmin + z_offset)
-
     attrs["fundamentalFrequency"] = t7data["freq"] * 1e6
 
     # Bmad non-standard
@@ -108,16 +221,19 @@ def fish_externalfield_data(
     else:
         Ez0_max = 1
 
+    real_dtype, complex_dtype = field_dtypes(dtype)
+    shape = (nr, 1, nz)
+    efactor = 1e6 / Ez0_max  # MV/m -> V/m
+    bfactor = -mu_0 / Ez0_max  # A/m -> T, imaginary part
+
+    # Er, Ez ~ cos(wt) are real; B = -i * mu_0 * H_phi is imaginary
+    edtype = real_dtype if real_fields else complex_dtype
     components = {}
-    components["electricField/r"] = (
-        t7data["Er"].reshape(nr, 1, nz).astype(complex) * 1e6 / Ez0_max
-    )
-    components["electricField/z"] = (
-        t7data["Ez"].reshape(nr, 1, nz).astype(complex) * 1e6 / Ez0_max
-    )
-    components["magneticField/theta"] = (
-        t7data["Hphi"].reshape(nr, 1, nz) * -1j * mu_0 / Ez0_max
-    )  # -i * mu_0
+    for key, component in (("Er", "electricField/r"), ("Ez", "electricField/z")):
+        components[component] = scaled_component(t7data[key], shape, efactor, edtype)
+    B = np.zeros(shape, dtype=complex_dtype)
+    np.multiply(t7data["Hphi"].reshape(shape), bfactor, out=B.imag)
+    components["magneticField/theta"] = B
 
     return dict(attrs=attrs, components=components)
 
@@ -130,6 +246,7 @@ def poisson_externalfield_data(
     z_offset: float = 0,
     name: str | None = None,
     normalize_by_fz0: bool = False,
+    dtype: npt.DTypeLike = np.float64,
 ) -> ExternalFieldData:
     """
     Convert Poisson t7data to openPMD external field data.
@@ -151,6 +268,9 @@ def poisson_externalfield_data(
         Name attribute.
     normalize_by_fz0 : bool
         Normalize the fields by the maximum on-axis z field.
+    dtype : dtype-like
+        Field precision, e.g. ``"float32"``. Without scaling or dtype
+        conversion, the components are views of ``t7data``.
 
     Returns
     -------
@@ -167,29 +287,11 @@ def poisson_externalfield_data(
 
     attrs["eleAnchorPt"] = eleAnchorPt
 
-    # Use these to calculate spacing
-    zmin = t7data["zmin"] * 0.01
-    zmax = t7data["zmax"] * 0.01
-    rmin = t7data["rmin"] * 0.01
-    rmax = t7data["rmax"] * 0.01
-
-    assert rmin == 0, f"rmin is not zero: {rmin}"
+    attrs.update(t7_grid_attrs(t7data, z_offset=z_offset))
 
     nr = t7data["nr"]
     nz = t7data["nz"]
 
-    dz = (zmax - zmin) / (nz - 1)
-    dr = (rmax) / (nr - 1)
-
-    attrs["gridGeometry"] = "cylindrical"
-    attrs["axisLabels"] = ("r", "theta", "z")
-    attrs["gridLowerBound"] = (0, 1, 0)
-    attrs["gridSize"] = (nr, 1, nz)
-    attrs["gridSpacing"] = (dr, 0, dz)
-
-    # Set requested zmin
-    attrs["gridOriginOffset"] = (0, 0, zmin + z_offset)
-
     attrs["fundamentalFrequency"] = 0
     attrs["harmonic"] = 0
     attrs["RFphase"] = 0
@@ -223,8 +325,10 @@ def poisson_externalfield_data(
         fz0_max = 1
 
     components = {}
-    components[ofr] = t7data[fr].reshape(nr, 1, nz) * factor / fz0_max
-    components[ofz] = t7data[fz].reshape(nr, 1, nz) * factor / fz0_max
+    for key, component in ((fr, ofr), (fz, ofz)):
+        components[component] = scaled_component(
+            t7data[key], (nr, 1, nz), factor / fz0_max, dtype
+        )
 
     return dict(attrs=attrs, components=components)
 
@@ -232,7 +336,8 @@ def poisson_externalfield_data(
 def write_fish_t7(
     filename: str,
     t7data: FishT7Data,
-    fmt: str = "%10.8e",
+    fmt: str | Sequence[str] = "%10.8e",
+    chunk_rows: int = 100_000,
 ) -> str:
     """
     Write a T7 file from a FISH t7data dict.
@@ -244,8 +349,10 @@ def write_fish_t7(
     t7data : FishT7Data
         Parsed T7 data, as returned by
         :func:`superfish.parsers.parse_fish_t7`.
-    fmt : str
-        Number format for the data columns.
+    fmt : str or sequence of str
+        Number format of the data columns, see :func:`format_t7_rows`.
+    chunk_rows : int
+        Number of rows formatted at a time.
 
     Returns
     -------
@@ -271,9 +378,9 @@ def write_fish_t7(
 {ymin} {ymax} {ny - 1}"""
 
     # Unroll the arrays
-    dat = np.array([t7data[f].reshape(nx * ny).T for f in ["Ez", "Er", "E", "Hphi"]]).T
+    dat = np.column_stack([t7data[f].reshape(nx * ny) for f in FISH_T7_COLUMNS])
 
-    np.savetxt(filename, dat, header=header, comments="", fmt=fmt)
+    write_t7_table(filename, dat, header, fmt=fmt, chunk_rows=chunk_rows)
 
     return filename
 
@@ -281,7 +388,8 @@ def write_fish_t7(
 def write_poisson_t7(
     filename: str,
     t7data: PoissonT7Data,
-    fmt: str = "%10.8e",
+    fmt: str | Sequence[str] = "%10.8e",
+    chunk_rows: int = 100_000,
 ) -> str:
     """
     Write a T7 file from a POISSON t7data dict.
@@ -293,8 +401,10 @@ def write_poisson_t7(
     t7data : PoissonT7Data
         Parsed T7 data, as returned by
         :func:`superfish.parsers.parse_poisson_t7`.
-    fmt : str
-        Number format for the data columns.
+    fmt : str or sequence of str
+        Number format of the data columns, see :func:`format_t7_rows`.
+    chunk_rows : int
+        Number of rows formatted at a time.
 
     Returns
     -------
@@ -324,8 +434,339 @@ def write_poisson_t7(
         arrays = [t7data["Br"], t7data["Bz"]]
 
     # Unroll the arrays
-    dat = np.array([a.reshape(nx * ny, order="F").T for a in arrays]).T
+    dat = np.column_stack([a.reshape(nx * ny, order="F") for a in arrays])
 
-    np.savetxt(filename, dat, header=header, comments="", fmt=fmt)
+    write_t7_table(filename, dat, header, fmt=fmt, chunk_rows=chunk_rows)
 
     return filename
+
+
+def format_t7_rows(dat: np.ndarray, fmt: str | Sequence[str] = "%10.8e") -> str:
+    """
+    Format a 2D array as whitespace-separated text rows.
+
+    Produces the same text as ``np.savetxt(..., fmt=fmt)``, but formats
+    the whole block with a single string operation instead of one row at a
+    time.
+
+    Parameters
+    ----------
+    dat : ndarray
+        Array of shape (nrows, ncols).
+    fmt : str or sequence of str
+        As in ``np.savetxt``: a single format applied to every column, a
+        format per column, or a full row format such as ``"%e %e %e %e"``.
+
+    Returns
+    -------
+    str
+        The formatted rows, each terminated by a newline.
+    """
+    nrows, ncols = dat.shape
+    if not isinstance(fmt, str):
+        if len(fmt) != ncols:
+            raise ValueError(f"fmt has {len(fmt)} formats for {ncols} columns")
+        row = " ".join(fmt)
+    elif fmt.count("%") == 1:
+        row = " ".join([fmt] * ncols)
+    elif fmt.count("%") == ncols:
+        row = fmt
+    else:
+        raise ValueError(f"fmt has wrong number of % formats: {fmt}")
+    return ((row + "\n") * nrows) % tuple(dat.ravel().tolist())
+
+
+def write_t7_table(
+    filename: str,
+    dat: np.ndarray,
+    header: str,
+    fmt: str | Sequence[str] = "%10.8e",
+    chunk_rows: int = 100_000,
+) -> str:
+    """
+    Write a header and data table in T7 text layout.
+
+    Rows are formatted in chunks with :func:`format_t7_rows` and written
+    in order, so memory stays bounded by one chunk of text.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the file to write.
+    dat : ndarray
+        Array of shape (nrows, ncols).
+    header : str
+        Header lines, without a trailing newline.
+    fmt : str or sequence of str
+        Number format of the data columns, see :func:`format_t7_rows`.
+    chunk_rows : int
+        Number of rows formatted at a time.
+
+    Returns
+    -------
+    str
+        The filename written to.
+    """
+    with open(filename, "w") as f:
+        f.write(header + "\n")
+        f.writelines(
+            format_t7_rows(dat[i : i + chunk_rows], fmt)
+            for i in range(0, len(dat), chunk_rows)
+        )
+
+    return filename
+
+
+def write_binary_t7(
+    filename: str,
+    t7data: FishT7Data | PoissonT7Data,
+    dtype: str | None = None,
+    compress: bool = False,
+) -> str:
+    """
+    Write t7data to a compact binary ``.npz`` file.
+
+    The grid scalars and field arrays are stored as-is, so the file can be
+    read back with :func:`superfish.parsers.parse_binary_t7` without any
+    text parsing. Intended for hand-off between tools, not for Superfish
+    itself.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the file to write. ``.npz`` is appended if missing.
+    t7data : FishT7Data or PoissonT7Data
+        Parsed T7 data, as returned by
+        :func:`superfish.parsers.parse_fish_t7` or
+        :func:`superfish.parsers.parse_poisson_t7`.
+    dtype : str, optional
+        Storage dtype for the field arrays, e.g. ``"float32"``. Defaults to
+        the dtype of the arrays.
+    compress : bool
+        Use ``np.savez_compressed``.
+
+    Returns
+    -------
+    str
+        The filename written to.
+
+    See Also
+    --------
+    superfish.parsers.parse_binary_t7
+    """
+    if not filename.endswith(".npz"):
+        filename += ".npz"
+
+    data = {}
+    for key, val in t7data.items():
+        if isinstance(val, np.ndarray):
+            data[key] = val if dtype is None else val.astype(dtype, copy=False)
+        else:
+            data[key] = np.asarray(val)
+
+    if compress:
+        np.savez_compressed(filename, **data)
+    else:
+        np.savez(filename, **data)
+
+    return filename
+
+
+def t7_openpmd_components(
+    problem: str,
+    type: str | None,
+) -> list[tuple[str, str, float | complex]]:
+    """
+    T7 field keys, openPMD component names, and SI conversion factors.
+
+    Parameters
+    ----------
+    problem : {"fish", "poisson"}
+        Problem type of the T7 data.
+    type : {"electric", "magnetic"}, optional
+        Type of field data for Poisson problems.
+
+    Returns
+    -------
+    list of tuple
+        ``(key, component, factor)`` for each field, where the openPMD
+        component is ``t7data[key] * factor``. Fish ``Hphi`` has the
+        complex factor ``-1j * mu_0``.
+    """
+    if problem == "fish":
+        return [
+            ("Er", "electricField/r", 1e6),  # MV/m -> V/m
+            ("Ez", "electricField/z", 1e6),
+            ("Hphi", "magneticField/theta", -1j * mu_0),  # A/m -> T
+        ]
+    if type == "electric":
+        return [("Er", "electricField/r", 1), ("Ez", "electricField/z", 1)]
+    if type == "magnetic":
+        # G -> T
+        return [("Br", "magneticField/r", 1e-4), ("Bz", "magneticField/z", 1e-4)]
+    raise ValueError(f"Unknown type: {type}. Allowed: 'electric' or 'magnetic'")
+
+
+def _iter_t7_slabs(
+    source: str | FishT7Data | PoissonT7Data,
+    keys: list[str],
+    chunk_lines: int,
+) -> Iterator[tuple[str, int, dict[str, np.ndarray]]]:
+    """
+    Yield (axis, start, slabs) with field slabs oriented as (r, z).
+
+    ``axis`` is the grid axis the slabs are stacked along, ``"r"`` or
+    ``"z"``, and ``start`` the index of the first line along it.
+    """
+    if not isinstance(source, str):
+        nr = source["nr"]
+        td = cast("dict[str, Any]", source)
+        for start in range(0, nr, chunk_lines):
+            yield "r", start, {k: td[k][start : start + chunk_lines] for k in keys}
+        return
+
+    for start, dat in iter_t7_chunks(source, chunk_lines=chunk_lines):
+        if dat.shape[-1] == 4:
+            # Fish: (r, z, column)
+            cols = {k: dat[:, :, FISH_T7_COLUMNS.index(k)] for k in keys}
+            yield "r", start, cols
+        else:
+            # Poisson: (z, r, column), r then z component
+            yield "z", start, {k: dat[:, :, i].T for i, k in enumerate(keys)}
+
+
+def write_t7_openpmd(
+    h5file: str,
+    source: str | FishT7Data | PoissonT7Data,
+    type: str | None = None,
+    eleAnchorPt: str = "beginning",
+    RFphase: float = 0,
+    z_offset: float = 0,
+    name: str | None = None,
+    chunk_lines: int = 64,
+    chunks: tuple[int, int, int] | None = None,
+    compression: str | None = "gzip",
+    compression_opts: Any = None,
+    dtype: npt.DTypeLike = np.float64,
+    real_fields: bool = False,
+) -> str:
+    """
+    Stream T7 field data into an openPMD-beamphysics HDF5 field mesh file.
+
+    Unlike :func:`fish_externalfield_data` and
+    :func:`poisson_externalfield_data`, the full component arrays are never
+    built: the data is converted to SI units and written one chunk of grid
+    lines at a time. The file layout matches ``FieldMesh.write``, so it can
+    be read back with ``FieldMesh(h5file)``.
+
+    Fish fields are written as complex, with
+    B = -i * mu_0 * H_phi (see :func:`fish_externalfield_data`).
+
+    Parameters
+    ----------
+    h5file : str
+        Path of the HDF5 file to write.
+    source : str or FishT7Data or PoissonT7Data
+        Path to a T7 file, which is read in chunks with
+        :func:`superfish.parsers.iter_t7_chunks`, or parsed t7data.
+    type : {"electric", "magnetic"}, optional
+        Type of field data for Poisson problems. Required for Poisson T7
+        files; detected from the keys of Poisson t7data.
+    eleAnchorPt : {"beginning", "center", "end"}
+        Element anchor point attribute.
+    RFphase : float
+        RF phase attribute.
+    z_offset : float
+        Offset added to the grid origin in z, in meters.
+    name : str, optional
+        Name attribute.
+    chunk_lines : int
+        Number of grid lines converted and written at a time.
+    chunks : tuple of int, optional
+        HDF5 chunk shape of the (nr, 1, nz) datasets. Defaults to h5py's
+        automatic chunking.
+    compression : str, optional
+        HDF5 compression filter, e.g. ``"gzip"`` or ``"lzf"``. None
+        disables compression.
+    compression_opts : optional
+        Options for the compression filter, e.g. the gzip level.
+    dtype : dtype-like
+        Field precision, e.g. ``"float32"`` for complex64 Fish datasets.
+    real_fields : bool
+        Write the Fish electric field components as real datasets, as
+        described in :func:`fish_externalfield_data`.
+
+    Returns
+    -------
+    str
+        The filename written to.
+    """
+    if isinstance(source, str):
+        header, _ = parse_t7_header(source)
+    else:
+        header = dict(source)
+    problem = header["problem"]
+
+    if problem == "poisson" and type is None:
+        if isinstance(source, str):
+            raise ValueError("type is required for Poisson T7 files")
+        type = "electric" if "Ez" in source else "magnetic"
+
+    components = t7_openpmd_components(problem, type)
+    nr, nz = header["nr"], header["nz"]
+
+    real_dtype, complex_dtype = field_dtypes(dtype)
+    dset_dtypes = {}
+    for key, _, factor in components:
+        # Purely imaginary components (B of Fish fields) are always complex
+        if problem == "fish" and (np.iscomplex(factor) or not real_fields):
+            dset_dtypes[key] = complex_dtype
+        else:
+            dset_dtypes[key] = real_dtype
+
+    attrs: dict[str, Any] = {"eleAnchorPt": eleAnchorPt}
+    attrs.update(t7_grid_attrs(header, z_offset=z_offset))
+    if problem == "fish":
+        attrs["fundamentalFrequency"] = header["freq"] * 1e6
+        attrs["harmonic"] = 1
+        attrs["RFphase"] = RFphase
+    else:
+        attrs["fundamentalFrequency"] = 0
+        attrs["harmonic"] = 0
+        attrs["RFphase"] = 0
+    if name:
+        attrs["name"] = name
+
+    with h5py.File(h5file, "w") as h5:
+        pmd_field_init(h5, externalFieldPath="/ExternalFieldPath/%T/")
+        g = h5.create_group("/ExternalFieldPath/1/")
+
+        attrs, other = load_field_attrs(attrs)
+        for k, v in encode_attrs(attrs).items():
+            g.attrs[k] = v
+        for k, v in other.items():
+            g.attrs[k] = v
+
+        dsets = {}
+        for key, component, factor in components:
+            dset = g.create_dataset(
+                component,
+                shape=(nr, 1, nz),
+                dtype=dset_dtypes[key],
+                chunks=chunks,
+                compression=compression,
+                compression_opts=compression_opts,
+            )
+            write_unit_h5(dset, pg_units(component))
+            dsets[key] = dset
+
+        keys = [key for key, _, _ in components]
+        for axis, start, slabs in _iter_t7_slabs(source, keys, chunk_lines):
+            for key, _, factor in components:
+                val = np.asarray(slabs[key] * factor, dtype=dsets[key].dtype)
+                if axis == "r":
+                    dsets[key][start : start + val.shape[0], 0, :] = val
+                else:
+                    dsets[key][:, 0, start : start + val.shape[1]] = val
+
+    return h5file